@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Benchmarks of the server. Run them from the root of project, e.g.
+
+    python -m benchmarks.handshake
+"""
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Creating of a chat with many members: the old way (lookup of id and one
+INSERT per member) vs add_users (one query for all the ids and one
+executemany in one transaction).
+
+The id cache is cleared before every chat, so the ids are read from
+the database, like for the users that haven't been seen for a while.
+
+    python -m benchmarks.bulk_members [members] [chats]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import curio
+
+from src.constants.server_constants import User, Chat
+from src.database._sqlite_client import SqliteStorage, SqliteStorageClient, USER
+
+
+async def add_one_by_one(client: SqliteStorageClient, chat_name: str, members: list):
+    """ The members of chat as they were added before add_users.
+    """
+    chat_id = await client._get_c_id(chat_name)
+    query = '''INSERT OR IGNORE INTO UsersChats (UID, CID)
+                VALUES (?, ?)'''
+    members_ids = [await client._get_user_id(member.name) for member in members]
+    members_ids = [mem_id for mem_id in members_ids if mem_id]
+    for mem_id in members_ids[:-1]:
+        await client._do_write_query(query, (mem_id, chat_id))
+    await client._do_write_query(query, (members_ids[-1], chat_id), wait=True)
+
+
+async def measure(client: SqliteStorageClient, name: str, members: list, chats: int,
+                  bulk: bool) -> float:
+    total = 0
+    creator = User('user0')
+    for i in range(chats):
+        chat_name = f'{name}{i}'
+        await client.create_chat(creator, chat_name, [])
+        client._storage.ids.discard_kind(USER)
+        start = time.perf_counter()
+        if bulk:
+            await client.add_users(Chat(chat_name, creator.name, None), members)
+        else:
+            await add_one_by_one(client, chat_name, members)
+        total += time.perf_counter() - start
+    return total / chats * 1000
+
+
+async def run(path: str, members_amount: int, chats: int):
+    conn = sqlite3.connect(path)
+    await SqliteStorageClient.prepare(path)
+    conn.executemany("INSERT INTO Users (Name) VALUES (?)",
+                     ((f'user{i}',) for i in range(members_amount)))
+    conn.commit()
+    conn.close()
+    members = [User(f'user{i}') for i in range(members_amount)]
+
+    async with SqliteStorageClient(path) as client:
+        old = await measure(client, 'old', members, chats, bulk=False)
+        new = await measure(client, 'bulk', members, chats, bulk=True)
+        rows = await client._do_read_query("SELECT count(*) FROM UsersChats", one=True)
+    print(f"one by one: {old:8.2f} ms/chat    add_users: {new:8.2f} ms/chat")
+    assert rows[0] == members_amount * chats * 2, "not all the members are added"
+    await SqliteStorage(path).end()
+
+
+def main(members=1000, chats=20):
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Creating {chats} chats with {members} members...")
+        curio.run(run, os.path.join(directory, 'members.db'), members, chats)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
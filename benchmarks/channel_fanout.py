@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Publication in the channel with many connected subscribers:
+
+push   - the publisher encodes the publication for every subscriber and
+         puts it to all the queues before the answer (synchronous pushes);
+fanout - ChannelAssistant.publish: one encoding (and one signature), the
+         queues are filled by the background task in batches.
+
+Subscribers use session keys (like the multiplexed clients), their sockets
+just count the bytes. 'publish' is how long the publisher waits, 'delivered'
+is the time until all the queues are empty.
+
+    python -m benchmarks.channel_fanout [subscribers] [publications]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import curio
+
+from src import codec
+from src.constants import *
+from src.constants.database_constants import TEXT
+from src.database._sqlite_client import SqliteStorage, SqliteStorageClient
+from src.logger import logger
+from src.session import ChannelAssistant, UserObserver
+
+
+class NullSocket:
+    """ Auxiliary socket of subscriber that receives everything at once.
+    """
+
+    def __init__(self):
+        self.received = 0
+
+    async def send_frame(self, frame_type: int, payload: bytes, chat_id=0, flags=0):
+        self.received += len(payload)
+
+    async def close(self):
+        pass
+
+
+async def push(channel: ChannelAssistant, observers: list, publication: Publication):
+    """ Synchronous pushes: the publication is saved and sent to everybody
+    by the publisher himself.
+    """
+    prev_seq = channel._publications.last_id()
+    seq, publication = await channel.get_db_client().add_publication(channel._channel,
+                                                                     publication)
+    channel._publications.append(seq, publication)
+    for el in observers:
+        await el.send(channel, codec.dumps((prev_seq, seq, publication)),
+                      content_type=NEW_PUBLICATION)
+
+
+async def delivered(channel: ChannelAssistant, observers: list):
+    while channel._pending or any(el.backlog() for el in observers):
+        await curio.sleep(0.001)
+
+
+async def measure(channel: ChannelAssistant, observers: list, publications: int,
+                  use_fanout: bool) -> tuple:
+    publish_time = 0
+    start = time.perf_counter()
+    for i in range(publications):
+        publication = Publication('', TEXT, f'publication {i} ' + 'text ' * 40)
+        publish_start = time.perf_counter()
+        if use_fanout:
+            await channel.publish(publication)
+        else:
+            await push(channel, observers, publication)
+        publish_time += time.perf_counter() - publish_start
+    await delivered(channel, observers)
+    total = time.perf_counter() - start
+    return publish_time / publications * 1000, total / publications * 1000
+
+
+async def run(path: str, subscribers: int, publications: int):
+    logger.setLevel('WARNING')     # observers log every frame
+    await SqliteStorageClient.prepare(path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO Users (Name) VALUES ('author')")
+    conn.execute("INSERT INTO Channels (Name, CreatorID) VALUES ('news', 1)")
+    conn.commit()
+    conn.close()
+
+    channel = ChannelAssistant(SqliteStorageClient(path), Channel('news', None, 'author'))
+    await channel.start()
+    observers = []
+    for i in range(subscribers):
+        observer = UserObserver(User(f'user{i}'), NullSocket(), framed=True, use_mac=True)
+        await observer.start()
+        # subscribers are attached directly, only the publications are measured
+        channel._observers[observer.get_name()] = observer
+        observers.append(observer)
+
+    for name, use_fanout in (('push', False), ('fanout', True)):
+        publish, total = await measure(channel, observers, publications, use_fanout)
+        print(f"{name:>6}: publish {publish:8.2f} ms    delivered {total:8.2f} ms "
+              f"(per publication)")
+    received = sum(el._recipient.received for el in observers)
+    print(f"Received by subscribers: {received / 2 ** 20:.1f} MiB, "
+          f"lagging: {channel.stats()['lagging']}")
+
+    for el in observers:
+        await el.stop()
+    await channel.end()
+    await SqliteStorage(path).end()
+
+
+def main(subscribers=10000, publications=20):
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{publications} publications for {subscribers} subscribers...")
+        curio.run(run, os.path.join(directory, 'channel.db'), subscribers, publications)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
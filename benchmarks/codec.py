@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Size and speed of src/codec.py against pickle on the history of chat
+(list of Message as SqliteStorageClient returns it) and list of members.
+"""
+
+import pickle
+import random
+import sys
+import timeit
+
+from src import codec
+from src.constants.server_constants import Message, ChatUser
+
+
+def make_history(size: int, authors=20) -> list:
+    names = [f'user_{i}' for i in range(authors)]
+    return [Message(random.choice(names), f'2026-10-18 14:{i // 60 % 60:02}:{i % 60:02}',
+                    0, 0, f'message {i}: ' + 'text ' * random.randint(1, 10))
+            for i in range(size)]
+
+
+def make_members(size: int) -> list:
+    return [ChatUser(f'user_{i}', 1, 0) for i in range(size)]
+
+
+def measure(name: str, obj, number: int):
+    print(name)
+    for module in (pickle, codec):
+        data = module.dumps(obj)
+        encode = timeit.timeit(lambda: module.dumps(obj), number=number) / number
+        decode = timeit.timeit(lambda: module.loads(data), number=number) / number
+        print(f"    {module.__name__:>9}: {len(data):>9} bytes, "
+              f"dumps {encode * 1000:8.3f} ms, loads {decode * 1000:8.3f} ms")
+
+
+def main(number=20):
+    random.seed(0)
+    for size in (100, 1000, 10000):
+        measure(f"history of {size} messages", make_history(size), number)
+    measure("1000 members", make_members(1000), number)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
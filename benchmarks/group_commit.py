@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Throughput of AsyncWorker (messages per second) depending on the max
+amount of queries in one transaction (DB_BATCH_SIZE).
+
+Batch size 1 is the old behaviour: commit after every message.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import curio
+
+from src.database._sqlite_client import AsyncWorker, PREPARE_DATABASE_QUERY
+from src.logger import logger
+
+INSERT_MESSAGE = '''INSERT INTO ChatMessages (CID, AuthorID, Type, Content)
+                    VALUES (?, ?, ?, ?)'''
+
+
+def prepare_database(filedb: str):
+    conn = sqlite3.connect(filedb)
+    conn.executescript(PREPARE_DATABASE_QUERY)
+    conn.execute("INSERT INTO Users (Name) VALUES ('user')")
+    conn.execute("INSERT INTO Chats (Name, CreatorID) VALUES ('chat', 1)")
+    conn.commit()
+    conn.close()
+
+
+async def measure(filedb: str, batch_size: int, amount: int) -> float:
+    worker = AsyncWorker(filedb, batch_size=batch_size)
+    task = await curio.spawn(worker.start)
+    queue = worker.get_queue()
+    start = time.perf_counter()
+    for i in range(amount - 1):
+        await queue.put((INSERT_MESSAGE, (1, 1, 0, f'message {i}')))
+    await worker.execute(INSERT_MESSAGE, (1, 1, 0, 'the last message'))
+    total = time.perf_counter() - start
+    await task.cancel()
+    return amount / total
+
+
+def main(amount=2000):
+    logger.setLevel('WARNING')     # the worker logs every transaction
+    with tempfile.TemporaryDirectory() as directory:
+        for batch_size in (1, 8, 64, 256, 1024):
+            filedb = os.path.join(directory, f'batch_{batch_size}.db')
+            prepare_database(filedb)
+            speed = curio.run(measure, filedb, batch_size, amount)
+            print(f"batch size {batch_size:>5}: {speed:10.0f} messages/sec")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
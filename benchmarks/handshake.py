@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Cost of the crypto in the server signification handshake
+(UserAssistant._server_signification).
+
+before - the challenge is signed twice and the signature is verified
+         with the public key that is read from disk;
+after  - one signature by CryptoService with keys in memory.
+"""
+
+import sys
+import timeit
+
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature.pkcs1_15 import PKCS115_SigScheme
+
+from src.sequrity import CRYPTO, RSA_PUBLIC_KEY_PATH, generate_check_phrase
+
+
+def old_verify(message: bytes, signature: bytes):
+    with open(RSA_PUBLIC_KEY_PATH, 'rb') as file:
+        key = RSA.import_key(file.read())
+    PKCS115_SigScheme(key).verify(SHA256.new(message), signature)
+
+
+def handshake_before(challenge: bytes):
+    signature = CRYPTO.sign(challenge)
+    old_verify(challenge, CRYPTO.sign(challenge))
+    return signature
+
+
+def handshake_after(challenge: bytes):
+    return CRYPTO.sign(challenge)
+
+
+def main(number=200):
+    challenge = generate_check_phrase()
+    for func in (handshake_before, handshake_after):
+        total = timeit.timeit(lambda: func(challenge), number=number)
+        print(f"{func.__name__:>16}: {total / number * 1000:.3f} ms per handshake")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
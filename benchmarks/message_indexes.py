@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Reading the messages of one chat from the big database before and after
+the migration that adds the indexes on (CID, Created) (see SCHEMA_MIGRATIONS).
+
+The database is seeded with the schema of the old version, then the same
+queries are measured, the database is migrated and measured again. The plans
+of the queries are reported with EXPLAIN QUERY PLAN (tests/test_query_plans.py
+checks the ones the client makes).
+
+    python -m benchmarks.message_indexes [messages] [chats]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from src.database._sqlite_client import PREPARE_DATABASE_QUERY, migrate
+
+CHAT_MESSAGES = '''SELECT U.Name, C.Created, C.Status, C.Type, C.Content
+                   FROM ChatMessages C
+                   LEFT JOIN Users U on C.AuthorID = U.Id
+                   WHERE C.CID=? ORDER BY C.Created DESC, C.Id DESC '''
+
+PUBLICATIONS = '''SELECT Created, Type, Content FROM ChannelMessages
+                  WHERE CID=? ORDER BY Created DESC, Id DESC '''
+
+HISTORY_PAGE = '''SELECT C.Id, U.Name, C.Created, C.Status, C.Type, C.Content
+                  FROM ChatMessages C
+                  LEFT JOIN Users U on C.AuthorID = U.Id
+                  WHERE C.CID=? AND C.Id<? ORDER BY C.Id DESC LIMIT 51'''
+
+QUERIES = (('chat messages', CHAT_MESSAGES), ('publications', PUBLICATIONS),
+           ('history page', HISTORY_PAGE))
+
+
+def seed(conn, messages: int, chats: int):
+    """ The schema without migrations + users, chats, channels and messages
+    spread randomly over them.
+    """
+    conn.executescript(PREPARE_DATABASE_QUERY)
+    users = 100
+    conn.executemany("INSERT INTO Users (Name) VALUES (?)",
+                     ((f'user{i}',) for i in range(users)))
+    conn.executemany("INSERT INTO Chats (Name, CreatorID) VALUES (?, ?)",
+                     ((f'chat{i}', i % users + 1) for i in range(chats)))
+    conn.executemany("INSERT INTO Channels (Name, CreatorID) VALUES (?, ?)",
+                     ((f'channel{i}', i % users + 1) for i in range(chats)))
+    rand = random.Random(0)
+    conn.executemany(
+        "INSERT INTO ChatMessages (CID, AuthorID, Created, Type, Content) VALUES (?, ?, ?, 0, ?)",
+        ((rand.randint(1, chats), rand.randint(1, users),
+          f'2020-01-01 {i:012}', f'message {i}')
+         for i in range(messages)))
+    conn.executemany(
+        "INSERT INTO ChannelMessages (CID, Created, Type, Content) VALUES (?, ?, 0, ?)",
+        ((rand.randint(1, chats), f'2020-01-01 {i:012}', f'publication {i}')
+         for i in range(messages // 10)))
+    conn.commit()
+
+
+def uses_index(conn, query: str) -> bool:
+    plan = ' '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query,
+                                                     (1, 2 ** 63 - 1)[:query.count('?')]))
+    return 'USING INDEX' in plan and 'TEMP B-TREE' not in plan
+
+
+def measure(conn, chats: int, repeat=200):
+    rand = random.Random(1)
+    for name, query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            params = (rand.randint(1, chats), 2 ** 63 - 1)[:query.count('?')]
+            conn.execute(query, params).fetchall()
+        total = (time.perf_counter() - start) / repeat
+        print(f"    {name:<15} {total * 1000:8.2f} ms/query   "
+              f"indexed without sorting: {uses_index(conn, query)}")
+
+
+def main(messages=1_000_000, chats=2000):
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, 'messages.db'))
+        print(f"Seeding {messages} messages in {chats} chats...")
+        seed(conn, messages, chats)
+
+        print("Before migration:")
+        measure(conn, chats)
+
+        start = time.perf_counter()
+        version = migrate(conn)
+        print(f"Migration to the version {version}: {time.perf_counter() - start:.2f} s")
+
+        print("After migration:")
+        measure(conn, chats)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
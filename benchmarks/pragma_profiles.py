@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Throughput of the database with every pragma profile of DB_PRAGMA_PROFILES
+(with the changes from config.ini).
+
+For each profile the new database is seeded with messages, then the writer
+(one message per transaction, like AsyncWorker under small load) and
+several readers (pages of history of random chats, each with its own
+read-only connection, like SqliteStorage) work at the same time.
+
+    python -m benchmarks.pragma_profiles [seconds] [readers] [messages]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from src.constants.app_constants import DB_PRAGMA_PROFILES
+from src.database._sqlite_client import PREPARE_DATABASE_QUERY, migrate, \
+    get_pragma_profile, apply_pragmas
+
+CHATS = 100
+
+INSERT = "INSERT INTO ChatMessages (CID, AuthorID, Type, Content) VALUES (?, ?, 0, ?)"
+
+HISTORY_PAGE = '''SELECT U.Name, C.Created, C.Status, C.Type, C.Content
+                  FROM ChatMessages C
+                  LEFT JOIN Users U on C.AuthorID = U.Id
+                  WHERE C.CID=? ORDER BY C.Id DESC LIMIT 50'''
+
+results_lock = threading.Lock()
+
+
+def seed(path: str, profile: dict, messages: int):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, profile, journal_mode=True)
+    conn.executescript(PREPARE_DATABASE_QUERY)
+    migrate(conn)
+    conn.executemany("INSERT INTO Users (Name) VALUES (?)",
+                     ((f'user{i}',) for i in range(CHATS)))
+    conn.executemany("INSERT INTO Chats (Name, CreatorID) VALUES (?, ?)",
+                     ((f'chat{i}', i + 1) for i in range(CHATS)))
+    rand = random.Random(0)
+    conn.executemany(INSERT, ((rand.randint(1, CHATS), rand.randint(1, CHATS),
+                               f'message {i}') for i in range(messages)))
+    conn.commit()
+    conn.close()
+
+
+def writer(path: str, profile: dict, stop: threading.Event, res: dict):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, profile)
+    rand = random.Random(1)
+    commits = errors = 0
+    while not stop.is_set():
+        try:
+            conn.execute(INSERT, (rand.randint(1, CHATS), rand.randint(1, CHATS), 'new'))
+            conn.commit()
+            commits += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+    conn.close()
+    res['commits'] = commits
+    res['write errors'] = errors
+
+
+def reader(path: str, profile: dict, stop: threading.Event, res: dict, seed_value):
+    uri = Path(path).absolute().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True)
+    apply_pragmas(conn, profile)
+    rand = random.Random(seed_value)
+    reads = errors = 0
+    while not stop.is_set():
+        try:
+            conn.execute(HISTORY_PAGE, (rand.randint(1, CHATS),)).fetchall()
+            reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    conn.close()
+    with results_lock:
+        res['reads'] = res.get('reads', 0) + reads
+        res['read errors'] = res.get('read errors', 0) + errors
+
+
+def measure(name: str, seconds: float, readers: int, messages: int):
+    profile = get_pragma_profile(name)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'{name}.db')
+        seed(path, profile, messages)
+        stop = threading.Event()
+        res = {}
+        threads = [threading.Thread(target=writer, args=(path, profile, stop, res))]
+        threads += [threading.Thread(target=reader, args=(path, profile, stop, res, i))
+                    for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    print(f"{name:<10} writes: {res['commits'] / seconds:9.1f}/s   "
+          f"reads: {res['reads'] / seconds:9.1f}/s   "
+          f"errors (write/read): {res['write errors']}/{res['read errors']}")
+
+
+def main(seconds=3., readers=4, messages=100_000):
+    print(f"{readers} readers and 1 writer for {seconds} seconds, "
+          f"{messages} messages in {CHATS} chats:")
+    for name in DB_PRAGMA_PROFILES:
+        measure(name, float(seconds), int(readers), int(messages))
+
+
+if __name__ == '__main__':
+    main(*map(float, sys.argv[1:]))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Search of the messages of one chat: the old LIKE query (full scan of the
+chat) vs the FTS5 index (see find_messages).
+
+The database is seeded with the random text messages (1 000 000 messages in
+100 chats by default - about a year of history of busy chats) and migrated,
+so the existing messages are indexed the same way as on the real server.
+
+    python -m benchmarks.search [messages] [chats]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from itertools import accumulate
+
+from src.database._sqlite_client import PREPARE_DATABASE_QUERY, migrate, \
+    _make_search_query
+
+LIKE_QUERY = '''SELECT (SELECT Users.Name FROM Users WHERE Users.Id=AuthorID),
+                       Created, Type, Content
+                FROM ChatMessages
+                WHERE Type=0 AND CID=? AND Content LIKE ?'''
+
+FTS_QUERY = '''SELECT U.Name, C.Created, C.Status, C.Type, C.Content
+               FROM ChatMessagesSearch
+               JOIN ChatMessages C ON C.Id = ChatMessagesSearch.rowid
+               LEFT JOIN Users U ON U.Id = C.AuthorID
+               WHERE ChatMessagesSearch MATCH ? AND C.CID=?
+                     AND (?='' OR U.Name=?)
+               ORDER BY ChatMessagesSearch.rank LIMIT 21 OFFSET 0'''
+
+VOCABULARY_SIZE = 20000
+
+
+def make_vocabulary(rand: random.Random) -> list:
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rand.choice(letters) for _ in range(rand.randint(3, 10)))
+            for _ in range(VOCABULARY_SIZE)]
+
+
+def seed(conn, messages: int, chats: int, vocabulary: list):
+    conn.executescript(PREPARE_DATABASE_QUERY)
+    conn.executemany("INSERT INTO Users (Name) VALUES (?)",
+                     ((f'user{i}',) for i in range(100)))
+    conn.executemany("INSERT INTO Chats (Name, CreatorID) VALUES (?, ?)",
+                     ((f'chat{i}', i % 100 + 1) for i in range(chats)))
+    rand = random.Random(0)
+    # frequent words are much more frequent (like in the real texts)
+    cum_weights = list(accumulate(1 / (i + 1) for i in range(len(vocabulary))))
+    conn.executemany(
+        "INSERT INTO ChatMessages (CID, AuthorID, Type, Content) VALUES (?, ?, 0, ?)",
+        ((rand.randint(1, chats), rand.randint(1, 100),
+          ' '.join(rand.choices(vocabulary, cum_weights=cum_weights, k=rand.randint(3, 20))))
+         for _ in range(messages)))
+    conn.commit()
+
+
+def measure(conn, query: str, params_list: list) -> float:
+    start = time.perf_counter()
+    for params in params_list:
+        conn.execute(query, params).fetchall()
+    return (time.perf_counter() - start) / len(params_list) * 1000
+
+
+def main(messages=1_000_000, chats=100, repeat=100):
+    rand = random.Random(1)
+    vocabulary = make_vocabulary(rand)
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, 'search.db'))
+        print(f"Seeding {messages} messages in {chats} chats...")
+        seed(conn, messages, chats, vocabulary)
+        start = time.perf_counter()
+        migrate(conn)
+        print(f"Migration (indexing of all the messages): {time.perf_counter() - start:.2f} s")
+
+        for name, words in (('frequent word', vocabulary[:10]),
+                            ('rare word', vocabulary[-1000:]),
+                            ('prefix', [word[:3] + '*' for word in vocabulary[:100]]),
+                            ('two words', [f'{a} {b}' for a, b in
+                                           zip(vocabulary[:50], vocabulary[50:100])])):
+            chats_ids = [rand.randint(1, chats) for _ in range(repeat)]
+            patterns = [rand.choice(words) for _ in range(repeat)]
+            like = measure(conn, LIKE_QUERY,
+                           [(c_id, '%' + pattern.split()[0].rstrip('*') + '%')
+                            for c_id, pattern in zip(chats_ids, patterns)])
+            fts = measure(conn, FTS_QUERY,
+                          [(_make_search_query(pattern, c_id), c_id, '', '')
+                           for c_id, pattern in zip(chats_ids, patterns)])
+            print(f"{name:<14} LIKE: {like:8.2f} ms/query    FTS5: {fts:8.2f} ms/query")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -10,10 +10,11 @@
 from .constants import *
 from .logger import logger
 from .security import *
+from .framing import FramedSocket, MultiplexedSocket, get_chat_id
+from . import codec
 
 import threading
 import socket
-import pickle
 import json
 import time
 from queue import Queue
@@ -77,7 +78,7 @@ def background_socket_receiving(client_aux_socket):
             if (content_size - done) > 0:
                 res_data += client_aux_socket.recv(content_size - done)
             verify_control_message(res_data, bytes.fromhex(signature))
-            tmp = pickle.loads(res_data)
+            tmp = codec.loads(res_data)
             background_queue.put((content_type, chat_name, tmp))
 
         except socket.error:
@@ -88,6 +89,41 @@ def background_socket_receiving(client_aux_socket):
             continue
 
 
+def background_frames_receiving(client_aux_socket: FramedSocket):
+    logger.info(f"[*] Starting of background receiving of frames...")
+
+    while True:
+        try:
+            frame = client_aux_socket.recv_frame()
+            if frame is None:
+                client_aux_socket.close()
+                break
+            if frame.type not in FRAME_CONTENT_TYPES:
+                logger.error(f'[*] Got {frame} from aux server.')
+                continue
+            content_type = FRAME_CONTENT_TYPES[frame.type]
+            logger.debug(f"[*] Got {content_type} frame of {len(frame.payload)} bytes.")
+            if frame.flags & FLAG_MAC:
+                # mac is already checked by FramedSocket
+                res_data = frame.payload
+            elif frame.flags & FLAG_SIGNED:
+                signature = frame.payload[:SIGNATURE_LENGTH]
+                res_data = frame.payload[SIGNATURE_LENGTH:]
+                verify_control_message(res_data, signature)
+            else:
+                logger.error(f'[*] Got not signed {content_type} from aux server.')
+                continue
+            tmp = codec.loads(res_data)
+            background_queue.put((content_type, frame.chat_id, tmp))
+
+        except socket.error:
+            client_aux_socket.close()
+            break
+        except Exception as e:
+            logger.exception(e)
+            continue
+
+
 def background_printer():
     while True:
         tmp = background_queue.get()
@@ -107,10 +143,26 @@ class ConnectionManager:
         self._connected = False
         self._aux_connected = False
         self._current_messages = []
+        self._history_cursor = None     # cursor of the messages older than _current_messages
+        self._found_messages = []       # results of the last search
+        self._search = None             # the last search: (pattern, author)
+        self._search_cursor = None      # cursor of the next page of results
         self._current_chats = []
         self._current_chat_members = []
 
+        self._in_channel = False
+        self._publications = []         # publications of the current channel
+        self._channel_seq = None        # sequence number of the last one of them
+        self._channel_last_seq = 0      # the last sequence number of channel we know
+        self._channels_seqs = {}        # name of channel -> _channel_seq when we left it
+
+        # (kind, name) -> ChatActivity of every chat and channel of user
+        self._chats_activity = {}
+
         self._user_chats = None
+        self._framed = False
+        self._multiplexed = False
+        self._session_key = None
 
     def background_worker(self):
         while True:
@@ -127,13 +179,62 @@ class ConnectionManager:
                     self._current_chat_members = value
             elif content_type == CHAT_MESSAGES:
                 with lock:
-                    self._current_messages = value
+                    self._current_messages, self._history_cursor = value
+                    self._current_messages = list(self._current_messages)
+            elif content_type == HISTORY_PAGE:
+                with lock:
+                    messages, self._history_cursor = value
+                    self._current_messages[:0] = messages
+            elif content_type == SEARCH_RESULTS:
+                with lock:
+                    messages, self._search_cursor = value
+                    self._found_messages.extend(messages)
             elif content_type == NEW_USER:
                 with lock:
                     self._current_chat_members.add(value)
+            elif content_type == NEW_PUBLICATION:
+                with lock:
+                    prev_seq, seq, publication = value
+                    # otherwise some publications were lost, we'll catch up
+                    if prev_seq == self._channel_seq:
+                        self._publications.append(publication)
+                        self._channel_seq = seq
+                    self._channel_last_seq = max(self._channel_last_seq, seq)
+            elif content_type == CHANNEL_PUBLICATIONS:
+                with lock:
+                    self._add_publications(*value)
+            elif content_type == CHANNEL_BEHIND:
+                with lock:
+                    self._channel_last_seq = max(self._channel_last_seq, value)
+            elif content_type == CHATS_ACTIVITY:
+                with lock:
+                    for el in value:
+                        self._chats_activity[el.kind, el.name] = el
             else:
                 logger.error(f"Unknown type from queue: {content_type}.")
 
+    def _add_publications(self, seq, seqs, publications, last_seq):
+        """ Add the page of publications that are newer than seq (or the
+        latest ones if seq is None).
+        """
+        self._channel_last_seq = max(self._channel_last_seq, last_seq)
+        if seq is None and self._channel_seq is None:
+            self._publications = list(publications)
+            self._channel_seq = seqs[-1] if seqs else last_seq
+        elif seq is not None and self._channel_seq is not None and seq <= self._channel_seq:
+            for el_seq, publication in zip(seqs, publications):
+                if el_seq > self._channel_seq:
+                    self._publications.append(publication)
+                    self._channel_seq = el_seq
+
+    def _mark_read(self, kind, name):
+        """ All the messages of the opened chat are read.
+        """
+        with lock:
+            activity = self._chats_activity.get((kind, name))
+            if activity is not None:
+                self._chats_activity[kind, name] = activity._replace(unread=0)
+
     def register(self, user_name, password):
         assert not self._logged_in
         logger.info(f"[*] Starting process of registration...")
@@ -160,13 +261,71 @@ class ConnectionManager:
         self._logged_in = True
         self._logged_name = user_name
         logger.info(f'[*] Process of registration done.')
-        threading.Thread(target=background_socket_receiving,
-                         args=(self._aux_socket,), daemon=True).start()
+        self._start_background_receiving()
+
+    def _start_background_receiving(self):
+        target = background_frames_receiving if self._framed else background_socket_receiving
+        threading.Thread(target=target, args=(self._aux_socket,), daemon=True).start()
+
+    def use_framed_protocol(self):
+        """ Ask the server to switch the connection to the framed protocol.
+        Must be called before registration or logging in.
+        """
+        assert not self._logged_in
+        logger.info(f"[*] Switching to the framed protocol...")
+        self._main_socket.sendall(FRAMED_PROTOCOL)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(f"Incorrect server response: {resp}")
+        self._main_socket = FramedSocket(self._main_socket)
+        self._framed = True
+
+    def use_multiplexed_protocol(self):
+        """ Ask the server to send everything via main socket, so the auxiliary
+        one isn't needed. Must be called before registration or logging in.
+        """
+        assert not self._logged_in
+        logger.info(f"[*] Switching to the multiplexed protocol...")
+        self._main_socket.sendall(MULTIPLEXED_PROTOCOL)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(f"Incorrect server response: {resp}")
+        multiplexed_socket = MultiplexedSocket(self._main_socket)
+        self._main_socket = multiplexed_socket.stream(CONTROL_STREAM)
+        self._aux_socket = multiplexed_socket.stream(PUSH_STREAM)
+        self._framed = True
+        self._multiplexed = True
+
+    def use_session_key(self):
+        """ Send the random session key to the server, so all the frames
+        are authenticated by HMAC since now. Must be called after switching
+        to the framed protocol and before registration or logging in.
+        """
+        assert self._framed and not self._logged_in
+        logger.info(f"[*] Creating session key...")
+        self._main_socket.sendall(SESSION_KEY)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(f"Incorrect server response: {resp}")
+        key, encrypted_key = generate_session_key()
+        self._main_socket.sendall(encrypted_key)
+        proof = self._main_socket.recv(ATOM_LENGTH)
+        if not check_mac(proof, key, encrypted_key):
+            raise ServerError("Server can't decrypt the session key.")
+        self._main_socket.set_mac_key(key)
+        self._session_key = key
 
     def _aux_connection(self):
         logger.info(f"[*] Starting the process of creating aux connection...")
         logger.debug(f"[-->] Sending {READY_FOR_TRANSFERRING}...")
         self._main_socket.sendall(READY_FOR_TRANSFERRING)
+        if self._multiplexed:
+            resp = self._aux_socket.recv(ATOM_LENGTH)
+            if resp != READY_FOR_TRANSFERRING:
+                raise ServerError(str(resp, encoding='utf-8'))
+            self._aux_connected = True
+            logger.info(f"[*] Push stream is ready.")
+            return
         logger.debug(f"[<--] Receiving the control phrase from the server...")
         check_phrase = self._main_socket.recv(ATOM_LENGTH)
         logger.debug(f"[*] Got {check_phrase}.")
@@ -175,6 +334,10 @@ class ConnectionManager:
         self._aux_socket.connect((DATA_SERVER_HOST, DATA_SERVER_PORT))
         logger.debug(f"[-->] Sending {check_phrase} to the aux server...")
         self._aux_socket.sendall(check_phrase)
+        if self._framed:
+            self._aux_socket = FramedSocket(self._aux_socket)
+        if self._session_key is not None:
+            self._aux_socket.set_mac_key(self._session_key, AUX_SOCKET_LABEL)
 
         logger.debug(f"[<--] Fetching the response from aux server...")
         resp = self._aux_socket.recv(ATOM_LENGTH)
@@ -222,8 +385,7 @@ class ConnectionManager:
         self._logged_in = True
         self._logged_name = user_name
         logger.info(f'[*] Process of logging in done.')
-        threading.Thread(target=background_socket_receiving,
-                         args=(self._aux_socket,), daemon=True).start()
+        self._start_background_receiving()
 
     def create_chat(self, chat_name, members):
         assert self._logged_in
@@ -237,7 +399,7 @@ class ConnectionManager:
         if resp != READY_FOR_TRANSFERRING:
             raise ServerError(resp)
 
-        data = pickle.dumps(members)
+        data = codec.dumps(members)
         metadata = JSON_CREATE_CHAT_FORMAT.copy()
         metadata[NAME] = chat_name
         metadata[CONTENT_TYPE] = CHAT_MEMBERS
@@ -245,15 +407,43 @@ class ConnectionManager:
         logger.debug(f"[-->] Sending {metadata} to the main server...")
         self._main_socket.sendall(bytes(json.dumps(metadata), encoding='utf-8'))
 
-        logger.debug(f"[<--] Fetching response from the main server...")
-        resp = self._main_socket.recv(ATOM_LENGTH)
-        if resp != READY_FOR_TRANSFERRING:
-            raise ServerError(resp)
+        if not self._framed:
+            logger.debug(f"[<--] Fetching response from the main server...")
+            resp = self._main_socket.recv(ATOM_LENGTH)
+            if resp != READY_FOR_TRANSFERRING:
+                raise ServerError(resp)
         logger.debug(f"[-->] Sending all the members to the server...")
         self._main_socket.sendall(data)
         logger.info(f"[*] Process of chat creating is done")
         self._in_chat = chat_name
 
+    def invite(self, members):
+        """ Add many users to the current chat at once.
+
+        :param members: list of User
+        """
+        assert self._logged_in
+        assert self._in_chat
+        logger.debug(f"[-->] Sending {INVITE} to the main server.")
+        self._main_socket.sendall(INVITE)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+
+        data = codec.dumps(members)
+        metadata = JSON_INVITE_FORMAT.copy()
+        metadata[CONTENT_SIZE] = len(data)
+        self._main_socket.sendall(bytes(json.dumps(metadata), encoding='utf-8'))
+        if not self._framed:
+            resp = self._main_socket.recv(ATOM_LENGTH)
+            if resp != READY_FOR_TRANSFERRING:
+                raise ServerError(resp)
+        logger.debug(f"[-->] Sending all the invited users to the server...")
+        self._main_socket.sendall(data)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+
     def open_chat(self, chat: Chat):
         assert self._logged_in
         assert self._in_chat is None
@@ -275,6 +465,77 @@ class ConnectionManager:
         if resp != READY_FOR_TRANSFERRING:
             raise ServerError(resp)
         self._in_chat = chat.name
+        self._mark_read(CHAT, chat.name)
+
+    def create_channel(self, channel_name):
+        assert self._logged_in
+        assert self._in_chat is None
+        logger.info(f"[*] Starting process of channel creating...")
+        self._main_socket.sendall(CREATE_CHANNEL)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        data = JSON_CREATE_CHANNEL_FORMAT.copy()
+        data[NAME] = channel_name
+        self._main_socket.sendall(bytes(json.dumps(data), encoding='utf-8'))
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        self._in_chat = channel_name
+        self._in_channel = True
+
+    def open_channel(self, channel: Channel):
+        """ Open the channel: we get the publications that were published
+        since we left it (or the latest ones).
+        """
+        assert self._logged_in
+        assert self._in_chat is None
+        logger.info(f"[*] Starting process of opening {channel}...")
+        self._main_socket.sendall(OPEN_CHAT)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+
+        seq = self._channels_seqs.get(channel.name)
+        with lock:
+            self._channel_seq = seq
+            self._channel_last_seq = seq or 0
+        data = JSON_OPEN_CHAT_FORMAT.copy()
+        data[NAME] = channel.name
+        data[CONTENT_TYPE] = CHANNEL
+        data[SEQ] = seq
+        self._main_socket.sendall(bytes(json.dumps(data), encoding='utf-8'))
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        self._in_chat = channel.name
+        self._in_channel = True
+        self._mark_read(CHANNEL, channel.name)
+
+    def catch_up(self, limit=HISTORY_PAGE_SIZE):
+        """ Ask the server for the publications that we have missed. They
+        come via auxiliary socket.
+
+        :return: False if we have all the publications we know about
+        """
+        assert self._logged_in
+        assert self._in_channel
+        with lock:
+            seq = self._channel_seq
+            if seq is None or seq >= self._channel_last_seq:
+                return False
+        self._main_socket.sendall(CATCH_UP)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        data = JSON_CATCH_UP_FORMAT.copy()
+        data[SEQ] = seq
+        data[LIMIT] = limit
+        self._main_socket.sendall(bytes(json.dumps(data), encoding='utf-8'))
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        return True
 
     def exit_chat(self):
         assert self._logged_in
@@ -283,13 +544,91 @@ class ConnectionManager:
         resp = self._main_socket.recv(ATOM_LENGTH)
         if resp != READY_FOR_TRANSFERRING:
             raise ServerError(resp)
+        if self._in_channel and self._channel_seq is not None:
+            self._channels_seqs[self._in_chat] = self._channel_seq
+        self._in_channel = False
+        self._publications = []
+        self._channel_seq = None
         self._in_chat = None
         self._current_messages = []
+        self._history_cursor = None
+        self._found_messages = []
+        self._search = None
+        self._search_cursor = None
         self._current_chat_members = set()
 
+    def history(self, limit=HISTORY_PAGE_SIZE):
+        """ Ask the server for the page of messages older than the ones we
+        already have. The page comes via auxiliary socket.
+
+        :return: False if there are no older messages
+        """
+        assert self._logged_in
+        assert self._in_chat
+        with lock:
+            cursor = self._history_cursor
+        if cursor is None:
+            return False
+        self._main_socket.sendall(HISTORY)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        data = JSON_HISTORY_FORMAT.copy()
+        data[CURSOR] = cursor
+        data[LIMIT] = limit
+        self._main_socket.sendall(bytes(json.dumps(data), encoding='utf-8'))
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        return True
+
+    def search(self, pattern=None, author='', limit=SEARCH_PAGE_SIZE, regex=False):
+        """ Ask the server to find the messages of the current chat by words.
+        The results come via auxiliary socket to _found_messages.
+
+        :param pattern: words to find or None for the next page of the
+                        last search
+        :param regex: True if pattern is regex
+        :return: False if there are no more results of the last search
+        """
+        assert self._logged_in
+        assert self._in_chat
+        with lock:
+            if pattern is not None:
+                self._search = (pattern, author, regex)
+                self._found_messages = []
+                self._search_cursor = None
+            elif self._search is None or self._search_cursor is None:
+                return False
+            pattern, author, regex = self._search
+            cursor = self._search_cursor
+        self._main_socket.sendall(SEARCH)
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        data = JSON_SEARCH_FORMAT.copy()
+        data[PATTERN] = pattern
+        data[AUTHOR] = author
+        data[CURSOR] = cursor
+        data[LIMIT] = limit
+        data[REGEX] = regex
+        self._main_socket.sendall(bytes(json.dumps(data), encoding='utf-8'))
+        resp = self._main_socket.recv(ATOM_LENGTH)
+        if resp != READY_FOR_TRANSFERRING:
+            raise ServerError(resp)
+        return True
+
     def message(self, message: Message):
         assert self._logged_in
         assert self._in_chat
+        if self._framed:
+            self._main_socket.send_frame(FRAME_TYPES[NEW_MESSAGE],
+                                         message.content.encode('utf-8'),
+                                         chat_id=get_chat_id(self._in_chat))
+            resp = self._main_socket.recv(ATOM_LENGTH)
+            if resp != READY_FOR_TRANSFERRING:
+                raise ServerError(resp)
+            return
         self._main_socket.sendall(MESSAGE)
         resp = self._main_socket.recv(ATOM_LENGTH)
         if resp != READY_FOR_TRANSFERRING:
@@ -312,9 +651,16 @@ class ConnectionManager:
     def find_chat(self, user_name):
         pass
 
-    def start(self, username='test18', password='test_password', register=False):
+    def start(self, username='test18', password='test_password', register=False,
+              framed=False, multiplexed=False, session_key=False):
         logger.info("[*] Creating main connection...")
         self._main_socket.connect((MAIN_SERVER_HOST, MAIN_SERVER_PORT))
+        if multiplexed:
+            self.use_multiplexed_protocol()
+        elif framed:
+            self.use_framed_protocol()
+        if session_key:
+            self.use_session_key()
         if register:
             self.register(username, password)
         else:
@@ -328,10 +674,29 @@ class ConnectionManager:
                 with lock:
                     name = input("Please, enter the chat name:\n--> ")
                 self.open_chat(Chat(name, '', ''))
+            elif command == 'open channel':
+                with lock:
+                    name = input("Please, enter the channel name:\n--> ")
+                self.open_channel(Channel(name, '', ''))
+            elif command == 'create channel':
+                with lock:
+                    name = input("Please, enter the name of new channel:\n--> ")
+                self.create_channel(name)
+            elif command == 'publications':
+                with lock:
+                    for row in self._publications:
+                        print(row)
+            elif command == 'catch up':
+                if not self.catch_up():
+                    print("There are no missed publications.")
             elif command == 'create chat':
                 with lock:
                     name = input("Please, enter the name of new chat:\n--> ")
                 self.create_chat(name, [])
+            elif command == 'invite':
+                with lock:
+                    names = input("Names of users (separated by spaces):\n--> ")
+                self.invite([User(name) for name in names.split()])
             elif command == 'members':
                 with lock:
                     for row in self._current_chat_members:
@@ -353,6 +718,29 @@ class ConnectionManager:
                 with lock:
                     for row in self._current_chats:
                         print(row)
+            elif command == "activity":
+                with lock:
+                    for row in sorted(self._chats_activity.values(),
+                                      key=lambda el: el.last_seq, reverse=True):
+                        print(row)
+            elif command == 'older':
+                if not self.history():
+                    print("There are no older messages.")
+            elif command == 'search':
+                with lock:
+                    pattern = input("Words to find (hel* - words that start with hel):\n--> ")
+                self.search(pattern)
+            elif command == 'search regex':
+                with lock:
+                    pattern = input("Regex to find:\n--> ")
+                self.search(pattern, regex=True)
+            elif command == 'more found':
+                if not self.search():
+                    print("There are no more results.")
+            elif command == 'found':
+                with lock:
+                    for row in self._found_messages:
+                        print(row)
             elif command == 'messages':
                 with lock:
                     for row in self._current_messages:
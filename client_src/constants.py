@@ -44,6 +44,11 @@ POSSIBLE_PERMISSIONS = {
     CHANNEL: {MODERATOR, MEMBER}
 }
 
+# amount of older messages that client fetches by one HISTORY command
+HISTORY_PAGE_SIZE = 50
+# amount of found messages that client fetches by one SEARCH command
+SEARCH_PAGE_SIZE = 20
+
 CHAT_NAME = 'ChatName'
 CONTENT_TYPE = 'ContentType'
 CONTENT_SIZE = 'ContentSize'
@@ -55,10 +60,18 @@ CHAT_MEMBERS = "ChatMembers"
 CHAT_MESSAGES = "ChatMessages"
 NEW_PERMISSION = "NewPermission"
 CHATS_LIST = "ChatsList"
+HISTORY_PAGE = "HistoryPage"
+SEARCH_RESULTS = "SearchResults"
+NEW_PUBLICATION = "NewPublication"
+CHANNEL_PUBLICATIONS = "ChannelPublications"
+CHANNEL_BEHIND = "ChannelBehind"
+CHATS_ACTIVITY = "ChatsActivity"
 
 
 TRANSFERS_TYPES = {NEW_MESSAGE, NEW_USER,
-                   CHAT_MESSAGES, CHAT_MEMBERS, NEW_PERMISSION}
+                   CHAT_MESSAGES, CHAT_MEMBERS, NEW_PERMISSION, HISTORY_PAGE,
+                   SEARCH_RESULTS, NEW_PUBLICATION, CHANNEL_PUBLICATIONS,
+                   CHANNEL_BEHIND}
 
 JSON_METADATA_OBSERVERS = {
     CHAT_NAME: '',
@@ -78,6 +91,8 @@ ChannelUser = namedtuple("ChannelUser", ["name", "permission", "status"])
 User = namedtuple("User", ["name"])
 Chat = namedtuple("Chat", ["name", "creator", "created"])
 Channel = namedtuple("Channel", ["name", "created", "creator"])
+# activity in the chat or channel (kind - CHAT or CHANNEL), see CHATS_ACTIVITY
+ChatActivity = namedtuple("ChatActivity", ["name", "kind", "last_seq", "unread"])
 
 USERS_CHANGES = 1
 MESSAGE_CHANGES = 0
@@ -153,7 +168,7 @@ WRONG_PASSWORD = b"#####WRONG_PASSWORD#####"
         }
 5. Server checks if all the parameters are correct.
 6. If they are, server sends __READY_FOR_TRANSFERRING__
-7. Client sends all the bytes that is pickle of list of members.
+7. Client sends the list of members (list of User) encoded by codec.
 8. Server adds all the members to the new chat and creates ChatAssistant. 
 """
 
@@ -175,6 +190,7 @@ JSON_CREATE_CHAT_FORMAT = {
         {
             "Name": ...          # name of the chat
             "ContentType": CHAT/CHANNEL
+            "Seq": ...           # optional, for channels only (see Channels)
             ...                  # there could be possible features
         }
 5. Server checks if all the parameters are correct.
@@ -205,6 +221,278 @@ DELETE_CHAT = b"#####DELETE_CHAT#####"
 EXIT_FROM_CHAT = b"#####EXIT_FROM_CHAT#####"
 LOG_OUT = b"#####LOG_OUT#####"
 
+# ============================== History =======================================
+"""
+When client opens the chat it gets only the latest messages of chat
+(__CHAT_MESSAGES__ is tuple(list of Message, cursor)). The older messages are
+fetched page by page:
+
+1. Client sends command __HISTORY__ to server (must be in the chat).
+2. Server responds __READY_FOR_TRANSFERRING__.
+3. Client sends json
+        {
+            "Cursor": ...,      # cursor from the last CHAT_MESSAGES/HISTORY_PAGE
+            "Limit": ...,       # max amount of messages
+        }
+4. Server responds __READY_FOR_TRANSFERRING__ and sends the page via
+   auxiliary socket as __HISTORY_PAGE__: tuple(list of Message from the
+   oldest to the newest, cursor of the next page). Cursor is None if there
+   are no older messages, otherwise it's a string that client shouldn't parse.
+"""
+
+HISTORY = b"#####HISTORY#####"
+
+CURSOR = "Cursor"
+LIMIT = "Limit"
+
+JSON_HISTORY_FORMAT = {
+    CURSOR: "",
+    LIMIT: "",
+}
+
+# ============================== Search ========================================
+"""
+Full-text search of the messages of the current chat:
+
+1. Client sends command __SEARCH__ to server (must be in the chat).
+2. Server responds __READY_FOR_TRANSFERRING__.
+3. Client sends json
+        {
+            "Pattern": ...,     # words that must be in the message,
+                                # the word that ends with * is a prefix
+            "Author": ...,      # name of the author or "" for everybody
+            "Cursor": ...,      # None for the first page, otherwise cursor 
+                                # from the last SEARCH_RESULTS
+            "Limit": ...,       # max amount of messages
+            "Regex": ...,       # optional, true if "Pattern" is regex
+        }
+4. Server responds __READY_FOR_TRANSFERRING__ and sends the page via
+   auxiliary socket as __SEARCH_RESULTS__: tuple(list of Message from the
+   most relevant (from the newest for regex), cursor of the next page or 
+   None if there are no more). If the regex is wrong or the search took 
+   too long, server responds the error instead.
+"""
+
+SEARCH = b"#####SEARCH#####"
+
+PATTERN = "Pattern"
+AUTHOR = "Author"
+REGEX = "Regex"
+
+JSON_SEARCH_FORMAT = {
+    PATTERN: "",
+    AUTHOR: "",
+    CURSOR: "",
+    LIMIT: "",
+}
+
+# ============================== Invite ========================================
+"""
+Adding of many users to the current chat at once:
+
+1. Client sends command __INVITE__ to server (must be in the chat).
+2. Server responds __READY_FOR_TRANSFERRING__.
+3. Client sends json
+        {
+            "ContentType": "ChatMembers",
+            "ContentSize": amount of bytes that will be sent,
+        }
+4. Server responds __READY_FOR_TRANSFERRING__ (old protocol only).
+5. Client sends the list of users (list of User) encoded by codec.
+6. Server adds all the users that exist to the chat in one transaction and
+   responds __READY_FOR_TRANSFERRING__. Active members of the chat get 
+   __NEW_USER__ with the new member or __CHAT_MEMBERS__ with all the members
+   if there are several new ones.
+"""
+
+INVITE = b"#####INVITE#####"
+
+JSON_INVITE_FORMAT = {
+    CONTENT_TYPE: CHAT_MEMBERS,
+    CONTENT_SIZE: "",
+}
+
+# ============================== Channels ======================================
+"""
+Channel is the chat with one-way updates: only its creator and moderators
+publish, while all the other members are subscribers. Every publication has
+the sequence number ("Seq"), the newer ones have the bigger numbers (but 
+not consecutive ones).
+
+Creating of channel:
+1. Client sends command __CREATE_CHANNEL__ to server.
+2. Server responds __READY_FOR_TRANSFERRING__.
+3. Client sends json
+        {
+            "Name": ...,        # name of the new channel
+        }
+4. Server creates the channel and opens it for the client, responds 
+   __READY_FOR_TRANSFERRING__ or __WRONG_NAME__ if it already exists.
+
+Opening of channel is __OPEN_CHAT__ with "ContentType": CHANNEL (the 
+client becomes subscriber if he wasn't) and optional "Seq" - sequence number 
+of the last publication that client has. Server sends via auxiliary socket
+__CHANNEL_PUBLICATIONS__: tuple(seq, list of sequence numbers, list of 
+Publication, the last sequence number of channel). These are the 
+publications newer than seq, or the latest ones if seq is None (there could 
+be a gap then).
+
+Then server sends __NEW_PUBLICATION__: tuple(sequence number of the previous
+publication, sequence number, Publication). If the previous one isn't the 
+last one that client has, some publications were lost and client should 
+catch up. Client that doesn't manage to receive publications gets 
+__CHANNEL_BEHIND__ (the last sequence number of channel) and no more 
+publications until it catches up:
+
+1. Client sends command __CATCH_UP__ to server (must be in the channel).
+2. Server responds __READY_FOR_TRANSFERRING__.
+3. Client sends json
+        {
+            "Seq": ...,         # the last sequence number that client has
+            "Limit": ...,       # max amount of publications
+        }
+4. Server responds __READY_FOR_TRANSFERRING__ and sends the publications 
+   newer than seq as __CHANNEL_PUBLICATIONS__. Client repeats it until it 
+   gets the last publication of channel.
+
+Publications are sent by __MESSAGE__ (or the frame of message) in the 
+channel.
+"""
+
+CREATE_CHANNEL = b"#####CREATE_CHANNEL#####"
+CATCH_UP = b"#####CATCH_UP#####"
+
+SEQ = "Seq"
+
+JSON_CREATE_CHANNEL_FORMAT = {
+    NAME: "",
+}
+
+JSON_CATCH_UP_FORMAT = {
+    SEQ: "",
+    LIMIT: "",
+}
+
+# ============================ Chats activity ==================================
+"""
+Full updates are sent only for the chat (or channel) that client has opened.
+About all the other chats and channels of the user server sends via 
+auxiliary socket __CHATS_ACTIVITY__: list of ChatActivity(name, kind, 
+last_seq, unread), where kind is CHAT or CHANNEL, last_seq is id of the last
+message (sequence number of the last publication) and unread is amount of 
+messages that the user hasn't seen (at most __ACTIVITY_MAX_UNREAD__).
+
+The first one after registration or logging in has all the chats and 
+channels of the user, the next ones only the changed ones: the changes are 
+collected and sent at most once per __ACTIVITY_PERIOD__ seconds. Client 
+doesn't need to reload the list of chats or reopen them to find out about 
+the new messages. The messages are read when the chat is opened, so they 
+aren't unread since then.
+"""
+
+# ========================== Framed protocol ===================================
+"""
+1. Client sends command __FRAMED_PROTOCOL__ right after connecting
+   (before registration or logging in).
+2. Server responds __READY_FOR_TRANSFERRING__.
+3. Since then every transfer via main and auxiliary sockets is a frame:
+
+    +---------+------+-------+--------+---------+----------------+---------+
+    | version | type | flags | stream | chat id | payload length | payload |
+    |   1 B   | 1 B  |  1 B  |  1 B   |   4 B   |      4 B       |   ...   |
+    +---------+------+-------+--------+---------+----------------+---------+
+
+   Commands and answers of the old protocol are sent as frames of type
+   __FRAME_COMMAND__, so all of them keep working. The data transfers
+   don't need __READY_FOR_TRANSFERRING__ and json metadata anymore:
+   one transfer is one frame.
+4. If the flag __FLAG_SIGNED__ is set, the payload starts with the
+   signature of the server (__SIGNATURE_LENGTH__ bytes) of the rest of the
+   payload.
+
+Clients that don't send __FRAMED_PROTOCOL__ use the old protocol.
+"""
+
+FRAMED_PROTOCOL = b"#####FRAMED_PROTOCOL#####"
+
+FRAME_VERSION = 1
+FRAME_HEADER_FORMAT = '!BBBBII'   # version, type, flags, stream, chat id, length
+
+FRAME_COMMAND = 0
+
+FRAME_TYPES = {
+    NEW_MESSAGE: 1,
+    NEW_USER: 2,
+    CHAT_MEMBERS: 3,
+    CHAT_MESSAGES: 4,
+    NEW_PERMISSION: 5,
+    CHATS_LIST: 6,
+    HISTORY_PAGE: 7,
+    SEARCH_RESULTS: 8,
+    NEW_PUBLICATION: 9,
+    CHANNEL_PUBLICATIONS: 10,
+    CHANNEL_BEHIND: 11,
+    CHATS_ACTIVITY: 12,
+}
+
+FRAME_CONTENT_TYPES = {value: key for key, value in FRAME_TYPES.items()}
+
+FLAG_SIGNED = 0b00000001
+
+FLAG_MAC = 0b00000010
+
+SIGNATURE_LENGTH = 256
+MAX_FRAME_PAYLOAD = 64 * 1024 * 1024
+
+# ======================== Multiplexed protocol ================================
+"""
+The same as framed protocol, but there is no auxiliary socket: all the 
+updates are sent via main socket in frames with stream __PUSH_STREAM__,
+while commands and answers use __CONTROL_STREAM__.
+
+1. Client sends command __MULTIPLEXED_PROTOCOL__ right after connecting.
+2. Server responds __READY_FOR_TRANSFERRING__.
+3. Creating of auxiliary connection (after registration or logging in):
+    1. Server sends __READY_FOR_TRANSFERRING__.
+    2. Client responds __READY_FOR_TRANSFERRING__.
+    3. Server sends __READY_FOR_TRANSFERRING__ via __PUSH_STREAM__.
+"""
+
+MULTIPLEXED_PROTOCOL = b"#####MULTIPLEXED_PROTOCOL#####"
+
+CONTROL_STREAM = 0
+PUSH_STREAM = 1
+
+# ============================ Session key =====================================
+"""
+Framed (or multiplexed) protocol only, before registration or logging in.
+
+1. Client sends command __SESSION_KEY__ to server.
+2. Server responds __READY_FOR_TRANSFERRING__.
+3. Client generates random key of __SESSION_KEY_LENGTH__ bytes and sends it
+   encrypted with the public RSA key of server (PKCS#1 OAEP).
+4. Server decrypts the key and responds HMAC-SHA256 of the encrypted key - 
+   only the real server could do it.
+5. Since then all the frames in both directions (via main and auxiliary 
+   sockets) have flag __FLAG_MAC__: the payload starts with HMAC-SHA256 
+   (__MAC_LENGTH__ bytes) of the number of frame in this direction, 
+   the header and the rest of payload. The updates via auxiliary socket
+   aren't signed by RSA anymore.
+   Every socket and every direction has its own key of mac: HMAC-SHA256 of
+   the labels of socket and direction by the session key, so a frame can't
+   be sent back or replayed to the other socket.
+"""
+
+SESSION_KEY = b"#####SESSION_KEY#####"
+SESSION_KEY_LENGTH = 32
+MAC_LENGTH = 32
+
+# labels of the keys of frames (see derive_key)
+MAIN_SOCKET_LABEL = b"main"
+AUX_SOCKET_LABEL = b"aux"
+TO_CLIENT_LABEL = b"server->client"
+TO_SERVER_LABEL = b"client->server"
+
 """
 
 """
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Client side of the framed protocol (see FRAMED_PROTOCOL in constants).
+"""
+
+import socket
+import struct
+import threading
+import zlib
+from collections import namedtuple
+from queue import Queue
+
+from .constants import *
+from .security import make_mac, check_mac, derive_key
+
+FRAME_HEADER = struct.Struct(FRAME_HEADER_FORMAT)
+
+Frame = namedtuple("Frame", ["type", "flags", "chat_id", "payload", "stream"],
+                   defaults=(CONTROL_STREAM,))
+
+
+class BadFrameError(ValueError):
+    pass
+
+
+def get_chat_id(chat_name: str) -> int:
+    """ Get identifier of chat from the header of frame.
+    """
+    if not chat_name:
+        return 0
+    return zlib.crc32(bytes(chat_name, encoding='utf-8'))
+
+
+def pack_frame(frame_type: int, payload: bytes, chat_id=0, flags=0,
+               stream=CONTROL_STREAM, mac_key=None, number=0) -> bytes:
+    if mac_key is None:
+        return FRAME_HEADER.pack(FRAME_VERSION, frame_type, flags, stream,
+                                 chat_id, len(payload)) + payload
+    header = FRAME_HEADER.pack(FRAME_VERSION, frame_type, flags | FLAG_MAC, stream,
+                               chat_id, len(payload) + MAC_LENGTH)
+    return header + make_mac(mac_key, number.to_bytes(8, 'big'), header, payload) + payload
+
+
+class FramedSocket:
+    """ Wrapper of the socket that sends and receives frames.
+
+    sendall sends one frame of type FRAME_COMMAND, recv returns the payload
+    of one frame, so the code of the old protocol works through it.
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._buffer = b''
+        self._write_lock = threading.Lock()
+
+        # keys derived from the session key (see SESSION_KEY) and numbers
+        # of frames in both directions
+        self._send_key = None
+        self._recv_key = None
+        self._sent = 0
+        self._received = 0
+
+    def __getattr__(self, item):
+        return getattr(self._sock, item)
+
+    def set_mac_key(self, key: bytes, socket_label=MAIN_SOCKET_LABEL):
+        """ Since now all the frames are authenticated with the keys derived
+        from the session key for this socket and each direction.
+        """
+        self._send_key = derive_key(key, socket_label, TO_SERVER_LABEL)
+        self._recv_key = derive_key(key, socket_label, TO_CLIENT_LABEL)
+        self._sent = 0
+        self._received = 0
+
+    def send_frame(self, frame_type: int, payload: bytes, chat_id=0, flags=0,
+                   stream=CONTROL_STREAM):
+        with self._write_lock:
+            frame = pack_frame(frame_type, payload, chat_id, flags, stream,
+                               self._send_key, self._sent)
+            self._sent += 1
+            self._sock.sendall(frame)
+
+    def sendall(self, data: bytes):
+        self.send_frame(FRAME_COMMAND, data)
+
+    def _recv_exactly(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self._sock.recv(min(size - len(data), CHUNK))
+            if not chunk:
+                if data:
+                    raise ConnectionError("Connection closed in the middle of frame.")
+                return b''
+            data += chunk
+        return data
+
+    def recv_frame(self):
+        """ Receive the next frame.
+
+        :return: Frame or None if the connection is closed.
+        """
+        header = self._recv_exactly(FRAME_HEADER.size)
+        if not header:
+            return None
+        version, frame_type, flags, stream, chat_id, length = FRAME_HEADER.unpack(header)
+        if version != FRAME_VERSION:
+            raise BadFrameError(f"Unknown version of frame: {version}")
+        if length > MAX_FRAME_PAYLOAD:
+            raise BadFrameError(f"Too big frame: {length} bytes")
+        payload = self._recv_exactly(length) if length else b''
+        if length and not payload:
+            raise ConnectionError("Connection closed in the middle of frame.")
+        if self._recv_key is not None:
+            if not flags & FLAG_MAC or len(payload) < MAC_LENGTH:
+                raise BadFrameError("Frame without mac.")
+            mac, payload = payload[:MAC_LENGTH], payload[MAC_LENGTH:]
+            if not check_mac(mac, self._recv_key, self._received.to_bytes(8, 'big'),
+                             header, payload):
+                raise BadFrameError("Wrong mac of frame.")
+            self._received += 1
+        return Frame(frame_type, flags, chat_id, payload, stream)
+
+    def recv(self, size: int) -> bytes:
+        if not self._buffer:
+            frame = self.recv_frame()
+            if frame is None:
+                return b''
+            self._buffer = frame.payload
+        res, self._buffer = self._buffer[:size], self._buffer[size:]
+        return res
+
+
+class MultiplexedSocket(FramedSocket):
+    """ Framed socket that carries several streams (see MULTIPLEXED_PROTOCOL).
+
+    The background thread reads all the frames and puts them to the queues
+    of their streams, so the main thread could wait for the answers via
+    stream(CONTROL_STREAM) while the other one waits for the updates via
+    stream(PUSH_STREAM).
+    """
+
+    def __init__(self, sock):
+        super().__init__(sock)
+        self._queues = {CONTROL_STREAM: Queue(), PUSH_STREAM: Queue()}
+        threading.Thread(target=self._demultiplexing, daemon=True).start()
+
+    def _demultiplexing(self):
+        while True:
+            try:
+                frame = FramedSocket.recv_frame(self)
+            except (socket.error, BadFrameError):
+                frame = None
+            if frame is None:
+                for queue in self._queues.values():
+                    queue.put(None)
+                break
+            if frame.stream in self._queues:
+                self._queues[frame.stream].put(frame)
+
+    def stream(self, stream_id: int):
+        return FramedStream(self, stream_id)
+
+    def recv_stream_frame(self, stream_id: int):
+        return self._queues[stream_id].get()
+
+
+class FramedStream(FramedSocket):
+    """ One of the streams of MultiplexedSocket.
+    """
+
+    def __init__(self, multiplexed_socket: MultiplexedSocket, stream_id: int):
+        super().__init__(multiplexed_socket)
+        self._stream_id = stream_id
+
+    def send_frame(self, frame_type: int, payload: bytes, chat_id=0, flags=0,
+                   stream=None):
+        self._sock.send_frame(frame_type, payload, chat_id, flags, stream=self._stream_id)
+
+    def set_mac_key(self, key: bytes, socket_label=MAIN_SOCKET_LABEL):
+        self._sock.set_mac_key(key, socket_label)
+
+    def recv_frame(self):
+        return self._sock.recv_stream_frame(self._stream_id)
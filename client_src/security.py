@@ -9,10 +9,13 @@
 
 from Crypto.PublicKey import RSA
 from Crypto.Signature.pkcs1_15 import PKCS115_SigScheme
+from Crypto.Cipher import PKCS1_OAEP
 from Crypto.Hash import SHA256
 from Crypto.Random import get_random_bytes
+import hashlib
+import hmac
 
-from .constants import RSA_PUBLIC_KEY_PATH
+from .constants import RSA_PUBLIC_KEY_PATH, SESSION_KEY_LENGTH
 
 RSA_KEY = None
 RSA_SIGNER = None
@@ -53,6 +56,34 @@ def generate_control_message():
     return get_random_bytes(2048)
 
 
+def generate_session_key() -> tuple:
+    """ Generate random session key.
+
+    :return: tuple(key, key encrypted with the public key of server)
+    """
+    key = get_random_bytes(SESSION_KEY_LENGTH)
+    return key, PKCS1_OAEP.new(RSA_KEY).encrypt(key)
+
+
+def make_mac(key: bytes, *parts: bytes) -> bytes:
+    """ Create HMAC-SHA256 of all the parts using session key.
+    """
+    mac = hmac.new(key, digestmod=hashlib.sha256)
+    for part in parts:
+        mac.update(part)
+    return mac.digest()
+
+
+def check_mac(mac: bytes, key: bytes, *parts: bytes) -> bool:
+    return hmac.compare_digest(mac, make_mac(key, *parts))
+
+
+def derive_key(key: bytes, *labels: bytes) -> bytes:
+    """ Derive the key of one socket and direction from the session key.
+    """
+    return make_mac(key, b'/'.join(labels))
+
+
 # prepare the global variables
 if RSA_KEY is None:
     read_keys()
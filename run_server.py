@@ -9,4 +9,6 @@
 
 from src.server import run
 
-run()
+# the processes of regex pool import this module too
+if __name__ == '__main__':
+    run()
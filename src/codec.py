@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Binary codec of the data that is sent between server and client
+(instead of pickle).
+
+Unlike pickle, loads can create only the basic types (None, bool, int,
+float, str, bytes, list, tuple, set) and the namedtuples from SCHEMAS, so
+it's safe to decode the data from clients.
+
+Lists of the same namedtuples (e.g. history of chat) are encoded by
+columns: all the ints of a column in one struct, all the strings in one
+utf-8 blob, and the columns with repeated strings (e.g. authors of the
+messages) as a table of unique strings + indices.
+"""
+
+import struct
+from itertools import accumulate
+
+from .constants.server_constants import Message, Publication, ChatUser, \
+    ChannelUser, User, Chat, Channel, ChatActivity
+
+CODEC_VERSION = 1
+
+# order matters: index of namedtuple is its id in the encoded data
+SCHEMAS = (Message, Publication, ChatUser, ChannelUser, User, Chat, Channel,
+           ChatActivity)
+SCHEMA_IDS = {schema: i for i, schema in enumerate(SCHEMAS)}
+
+MAX_DEPTH = 32
+
+# tags of values
+T_NONE = 0
+T_TRUE = 1
+T_FALSE = 2
+T_INT = 3
+T_FLOAT = 4
+T_STR = 5
+T_BYTES = 6
+T_LIST = 7
+T_TUPLE = 8
+T_SET = 9
+T_RECORD = 10     # one namedtuple: schema id + values of fields
+T_TABLE = 11      # list of the same namedtuples: schema id + amount + columns
+
+# kinds of columns of T_TABLE
+C_INT = 0         # all the values are int
+C_STR = 1         # all the values are str
+C_NAMES = 2       # str with a lot of repeats: unique strings + indices
+C_VALUES = 3      # anything else, one tagged value after another
+
+INT = struct.Struct('<q')
+FLOAT = struct.Struct('<d')
+SIZE = struct.Struct('<I')
+
+INT_MIN = -2 ** 63
+INT_MAX = 2 ** 63 - 1
+
+# the narrowest struct format for the array of ints: (code, min, max)
+INT_FORMATS = (
+    ('b', -2 ** 7, 2 ** 7 - 1),
+    ('h', -2 ** 15, 2 ** 15 - 1),
+    ('i', -2 ** 31, 2 ** 31 - 1),
+    ('q', INT_MIN, INT_MAX),
+)
+INT_SIZES = {code: struct.calcsize(code) for code, _, _ in INT_FORMATS}
+
+
+class CodecError(ValueError):
+    pass
+
+
+def dumps(obj) -> bytes:
+    """ Encode the object.
+
+    :param obj: the basic types, namedtuples from SCHEMAS and
+                their combinations
+    :raises CodecError: if there is an object of unsupported type.
+    """
+    out = bytearray((CODEC_VERSION,))
+    _encode(obj, out, 0)
+    return bytes(out)
+
+
+def loads(data: bytes):
+    """ Decode the object that was encoded by dumps.
+
+    :raises CodecError: if the data is malformed.
+    """
+    if not data or data[0] != CODEC_VERSION:
+        raise CodecError("Unknown version of encoded data.")
+    try:
+        obj, pos = _decode(memoryview(data), 1, 0)
+    except (struct.error, IndexError, UnicodeDecodeError, TypeError) as e:
+        raise CodecError(f"Malformed data: {e}") from None
+    if pos != len(data):
+        raise CodecError("Extra bytes after encoded data.")
+    return obj
+
+
+# ================================ Encoding ====================================
+
+def _encode(obj, out: bytearray, depth):
+    if depth > MAX_DEPTH:
+        raise CodecError("Too deep nesting.")
+    obj_type = type(obj)
+    if obj is None:
+        out.append(T_NONE)
+    elif obj_type is bool:
+        out.append(T_TRUE if obj else T_FALSE)
+    elif obj_type is int:
+        if not INT_MIN <= obj <= INT_MAX:
+            raise CodecError(f"Too big integer: {obj}")
+        out.append(T_INT)
+        out += INT.pack(obj)
+    elif obj_type is float:
+        out.append(T_FLOAT)
+        out += FLOAT.pack(obj)
+    elif obj_type is str:
+        out.append(T_STR)
+        _encode_bytes(obj.encode('utf-8'), out)
+    elif obj_type is bytes:
+        out.append(T_BYTES)
+        _encode_bytes(obj, out)
+    elif obj_type in SCHEMA_IDS:
+        out.append(T_RECORD)
+        out.append(SCHEMA_IDS[obj_type])
+        for value in obj:
+            _encode(value, out, depth + 1)
+    elif obj_type is list and obj and type(obj[0]) in SCHEMA_IDS \
+            and all(type(el) is type(obj[0]) for el in obj):
+        _encode_table(obj, out, depth)
+    elif obj_type in (list, tuple, set, frozenset):
+        out.append(T_LIST if obj_type is list else
+                   T_TUPLE if obj_type is tuple else T_SET)
+        out += SIZE.pack(len(obj))
+        for value in obj:
+            _encode(value, out, depth + 1)
+    else:
+        raise CodecError(f"Can't encode object of type {obj_type.__name__}.")
+
+
+def _encode_bytes(data: bytes, out: bytearray):
+    out += SIZE.pack(len(data))
+    out += data
+
+
+def _encode_table(records: list, out: bytearray, depth):
+    out.append(T_TABLE)
+    out.append(SCHEMA_IDS[type(records[0])])
+    amount = len(records)
+    out += SIZE.pack(amount)
+    for column in zip(*records):
+        column_type = type(column[0])
+        if column_type is int and all(type(el) is int and INT_MIN <= el <= INT_MAX
+                                      for el in column):
+            out.append(C_INT)
+            _encode_ints(column, out)
+        elif column_type is str and all(type(el) is str for el in column):
+            names = dict.fromkeys(column)
+            if len(names) * 2 <= amount:
+                out.append(C_NAMES)
+                _encode_strings(list(names), out)
+                indices = {name: i for i, name in enumerate(names)}
+                _encode_ints(list(map(indices.__getitem__, column)), out)
+            else:
+                out.append(C_STR)
+                _encode_strings(column, out)
+        else:
+            out.append(C_VALUES)
+            for value in column:
+                _encode(value, out, depth + 1)
+
+
+def _encode_ints(values, out: bytearray):
+    """ Format code + all the ints in the narrowest format.
+    """
+    low, high = min(values, default=0), max(values, default=0)
+    for code, code_min, code_max in INT_FORMATS:
+        if code_min <= low and high <= code_max:
+            break
+    out += bytes(code, 'ascii')
+    out += struct.pack(f'<{len(values)}{code}', *values)
+
+
+def _encode_strings(strings, out: bytearray):
+    """ Amount + lengths (in characters) + one utf-8 blob.
+    """
+    out += SIZE.pack(len(strings))
+    _encode_ints(list(map(len, strings)), out)
+    _encode_bytes(''.join(strings).encode('utf-8'), out)
+
+
+# ================================ Decoding ====================================
+
+def _decode_size(data: memoryview, pos):
+    return SIZE.unpack_from(data, pos)[0], pos + SIZE.size
+
+
+def _decode_bytes(data: memoryview, pos):
+    size, pos = _decode_size(data, pos)
+    end = pos + size
+    if end > len(data):
+        raise CodecError("Unexpected end of data.")
+    return bytes(data[pos:end]), end
+
+
+def _decode_schema(data: memoryview, pos):
+    schema_id = data[pos]
+    if schema_id >= len(SCHEMAS):
+        raise CodecError(f"Unknown schema: {schema_id}")
+    return SCHEMAS[schema_id], pos + 1
+
+
+def _decode(data: memoryview, pos, depth):
+    if depth > MAX_DEPTH:
+        raise CodecError("Too deep nesting.")
+    tag = data[pos]
+    pos += 1
+    if tag == T_NONE:
+        return None, pos
+    elif tag == T_TRUE:
+        return True, pos
+    elif tag == T_FALSE:
+        return False, pos
+    elif tag == T_INT:
+        return INT.unpack_from(data, pos)[0], pos + INT.size
+    elif tag == T_FLOAT:
+        return FLOAT.unpack_from(data, pos)[0], pos + FLOAT.size
+    elif tag == T_STR:
+        res, pos = _decode_bytes(data, pos)
+        return res.decode('utf-8'), pos
+    elif tag == T_BYTES:
+        return _decode_bytes(data, pos)
+    elif tag == T_RECORD:
+        schema, pos = _decode_schema(data, pos)
+        values = []
+        for _ in schema._fields:
+            value, pos = _decode(data, pos, depth + 1)
+            values.append(value)
+        return schema._make(values), pos
+    elif tag == T_TABLE:
+        return _decode_table(data, pos, depth)
+    elif tag in (T_LIST, T_TUPLE, T_SET):
+        amount, pos = _decode_size(data, pos)
+        if amount > len(data) - pos:
+            raise CodecError("Unexpected end of data.")
+        values = []
+        for _ in range(amount):
+            value, pos = _decode(data, pos, depth + 1)
+            values.append(value)
+        if tag == T_TUPLE:
+            return tuple(values), pos
+        elif tag == T_SET:
+            return set(values), pos
+        return values, pos
+    raise CodecError(f"Unknown tag: {tag}")
+
+
+def _decode_table(data: memoryview, pos, depth):
+    schema, pos = _decode_schema(data, pos)
+    amount, pos = _decode_size(data, pos)
+    if amount > len(data) - pos:
+        raise CodecError("Unexpected end of data.")
+    columns = []
+    for _ in schema._fields:
+        kind = data[pos]
+        pos += 1
+        if kind == C_INT:
+            column, pos = _decode_ints(data, pos, amount)
+            columns.append(column)
+        elif kind == C_STR:
+            column, pos = _decode_strings(data, pos)
+            if len(column) != amount:
+                raise CodecError("Wrong length of column.")
+            columns.append(column)
+        elif kind == C_NAMES:
+            names, pos = _decode_strings(data, pos)
+            indices, pos = _decode_ints(data, pos, amount)
+            columns.append([names[i] for i in indices])
+        elif kind == C_VALUES:
+            column = []
+            for _ in range(amount):
+                value, pos = _decode(data, pos, depth + 1)
+                column.append(value)
+            columns.append(column)
+        else:
+            raise CodecError(f"Unknown kind of column: {kind}")
+    return list(map(schema._make, zip(*columns))), pos
+
+
+def _decode_ints(data: memoryview, pos, amount):
+    code = chr(data[pos])
+    if code not in INT_SIZES:
+        raise CodecError(f"Unknown format of ints: {code}")
+    pos += 1
+    return struct.unpack_from(f'<{amount}{code}', data, pos), pos + INT_SIZES[code] * amount
+
+
+def _decode_strings(data: memoryview, pos):
+    amount, pos = _decode_size(data, pos)
+    if amount > len(data) - pos:
+        raise CodecError("Unexpected end of data.")
+    lengths, pos = _decode_ints(data, pos, amount)
+    if min(lengths, default=0) < 0:
+        raise CodecError("Wrong lengths of strings.")
+    blob, pos = _decode_bytes(data, pos)
+    text = blob.decode('utf-8')
+    ends = list(accumulate(lengths))
+    if ends and ends[-1] != len(text):
+        raise CodecError("Wrong lengths of strings.")
+    return [text[end - length:end] for end, length in zip(ends, lengths)], pos
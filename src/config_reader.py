@@ -25,3 +25,22 @@ def config_read(filename, section, globals):
                 globals[key] = type(globals[key])(value)
         except ValueError:
             print(f"Bad value in config file: {key} = {value}")
+
+
+def config_read_profiles(filename, prefix, profiles):
+    """ Update the profiles by the sections of config file with names
+    <prefix><name of profile> (the new names add new profiles).
+
+    :param profiles: dict name of profile -> dict of options, options
+                     with empty values in config file are left as is.
+    """
+    config = configparser.ConfigParser()
+    config.read(filename)
+
+    for section in config.sections():
+        if not section.startswith(prefix):
+            continue
+        profile = profiles.setdefault(section[len(prefix):], {})
+        for key, value in config[section].items():
+            if value:
+                profile[key] = value
@@ -34,4 +34,131 @@ POSSIBLE_PERMISSIONS = {
     CHANNEL: {MODERATOR, MEMBER}
 }
 
+# what UserObserver does when its outbound queue is full
+DROP_OLDEST = 'drop_oldest'     # forget the oldest new message (or member etc.)
+DISCONNECT = 'disconnect'       # close the auxiliary connection of the client
+RESYNC = 'resync'               # forget all the updates and resend the whole chat
+
+OBSERVER_QUEUE_SIZE = 256
+OBSERVER_OVERFLOW_POLICY = DROP_OLDEST
+
+# amount of the latest messages that are sent when somebody opens the chat
+HISTORY_PAGE_SIZE = 50
+# max amount of messages that client could request by one HISTORY command
+MAX_HISTORY_PAGE_SIZE = 500
+
+# the latest messages that ChatAssistant keeps in memory: max amount and max
+# size (bytes), the older ones are read from database page by page
+HISTORY_WINDOW_SIZE = 100
+HISTORY_WINDOW_BYTES = 256 * 1024
+# how often to log the memory taken by the active chats (seconds)
+CHATS_STATS_PERIOD = 60
+
+# chats without active members stay in memory for CHATS_IDLE_TIMEOUT seconds
+# (0 - are ended at once), but there are at most CHATS_MAX_AMOUNT chats and
+# CHATS_MAX_BYTES of their messages in memory
+CHATS_IDLE_TIMEOUT = 300
+CHATS_MAX_AMOUNT = 1000
+CHATS_MAX_BYTES = 64 * 1024 * 1024
+
+# publication of channel is put to the queues of CHANNEL_FANOUT_BATCH
+# subscribers at once, then the other tasks could work. The subscriber with
+# CHANNEL_MAX_LAG updates waiting for sending doesn't get the publications
+# until he catches up
+CHANNEL_FANOUT_BATCH = 512
+CHANNEL_MAX_LAG = 64
+
+# activity in the chats and channels of user that aren't opened is sent at
+# most once per ACTIVITY_PERIOD seconds, the unread messages are counted up
+# to ACTIVITY_MAX_UNREAD
+ACTIVITY_PERIOD = 1.
+ACTIVITY_MAX_UNREAD = 1000
+
+# amount of found messages in one page of search results and the max amount
+# that client could request by one SEARCH command
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# amount of threads (each with its own connection) for reading from database
+DB_READERS = 8
+
+# max amount of names of users, chats and channels whose ids are cached
+DB_ID_CACHE_SIZE = 4096
+# how often to log the metrics of storage, e.g. hit rate of id cache (seconds)
+DB_STATS_PERIOD = 60
+
+# search by regex: amount of compiled patterns that are kept in memory,
+# max time of one search (seconds), amount of processes that run the
+# searches and max amount of characters of one text that are searched
+DB_REGEX_CACHE_SIZE = 256
+DB_REGEX_TIMEOUT = 0.5
+DB_REGEX_WORKERS = 2
+DB_REGEX_MAX_LENGTH = 4096
+
+# pragmas that are applied to every connection to the database, the profiles
+# could be changed (or added) by the sections [pragma:<name>] of config
+DB_PRAGMA_PROFILES = {
+    # every commit is on the disk, even after power loss
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': '-2000',             # KiB
+        'mmap_size': '0',
+        'temp_store': 'DEFAULT',
+        'busy_timeout': '5000',            # ms
+        'wal_autocheckpoint': '1000',      # pages
+    },
+    # the last commits could be lost after power loss (not after crash of
+    # server), the database is never corrupted
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': '-16000',
+        'mmap_size': '268435456',
+        'temp_store': 'MEMORY',
+        'busy_timeout': '5000',
+        'wal_autocheckpoint': '1000',
+    },
+    # no fsync at all: for tests and benchmarks only
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': '-64000',
+        'mmap_size': '1073741824',
+        'temp_store': 'MEMORY',
+        'busy_timeout': '5000',
+        'wal_autocheckpoint': '1000',
+    },
+    # default journaling of sqlite, the readers and the writer block each other
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': '-2000',
+        'mmap_size': '0',
+        'temp_store': 'DEFAULT',
+        'busy_timeout': '5000',
+        'wal_autocheckpoint': '1000',
+    },
+}
+DB_PRAGMA_PROFILE = 'balanced'
+
+# how often the pages of WAL are moved to the database file (seconds,
+# 0 - only by wal_autocheckpoint) and mode of checkpoint
+DB_CHECKPOINT_PERIOD = 30
+DB_CHECKPOINT_MODE = 'PASSIVE'
+
+# group commit of AsyncWorker: max amount of queries in one transaction and
+# how long to wait for more queries before committing (seconds, 0 - don't wait)
+DB_BATCH_SIZE = 256
+DB_BATCH_WAIT = 0.
+
+# 1 - verify every signature made by server right after signing (debug only)
+CRYPTO_SELF_CHECK = 0
+
+# pool of processes for bcrypt and RSA (see src/workers.py)
+CRYPTO_WORKERS = 0          # amount of processes, 0 - amount of CPUs
+CRYPTO_MAX_JOBS = 32        # max amount of jobs in the pool at the same time
+CRYPTO_STATS_PERIOD = 60    # how often to log the metrics of pool (seconds)
+
 config_read(GLOBAL_CONFIG_FILE, 'global', globals())
+config_read_profiles(GLOBAL_CONFIG_FILE, 'pragma:', DB_PRAGMA_PROFILES)
@@ -20,10 +20,24 @@ CHAT_MEMBERS = "ChatMembers"
 CHAT_MESSAGES = "ChatMessages"
 NEW_PERMISSION = "NewPermission"
 CHATS_LIST = "ChatsList"
+HISTORY_PAGE = "HistoryPage"
+SEARCH_RESULTS = "SearchResults"
+NEW_PUBLICATION = "NewPublication"
+CHANNEL_PUBLICATIONS = "ChannelPublications"
+CHANNEL_BEHIND = "ChannelBehind"
+CHATS_ACTIVITY = "ChatsActivity"
 
 
 TRANSFERS_TYPES = {NEW_MESSAGE, NEW_USER,
-                   CHAT_MESSAGES, CHAT_MEMBERS, NEW_PERMISSION}
+                   CHAT_MESSAGES, CHAT_MEMBERS, NEW_PERMISSION, HISTORY_PAGE,
+                   SEARCH_RESULTS, NEW_PUBLICATION, CHANNEL_PUBLICATIONS,
+                   CHANNEL_BEHIND}
+
+# updates that only change what client already has, so they could be dropped
+# when the client is too slow (see OBSERVER_OVERFLOW_POLICY). All the other
+# ones (members, latest messages, list of chats, answers to requests) are
+# never dropped
+INCREMENTAL_TYPES = {NEW_MESSAGE, NEW_USER, NEW_PERMISSION, NEW_PUBLICATION}
 
 JSON_METADATA_OBSERVERS = {
     CHAT_NAME: '',
@@ -43,6 +57,8 @@ ChannelUser = namedtuple("ChannelUser", ["name", "permission", "status"])
 User = namedtuple("User", ["name"])
 Chat = namedtuple("Chat", ["name", "creator", "created"])
 Channel = namedtuple("Channel", ["name", "created", "creator"])
+# activity in the chat or channel (kind - CHAT or CHANNEL), see CHATS_ACTIVITY
+ChatActivity = namedtuple("ChatActivity", ["name", "kind", "last_seq", "unread"])
 
 USERS_CHANGES = 1
 MESSAGE_CHANGES = 0
@@ -12,7 +12,7 @@ from ..constants.server_constants import *
 from ..constants.app_constants import *
 from ..logger import DebugMetaclass
 
-from typing import List, Set
+from typing import List, Set, Tuple
 
 
 class BadStorageParamException(Exception):
@@ -27,6 +27,10 @@ class YouRBannedWroteError(Exception):
     pass
 
 
+class QueryTimeoutException(BadStorageParamException):
+    pass
+
+
 # TODO Integrate Message, ChatUser, Publication and so on.
 class StorageClientInterface(ABC):
 
@@ -44,6 +48,33 @@ class StorageClientInterface(ABC):
         """
         pass
 
+    @classmethod
+    async def prepare(cls, path: str):
+        """ Prepare the storage once, when the server starts (create
+        the tables, launch the shared connections etc).
+
+        :param path: path to database
+        """
+        pass
+
+    @classmethod
+    async def reporting(cls, path: str, period: float):
+        """ Write the metrics of storage (e.g. caches) to the log every
+        period seconds. Works until it's cancelled.
+
+        :param path: path to database
+        """
+        pass
+
+    @classmethod
+    async def checkpointing(cls, path: str, period: float):
+        """ Background maintenance of the database files (e.g. checkpoints
+        of the journal) every period seconds. Works until it's cancelled.
+
+        :param path: path to database
+        """
+        pass
+
     # methods for async with
     async def __aenter__(self):
         await self.start()
@@ -54,7 +85,10 @@ class StorageClientInterface(ABC):
 
     # ============================= user =======================================
     @abstractmethod
-    async def new_user(self, name: str, password: bytearray):
+    async def new_user(self, name: str, password: bytearray) -> int:
+        """ All the methods that change the storage return only after the
+        changes are committed. This one returns id of the new user.
+        """
         pass
 
     @abstractmethod
@@ -79,6 +113,32 @@ class StorageClientInterface(ABC):
                        destination=CHAT):
         pass
 
+    @abstractmethod
+    async def add_users(self, chatOrChannel, users: List[User],
+                        permission=MEMBER,
+                        destination=CHAT) -> List[User]:
+        pass
+
+    @abstractmethod
+    async def get_permission(self, chatOrChannel, user: User, destination=CHAT):
+        """ :return: permission of user in the chat/channel or None if he
+        isn't there.
+        """
+        pass
+
+    @abstractmethod
+    async def get_activity(self, user: User,
+                           max_unread=ACTIVITY_MAX_UNREAD) -> List[ChatActivity]:
+        """ :return: ChatActivity (the last message and the amount of
+        unread ones, at most max_unread) of every chat and channel of user
+        """
+        pass
+
+    @abstractmethod
+    async def set_last_read(self, chatOrChannel, user: User, message_id: int,
+                            destination=CHAT):
+        pass
+
     @abstractmethod
     async def change_user_permission(self, chatOrChannel,
                                      user: User,
@@ -101,7 +161,12 @@ class StorageClientInterface(ABC):
 
     # ============================= chat =======================================
     @abstractmethod
-    async def create_chat(self, creator: User, chat_name: str, members: List[User]):
+    async def create_chat(self, creator: User, chat_name: str,
+                          members: List[User]) -> Tuple[int, List[User]]:
+        pass
+
+    @abstractmethod
+    async def delete_chat(self, chat: Chat):
         pass
 
     @abstractmethod
@@ -123,7 +188,11 @@ class StorageClientInterface(ABC):
     # ========================== channels ======================================
 
     @abstractmethod
-    async def create_channel(self, creator: User, channel_name: str):
+    async def create_channel(self, creator: User, channel_name: str) -> int:
+        pass
+
+    @abstractmethod
+    async def get_channel_info(self, channel_name: str) -> Channel:
         pass
 
     # ========================== messages ======================================
@@ -133,13 +202,43 @@ class StorageClientInterface(ABC):
         pass
 
     @abstractmethod
-    async def add_message(self, chat: Chat, message: Message):
+    async def get_history(self, chat: Chat, limit=HISTORY_PAGE_SIZE,
+                          cursor=None, with_ids=False) -> Tuple[list, str]:
+        """ Get one page of the history of chat.
+
+        :param limit: max amount of messages
+        :param cursor: cursor from the previous page or None for the latest
+                       messages
+        :param with_ids: return tuple(id, message) instead of each message
+        :return: tuple(messages from the oldest to the newest, cursor of the
+                 page of older messages or None if there are no such)
+        """
+        pass
+
+    @abstractmethod
+    def history_cursor(self, message_id: int) -> str:
+        """ Cursor of the page of messages that are older than the given one
+        (id from add_message or get_history).
+        """
+        pass
+
+    @abstractmethod
+    async def add_message(self, chat: Chat, message: Message) -> Tuple[int, Message]:
+        """ :return: id of the message and the message as it's saved
+        """
         pass
 
     @abstractmethod
     async def find_messages(self, chat: Chat, pattern: str,
                             author_name='',
-                            use_regex=False) -> List[Message]:
+                            use_regex=False,
+                            limit=SEARCH_PAGE_SIZE,
+                            cursor=None) -> Tuple[List[Message], str]:
+        """ Find the messages of chat by words.
+
+        :return: tuple(one page of the messages from the most relevant,
+                 cursor of the next page or None if there are no more)
+        """
         pass
 
     # ========================= publications ===================================
@@ -149,8 +248,32 @@ class StorageClientInterface(ABC):
         pass
 
     @abstractmethod
-    async def add_publication(self, channel: Channel, publication: Publication):
+    async def get_publications_history(self, channel: Channel, limit=HISTORY_PAGE_SIZE,
+                                       cursor=None) -> Tuple[List[Tuple[int, Publication]], str]:
+        """ Get one page of the history of channel, like get_history with ids.
+
+        :return: tuple(list of tuple(sequence number, publication) from the
+                 oldest to the newest, cursor of the page of older ones)
+        """
+        pass
+
+    @abstractmethod
+    async def get_publications_after(self, channel: Channel, seq: int,
+                                     limit=HISTORY_PAGE_SIZE) -> List[Tuple[int, Publication]]:
+        """ Get at most limit publications that are newer than the one
+        with sequence number seq (from the oldest).
+        """
+        pass
+
+    @abstractmethod
+    async def add_publication(self, channel: Channel,
+                              publication: Publication) -> Tuple[int, Publication]:
+        """ :return: sequence number of the publication (the newer ones
+        have the bigger numbers) and the publication as it's saved
+        """
         pass
 
-    async def find_publication(self, pattern: str, use_regex=False) -> List[Publication]:
+    async def find_publication(self, pattern: str, use_regex=False,
+                               limit=SEARCH_PAGE_SIZE,
+                               cursor=None) -> Tuple[List[Publication], str]:
         pass
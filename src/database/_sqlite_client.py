@@ -81,11 +81,26 @@ from ._client_interface import *
 from ..logger import logger, DebugMetaclassForAbstract
 from ..constants.database_constants import *
 
+import datetime
+import json
+import re
 import sqlite3
+import threading
 import curio
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
 
-from functools import partial, wraps
+from functools import lru_cache, wraps
+
+from ..workers import TimeLimitedPool
+
+try:
+    from re import _parser as sre_parse, _compiler as sre_compile
+except ImportError:         # python < 3.11
+    import sre_parse
+    import sre_compile
 
 
 PREPARE_DATABASE_QUERY = f'''
@@ -208,6 +223,10 @@ CREATE TABLE IF NOT EXISTS ChatMessages (
     FOREIGN KEY (AuthorID) REFERENCES Users(Id) ON DELETE CASCADE
 );
 
+-- Index for reading the history of chat page by page (see get_history):
+-- all the messages of chat are ordered by Id, so the page is one range scan
+CREATE INDEX IF NOT EXISTS ChatMessagesHistory ON ChatMessages(CID, Id);
+
 -- Trigger that adds new record to the UsersChats if 
 -- new chat creates  
 CREATE TRIGGER IF NOT EXISTS ChatCreatorUpdater AFTER INSERT ON Chats
@@ -226,25 +245,331 @@ CREATE TRIGGER IF NOT EXISTS ChannelCreatorUpdater AFTER INSERT ON Channels
 
 '''
 
+# Changes of schema for the databases that were created by the older
+# versions of server. The number of applied migrations is saved in
+# PRAGMA user_version, so each of them is executed only once.
+SCHEMA_MIGRATIONS = (
+    # 1. Indexes for reading the messages of one chat/channel: the rows of
+    #    chat are one range of index and they are already ordered, so there
+    #    is neither full scan nor sorting (see get_messages, get_publications)
+    '''
+    CREATE INDEX IF NOT EXISTS ChatMessagesCreated ON ChatMessages(CID, Created);
+    CREATE INDEX IF NOT EXISTS ChannelMessagesHistory ON ChannelMessages(CID, Id);
+    CREATE INDEX IF NOT EXISTS ChannelMessagesCreated ON ChannelMessages(CID, Created);
+    ''',
+
+    # 2. Full-text search of the text messages (see find_messages). FTS5 tables
+    #    keep only the index, the text is read from the messages tables by rowid.
+    #    CID is indexed too, so the messages of one chat are found by the index
+    #    (it doesn't affect the rank). Triggers keep them in sync, the existing
+    #    messages are indexed once.
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS ChatMessagesSearch 
+        USING fts5(Content, CID, content='ChatMessages', content_rowid='Id');
+    INSERT INTO ChatMessagesSearch (ChatMessagesSearch, rank) VALUES ('rank', 'bm25(1.0, 0.0)');
+
+    CREATE TRIGGER IF NOT EXISTS ChatMessagesSearchInsert AFTER INSERT ON ChatMessages
+        WHEN new.Type={TEXT}
+        BEGIN
+            INSERT INTO ChatMessagesSearch (rowid, Content, CID) 
+                VALUES (new.Id, new.Content, new.CID);
+        END;
+
+    CREATE TRIGGER IF NOT EXISTS ChatMessagesSearchDelete AFTER DELETE ON ChatMessages
+        WHEN old.Type={TEXT}
+        BEGIN
+            INSERT INTO ChatMessagesSearch (ChatMessagesSearch, rowid, Content, CID) 
+                VALUES ('delete', old.Id, old.Content, old.CID);
+        END;
+
+    CREATE TRIGGER IF NOT EXISTS ChatMessagesSearchUpdate 
+        AFTER UPDATE OF Type, Content, CID ON ChatMessages
+        BEGIN
+            INSERT INTO ChatMessagesSearch (ChatMessagesSearch, rowid, Content, CID) 
+                SELECT 'delete', old.Id, old.Content, old.CID WHERE old.Type={TEXT};
+            INSERT INTO ChatMessagesSearch (rowid, Content, CID) 
+                SELECT new.Id, new.Content, new.CID WHERE new.Type={TEXT};
+        END;
+
+    INSERT INTO ChatMessagesSearch (rowid, Content, CID) 
+        SELECT Id, Content, CID FROM ChatMessages WHERE Type={TEXT};
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS ChannelMessagesSearch 
+        USING fts5(Content, CID, content='ChannelMessages', content_rowid='Id');
+    INSERT INTO ChannelMessagesSearch (ChannelMessagesSearch, rank) VALUES ('rank', 'bm25(1.0, 0.0)');
+
+    CREATE TRIGGER IF NOT EXISTS ChannelMessagesSearchInsert AFTER INSERT ON ChannelMessages
+        WHEN new.Type={TEXT}
+        BEGIN
+            INSERT INTO ChannelMessagesSearch (rowid, Content, CID) 
+                VALUES (new.Id, new.Content, new.CID);
+        END;
+
+    CREATE TRIGGER IF NOT EXISTS ChannelMessagesSearchDelete AFTER DELETE ON ChannelMessages
+        WHEN old.Type={TEXT}
+        BEGIN
+            INSERT INTO ChannelMessagesSearch (ChannelMessagesSearch, rowid, Content, CID) 
+                VALUES ('delete', old.Id, old.Content, old.CID);
+        END;
+
+    CREATE TRIGGER IF NOT EXISTS ChannelMessagesSearchUpdate 
+        AFTER UPDATE OF Type, Content, CID ON ChannelMessages
+        BEGIN
+            INSERT INTO ChannelMessagesSearch (ChannelMessagesSearch, rowid, Content, CID) 
+                SELECT 'delete', old.Id, old.Content, old.CID WHERE old.Type={TEXT};
+            INSERT INTO ChannelMessagesSearch (rowid, Content, CID) 
+                SELECT new.Id, new.Content, new.CID WHERE new.Type={TEXT};
+        END;
+
+    INSERT INTO ChannelMessagesSearch (rowid, Content, CID) 
+        SELECT Id, Content, CID FROM ChannelMessages WHERE Type={TEXT};
+    ''',
+
+    # 3. The last message of chat/channel that member has read (see
+    #    get_activity). Everything that was written before it is read.
+    '''
+    ALTER TABLE UsersChats ADD COLUMN LastRead INTEGER DEFAULT 0 NOT NULL;
+    ALTER TABLE UsersChannels ADD COLUMN LastRead INTEGER DEFAULT 0 NOT NULL;
+    UPDATE UsersChats SET LastRead=coalesce(
+        (SELECT max(Id) FROM ChatMessages WHERE CID=UsersChats.CID), 0);
+    UPDATE UsersChannels SET LastRead=coalesce(
+        (SELECT max(Id) FROM ChannelMessages WHERE CID=UsersChannels.CID), 0);
+    ''',
+
+    # 4. Type of ChannelMessages is TEXT, so the triggers of the version 2
+    #    compared '0' with {TEXT} and never indexed the new publications.
+    #    They compare the integer now and the index is built again.
+    f'''
+    DROP TRIGGER IF EXISTS ChannelMessagesSearchInsert;
+    DROP TRIGGER IF EXISTS ChannelMessagesSearchDelete;
+    DROP TRIGGER IF EXISTS ChannelMessagesSearchUpdate;
+
+    CREATE TRIGGER ChannelMessagesSearchInsert AFTER INSERT ON ChannelMessages
+        WHEN CAST(new.Type AS INTEGER)={TEXT}
+        BEGIN
+            INSERT INTO ChannelMessagesSearch (rowid, Content, CID) 
+                VALUES (new.Id, new.Content, new.CID);
+        END;
+
+    CREATE TRIGGER ChannelMessagesSearchDelete AFTER DELETE ON ChannelMessages
+        WHEN CAST(old.Type AS INTEGER)={TEXT}
+        BEGIN
+            INSERT INTO ChannelMessagesSearch (ChannelMessagesSearch, rowid, Content, CID) 
+                VALUES ('delete', old.Id, old.Content, old.CID);
+        END;
+
+    CREATE TRIGGER ChannelMessagesSearchUpdate 
+        AFTER UPDATE OF Type, Content, CID ON ChannelMessages
+        BEGIN
+            INSERT INTO ChannelMessagesSearch (ChannelMessagesSearch, rowid, Content, CID) 
+                SELECT 'delete', old.Id, old.Content, old.CID 
+                WHERE CAST(old.Type AS INTEGER)={TEXT};
+            INSERT INTO ChannelMessagesSearch (rowid, Content, CID) 
+                SELECT new.Id, new.Content, new.CID WHERE CAST(new.Type AS INTEGER)={TEXT};
+        END;
+
+    INSERT INTO ChannelMessagesSearch (ChannelMessagesSearch) VALUES ('delete-all');
+    INSERT INTO ChannelMessagesSearch (rowid, Content, CID) 
+        SELECT Id, Content, CID FROM ChannelMessages WHERE Type={TEXT};
+    ''',
+)
+
+
+def migrate(conn):
+    """ Apply all the SCHEMA_MIGRATIONS that haven't been applied yet
+    to the database (each in its own transaction).
+
+    :param conn: connection to the database
+    :return: the version of schema
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for version, script in enumerate(SCHEMA_MIGRATIONS[version:], version + 1):
+        logger.info(f"[*] Migrating the database to the version {version}...")
+        conn.executescript(f'BEGIN; {script} PRAGMA user_version={version}; COMMIT;')
+    return version
+
+
 STOP_WORKING = '############# STOP_WORKING ##############'
 
+# pragmas that could be in DB_PRAGMA_PROFILES
+PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store',
+           'busy_timeout', 'wal_autocheckpoint')
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+def get_pragma_profile(name=DB_PRAGMA_PROFILE) -> dict:
+    """ Get the pragmas of the profile from DB_PRAGMA_PROFILES.
+
+    :raise ValueError: if there is no such profile or it has wrong pragmas.
+    """
+    if name not in DB_PRAGMA_PROFILES:
+        raise ValueError(f"There is no pragma profile {name}.")
+    profile = DB_PRAGMA_PROFILES[name]
+    for key, value in profile.items():
+        if key not in PRAGMAS:
+            raise ValueError(f"Unknown pragma {key} in profile {name}.")
+        # the values are put into the query, so only numbers and words
+        if not re.fullmatch(r'-?\w+', str(value)):
+            raise ValueError(f"Bad value of pragma {key} in profile {name}: {value}")
+    return profile
+
+
+def apply_pragmas(conn, profile: dict, journal_mode=False):
+    """ Apply the pragmas of the profile to the connection.
+
+    :param journal_mode: change journal mode too. It's saved in the
+                         database file, so it's done only once, by the
+                         connection that can write.
+    """
+    for key, value in profile.items():
+        if key != 'journal_mode' or journal_mode:
+            conn.execute(f'PRAGMA {key}={value}')
+
+
+class ManyParams(list):
+    """ List of params for one query, that AsyncWorker executes by
+    one executemany.
+    """
+
+
+class Statements(list):
+    """ List of tuple(query, params) that AsyncWorker executes one after
+    another as one query: all of them are committed or none. The params
+    could be ManyParams.
+    """
+
+
+STATEMENTS = '############# STATEMENTS ##############'    # query of Statements
+
 
 class NotWorkingException(Exception):
     pass
 
 
+class QueryResult:
+    """ Outcome of the query that was executed by AsyncWorker.
+    """
+
+    def __init__(self):
+        self._done = curio.Event()
+        self.error = None
+        self.row_id = None
+
+    async def _set(self, error=None, row_id=None):
+        self.error = error
+        self.row_id = row_id
+        await self._done.set()
+
+    async def wait(self):
+        """ Wait until the query is committed.
+
+        :return: id of the last row inserted by the query (lastrowid)
+        :raises Exception: the exception of the query, if it failed.
+        """
+        await self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.row_id
+
+
+USER = 0     # kind of names in IdCache (besides CHAT and CHANNEL)
+
+
+class IdCache:
+    """ LRU cache of the ids of users, chats and channels by their names.
+
+    Ids are AUTOINCREMENT, so they are never reused and only the names
+    that were found are cached. The entries must be invalidated when
+    the row is deleted or renamed.
+
+    Every invalidation increases the generation: the id that was read
+    from database before it can't be put to the cache (the row could be
+    deleted while the query was running).
+    """
+
+    def __init__(self, size=DB_ID_CACHE_SIZE):
+        """ Initialization.
+
+        :param size: max amount of names in the cache (0 - don't cache)
+        """
+        self._size = size
+        self._ids = OrderedDict()    # (kind, name) -> id
+        self.generation = 0
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, name):
+        """ Get id of the name.
+
+        :param kind: USER, CHAT or CHANNEL
+        :return: id or None if there is no such name in the cache
+        """
+        key = (kind, name)
+        res = self._ids.get(key)
+        if res is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._ids.move_to_end(key)
+        return res
+
+    def put(self, kind, name, value, generation):
+        """ Remember the id that was read from database.
+
+        :param generation: generation of the cache before the reading
+        """
+        if not value or generation != self.generation or self._size <= 0:
+            return
+        self._ids[(kind, name)] = value
+        self._ids.move_to_end((kind, name))
+        if len(self._ids) > self._size:
+            self._ids.popitem(last=False)
+
+    def discard(self, kind, name):
+        self.generation += 1
+        self._ids.pop((kind, name), None)
+
+    def discard_kind(self, kind):
+        """ Forget all the names of the given kind.
+        """
+        self.generation += 1
+        for key in [key for key in self._ids if key[0] == kind]:
+            del self._ids[key]
+
+    def stats(self) -> dict:
+        total = (self.hits + self.misses) or 1
+        return {
+            'size': len(self._ids),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total,
+        }
+
+
 class AsyncWorker(metaclass=DebugMetaclass):
     """ Worker that handlers all the queries that make changes in database.
     It should be singleton in order to provide data integrity.
 
     All the queries are sent via UniversalQueue from AsyncWorker.get_queue() in
-    such format:  tuple(query: str, params: tuple)
+    such format:  tuple(query: str, params: tuple) or
+    tuple(query: str, params: tuple, QueryResult) if the sender wants to
+    know the outcome of the query (see AsyncWorker.execute). If params is
+    ManyParams, the query is executed for each of them (see
+    AsyncWorker.execute_many). If params is Statements (and query is
+    STATEMENTS), all of them are executed (see AsyncWorker.execute_statements).
+
+    Queries are committed in groups: the worker takes everything that is
+    queued (up to batch_size queries) and executes it in one transaction,
+    so there is one fsync per group instead of one per query.
     """
 
     __instances = {}
 
     # FIXME I DON'T KNOW WHETHER IT WORKS
-    def __new__(cls, filedb):
+    def __new__(cls, filedb, *args, **kwargs):
         """ Realization of pattern singleton.
 
         Before creating it check is there already created worker for such
@@ -255,59 +580,674 @@ class AsyncWorker(metaclass=DebugMetaclass):
             AsyncWorker.__instances[filedb] = super(AsyncWorker, cls).__new__(cls)
         return AsyncWorker.__instances[filedb]
 
-    def __init__(self, filedb):
+    def __init__(self, filedb, batch_size=DB_BATCH_SIZE, batch_wait=DB_BATCH_WAIT,
+                 pragmas=None):
         """ Create new asynchronous worker for the given database.
 
         :param filedb: path to database
+        :param batch_size: max amount of queries in one transaction
+        :param batch_wait: how long to wait for more queries before
+                           committing the group (seconds, 0 - don't wait)
+        :param pragmas: pragma profile of connection (see get_pragma_profile)
         """
         self._filename = filedb
+        self._pragmas = pragmas or {}
         self._queue = curio.UniversalQueue()   # queue that
         self._conn = None
         self._curs = None
         self.is_work = False
+        self._batch_size = max(1, batch_size)
+        self._batch_wait = batch_wait
 
-    # TODO try make this method to do more queries at one commit
-    # TODO add benchmark for testing
     async def start(self):
         """ Connect and start the mainloop.
         """
         # check_same_thread=False because we provide access to the database
         # from different threads
         self._conn = sqlite3.connect(self._filename, check_same_thread=False)
-        curs = self._conn.cursor()
+        apply_pragmas(self._conn, self._pragmas)
         self.is_work = True
         logger.info(f"[*] Worker for {self._filename} started to work...")
 
-        while True:
+        stop = False
+        while not stop:
+            batch = []
             try:
-                query, params = await self._queue.get()
-                if query == STOP_WORKING:
-                    break
-                logger.info(f'[*] Executing query {query} with params {params}...')
+                stop = await self._get_batch(batch)
+                if not batch:
+                    continue
+                logger.info(f'[*] Executing {len(batch)} queries in one transaction...')
 
                 # curio provides tool for asynchronous launching of synchronous
                 # function
-                await curio.run_in_thread(partial(curs.execute, query, params))
-                self._conn.commit()
+                outcomes = await curio.run_in_thread(self._execute_batch, batch)
+                for (query, params, result), (error, row_id) in zip(batch, outcomes):
+                    if error is not None:
+                        logger.error(f'[*] Query {query} with params {params} failed: {error}')
+                    if result is not None:
+                        await result._set(error, row_id)
             except curio.CancelledError:
                 logger.info(f"[*] Worker for {self._filename} canceled. Exiting...")
                 self._conn.rollback()   # it could be not finished changing
                 self._conn.close()
+                self.is_work = False
+                await self._fail_pending(batch)
                 break
             except Exception as e:
                 logger.exception(e)
                 self._conn.rollback()
+                # nobody should wait forever
+                for _, _, result in batch:
+                    if result is not None and not result._done.is_set():
+                        await result._set(e)
+
+    async def _fail_pending(self, batch: list):
+        """ Fail the results of the queries of unfinished batch and of all
+        the queued ones, so nobody waits for them forever.
+        """
+        error = NotWorkingException(f"Worker for {self._filename} doesn't work.")
+        items = list(batch)
+        while not self._queue.empty():
+            items.append(await self._queue.get())
+        for item in items:
+            result = item[2] if len(item) == 3 else None
+            if result is not None and not result._done.is_set():
+                await result._set(error)
+
+    async def _get_batch(self, batch: list) -> bool:
+        """ Get the queries from queue: wait for the first one, then take
+        all the queued ones (and the ones that come during batch_wait)
+        until there are batch_size of them.
+
+        :param batch: list for tuples(query, params, QueryResult or None)
+        :return: True if STOP_WORKING is got.
+        """
+        deadline = None
+        while len(batch) < self._batch_size:
+            if batch and self._queue.empty():
+                if self._batch_wait <= 0:
+                    break
+                if deadline is None:
+                    deadline = await curio.clock() + self._batch_wait
+                timeout = deadline - await curio.clock()
+                if timeout <= 0:
+                    break
+                item = await curio.ignore_after(timeout, self._queue.get())
+                if item is None:
+                    break
+            else:
+                item = await self._queue.get()
+            if item[0] == STOP_WORKING:
+                return True
+            batch.append(item if len(item) == 3 else (*item, None))
+        return False
+
+    def _execute_batch(self, batch: list) -> list:
+        """ Execute all the queries in one transaction, the neighbour
+        queries with the same text are executed by one executemany
+        (unless somebody waits for the id of row of any of them).
+
+        If the transaction fails, queries are executed one by one
+        (each in its own transaction), so only the wrong ones fail.
+
+        :return: list of tuple(exception or None, lastrowid or None)
+        """
+        curs = self._conn.cursor()
+        row_ids = [None] * len(batch)
+        try:
+            start = 0
+            while start < len(batch):
+                query, params, _ = batch[start]
+                if type(params) in (ManyParams, Statements):
+                    row_ids[start] = self._execute_one(curs, query, params)
+                    start += 1
+                    continue
+                end = start + 1
+                while end < len(batch) and batch[end][0] == query \
+                        and type(batch[end][1]) not in (ManyParams, Statements):
+                    end += 1
+                if any(el[2] is not None for el in batch[start:end]):
+                    for i in range(start, end):
+                        curs.execute(query, batch[i][1])
+                        row_ids[i] = curs.lastrowid
+                else:
+                    curs.executemany(query, [el[1] for el in batch[start:end]])
+                start = end
+            self._conn.commit()
+            return [(None, row_id) for row_id in row_ids]
+        except Exception as e:
+            self._conn.rollback()
+            if len(batch) == 1:
+                return [(e, None)]
+
+        outcomes = []
+        for query, params, _ in batch:
+            try:
+                row_id = self._execute_one(curs, query, params)
+                self._conn.commit()
+                outcomes.append((None, row_id))
+            except Exception as e:
+                self._conn.rollback()
+                outcomes.append((e, None))
+        return outcomes
+
+    @staticmethod
+    def _execute_one(curs, query, params):
+        """ Execute one item of batch (without committing).
+
+        :return: lastrowid (of the first statement of Statements) or None
+                 for ManyParams
+        """
+        if type(params) is ManyParams:
+            curs.executemany(query, params)
+            return None
+        if type(params) is Statements:
+            row_ids = [AsyncWorker._execute_one(curs, *statement) for statement in params]
+            return row_ids[0] if row_ids else None
+        curs.execute(query, params)
+        return curs.lastrowid
+
+    async def execute(self, query: str, params=()):
+        """ Put the query to the queue and wait until it's committed.
+
+        :return: id of the last row inserted by the query (lastrowid)
+        :raises Exception: the exception of the query, if it failed.
+        """
+        result = QueryResult()
+        await self._queue.put((query, params, result))
+        return await result.wait()
+
+    async def execute_many(self, query: str, params_list):
+        """ Put the query with many params to the queue and wait until
+        all of them are committed (they are in one transaction).
+
+        :raises Exception: the exception of the query, if it failed.
+        """
+        result = QueryResult()
+        await self._queue.put((query, ManyParams(params_list), result))
+        await result.wait()
+
+    async def execute_statements(self, statements):
+        """ Put the list of tuple(query, params) to the queue and wait until
+        all of them are committed in one transaction (if any of them fails,
+        none is committed).
+
+        :return: id of the row inserted by the first of them (lastrowid)
+        :raises Exception: the exception of the failed query.
+        """
+        result = QueryResult()
+        await self._queue.put((STATEMENTS, Statements(statements), result))
+        return await result.wait()
 
     def get_queue(self):
         """ Get queue for sending the queries.
 
         You should put the query in such format: tuple(query: str, params: tuple)
+        or tuple(query: str, params: tuple, QueryResult)
         :return: UniversalQueue that could be used asynchronously and in
                  a classical way
         """
         return self._queue
 
 
+class SqliteStorage(metaclass=DebugMetaclass):
+    """ Process-wide service of the database: the pool of threads for reading
+    and the only AsyncWorker for writing.
+
+    Database works in WAL mode (unless the pragma profile says otherwise),
+    so the readers never block the writer (and vice versa). Every thread of pool has its own read-only connection, and
+    the query is executed and fetched in that thread at once, so the clients
+    get the finished rows and never share a cursor. The queries with the
+    limit of time (search by regex) are executed in the processes of
+    TimeLimitedPool instead, which are killed if the query takes too long.
+
+    All the SqliteStorageClient of the same database share it, so there
+    are at most max_readers + regex_workers + 1 connections however many
+    clients are connected. Singleton (unique for each database).
+    """
+
+    __instances = {}
+
+    def __new__(cls, filedb, *args, **kwargs):
+        if filedb not in SqliteStorage.__instances:
+            instance = super(SqliteStorage, cls).__new__(cls)
+            instance._initialized = False
+            SqliteStorage.__instances[filedb] = instance
+        return SqliteStorage.__instances[filedb]
+
+    def __init__(self, filedb, max_readers=DB_READERS, profile=DB_PRAGMA_PROFILE,
+                 regex_workers=DB_REGEX_WORKERS):
+        """ Initialization, but not launching.
+
+        :param filedb: path to database
+        :param max_readers: amount of threads (and connections) for reading
+        :param regex_workers: amount of processes for the queries with
+                              the limit of time
+        :param profile: name of pragma profile of all the connections
+                        (see DB_PRAGMA_PROFILES)
+        :raise ValueError: if the profile is wrong.
+        """
+        if self._initialized:
+            return
+        self._pragmas = get_pragma_profile(profile)
+        self._initialized = True
+        self._filename = filedb
+        self.worker = AsyncWorker(filedb, pragmas=self._pragmas)
+        self.ids = IdCache()
+        self._worker_task = None
+        self._max_readers = max(1, max_readers)
+        self._readers = None
+        self._regex_pool = TimeLimitedPool(regex_workers)
+        self._local = threading.local()         # connection of each thread
+        self._connections = []                  # all of them, for closing
+        self._connections_lock = threading.Lock()
+        self._start_lock = curio.Lock()
+        self.is_work = False
+
+    async def start(self):
+        """ Create all the tables, indexes and triggers (and migrate the old
+        database), set the journal mode of pragma profile and launch the
+        worker. It's done only once, the next calls do nothing.
+        """
+        async with self._start_lock:
+            if self.is_work:
+                return
+            logger.info(f"[*] Preparing the database {self._filename}...")
+            conn = sqlite3.connect(self._filename, check_same_thread=False)
+            try:
+                await curio.run_in_thread(self._prepare, conn)
+            finally:
+                conn.close()
+            self._readers = ThreadPoolExecutor(self._max_readers,
+                                               thread_name_prefix='sqlite-reader')
+            await curio.run_in_thread(self._regex_pool.start)
+            # launch worker in background
+            self._worker_task = await curio.spawn(self.worker.start, daemon=True)
+            self.is_work = True
+
+    def _prepare(self, conn):
+        # journal mode is saved in the file, so all the next
+        # connections (including worker's one) use it too
+        apply_pragmas(conn, self._pragmas, journal_mode=True)
+        conn.executescript(PREPARE_DATABASE_QUERY)
+        migrate(conn)
+
+    async def end(self):
+        """ Stop the worker and the readers, close all the connections.
+        """
+        if self._worker_task is not None:
+            await self._worker_task.cancel()
+            self._worker_task = None
+        if self._readers is not None:
+            self._readers.shutdown(wait=True)
+            self._readers = None
+        self._regex_pool.shutdown()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+        self.is_work = False
+
+    def _get_connection(self):
+        """ Read-only connection of the current thread (created
+        at the first query).
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # check_same_thread=False only for closing from end()
+            conn = _connect_read_only(self._filename, self._pragmas,
+                                      check_same_thread=False)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _fetch(self, query, params, one):
+        return _fetch_rows(self._get_connection(), query, params, one)
+
+    async def reporting(self, period: float):
+        """ Write the metrics of id cache to the log every period
+        seconds (if something has changed).
+        """
+        last = None
+        while True:
+            await curio.sleep(period)
+            stats = self.ids.stats()
+            if stats != last:
+                logger.info(f"[*] Id cache of {self._filename}: {stats}")
+                last = stats
+
+    async def checkpointing(self, period: float, mode=DB_CHECKPOINT_MODE):
+        """ Move the pages of WAL to the database file every period seconds
+        (by its own connection, so the worker doesn't wait for it). Then
+        wal_autocheckpoint of commits has almost nothing to do.
+
+        :param mode: PASSIVE, FULL, RESTART or TRUNCATE (see CHECKPOINT_MODES)
+        """
+        mode = mode.upper()
+        if period <= 0:
+            return
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Bad mode of checkpoint: {mode}")
+        conn = sqlite3.connect(self._filename, check_same_thread=False)
+        last = None
+        try:
+            apply_pragmas(conn, self._pragmas)
+            while True:
+                await curio.sleep(period)
+                res = await curio.run_in_thread(self._checkpoint, conn, mode)
+                busy, log, done = res
+                if log > 0 and res != last:
+                    logger.info(f"[*] Checkpoint of {self._filename}: {done} of {log} "
+                                f"pages of WAL, busy: {busy}")
+                last = res
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _checkpoint(conn, mode):
+        return conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+
+    async def read(self, query: str, params=(), one=False, timeout=None):
+        """ Execute the query that doesn't change the database in one
+        of the threads for reading (waits if all of them are busy).
+
+        The query with timeout is executed in the process of regex pool
+        instead (only there the function REGEXP exists).
+
+        :param one: return only the first row (or None)
+        :param timeout: max time of execution (seconds), e.g. for the
+                        queries with REGEXP
+        :return: list of rows
+        :raise QueryTimeoutException: if the query took more than timeout.
+        """
+        if self._readers is None:
+            raise NotWorkingException(f"Storage for {self._filename} isn't started.")
+        if timeout is None:
+            return await curio.run_in_executor(self._readers, self._fetch, query,
+                                               params, one)
+        try:
+            return await self._regex_pool.run(timeout, _fetch_regex, self._filename,
+                                              self._pragmas, query, params, one)
+        except TimeoutError:
+            raise QueryTimeoutException(f"The query took more than {timeout} seconds.") from None
+
+
+def _connect_read_only(filedb, pragmas: dict, **kwargs):
+    uri = Path(filedb).absolute().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, **kwargs)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def _fetch_rows(conn, query, params, one):
+    curs = conn.execute(query, params)
+    try:
+        return curs.fetchone() if one else curs.fetchall()
+    finally:
+        curs.close()
+
+
+def _regexp(pattern, value):
+    """ Function REGEXP of sql: value REGEXP pattern. Only the first
+    DB_REGEX_MAX_LENGTH characters of value are searched.
+    """
+    if value is None:
+        return False
+    return _compile_regex(pattern).search(value, 0, DB_REGEX_MAX_LENGTH) is not None
+
+
+_regex_connections = {}         # of the process of regex pool, by database
+
+
+def _fetch_regex(filedb, pragmas: dict, query, params, one):
+    """ Execute the query in the process of regex pool (see SqliteStorage.read)
+    by its own read-only connection, with the function REGEXP.
+    """
+    conn = _regex_connections.get(filedb)
+    if conn is None:
+        conn = _regex_connections[filedb] = _connect_read_only(filedb, pragmas)
+        conn.create_function('REGEXP', 2, _regexp, deterministic=True)
+    return _fetch_rows(conn, query, params, one)
+
+
+def _make_cursor(message_id: int) -> str:
+    return format(message_id, 'x')
+
+
+def _parse_cursor(cursor) -> int:
+    """ Get Id of message from the cursor of history (see get_history).
+    """
+    if cursor is None:
+        return 2 ** 63 - 1   # max rowid of sqlite
+    try:
+        message_id = int(cursor, 16)
+    except (ValueError, TypeError):
+        raise BadStorageParamException(f"Bad cursor of history: {cursor}") from None
+    # sqlite can't take anything bigger than 64-bit integer as parameter
+    if not 0 <= message_id < 2 ** 63:
+        raise BadStorageParamException(f"Bad cursor of history: {cursor}")
+    return message_id
+
+
+def _make_search_query(pattern: str, c_id=None) -> str:
+    """ Convert the pattern of user to the query of FTS5: all the words
+    must be in the message, the word that ends with * is a prefix.
+    Words are quoted, so the syntax of FTS5 can't be used.
+
+    :param c_id: find only in this chat/channel (if given)
+    :return: query or empty string if there are no words in pattern
+    """
+    words = ' '.join(f'"{word}"*' if prefix else f'"{word}"'
+                     for word, prefix in re.findall(r'(\w+)(\*?)', pattern))
+    if not words:
+        return ''
+    query = f'Content : ({words})'
+    return query if c_id is None else f'CID : "{c_id}" AND {query}'
+
+
+@lru_cache(maxsize=DB_REGEX_CACHE_SIZE)
+def _compile_regex(pattern: str):
+    """ Compiled regex (the same patterns are used for every row, so they
+    are compiled only once).
+    """
+    return re.compile(pattern)
+
+
+# letters that match non-ascii characters too under re.IGNORECASE
+# (e.g. k - Kelvin sign), but LIKE folds only the ascii ones
+_UNICODE_FOLDED = frozenset('iksIKS')
+
+
+def _flatten_regex(parsed):
+    """ Items of the parsed regex with the groups (without flags) replaced
+    by their content, all of them are matched one after another.
+    """
+    for op, av in parsed:
+        if op == sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            yield from _flatten_regex(av[-1])
+        else:
+            yield op, av
+
+
+def _is_word_boundary(op, av) -> bool:
+    """ Check if the item of parsed regex means that the next character
+    starts a word (^, \\b, \\s, \\W or the class of such ones).
+    """
+    if op == sre_parse.AT:
+        return av in (sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING,
+                      sre_parse.AT_BOUNDARY)
+    if op == sre_parse.IN:
+        separators = {(sre_parse.CATEGORY, sre_parse.CATEGORY_SPACE),
+                      (sre_parse.CATEGORY, sre_parse.CATEGORY_NOT_WORD)}
+        return all(item in separators
+                   or item[0] == sre_parse.LITERAL and not re.match(r'\w', chr(item[1]))
+                   for item in av)
+    return False
+
+
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+# characters that are tried to find out if two classes of regex overlap
+_SAMPLE_CHARACTERS = ''.join(map(chr, range(0x530)))
+
+
+def _overlap(first, second) -> bool:
+    """ Check if the items of parsed regex could match the same character
+    (True for anything longer than one character).
+    """
+    if first.getwidth() != (1, 1) or second.getwidth() != (1, 1):
+        return True
+    first, second = sre_compile.compile(first), sre_compile.compile(second)
+    return any(first.fullmatch(ch) and second.fullmatch(ch)
+               for ch in _SAMPLE_CHARACTERS)
+
+
+def _find_backtracking(parsed, in_repeat=False) -> str:
+    """ Find the part of parsed regex that makes the matching of one string
+    take exponential (or polynomial of high degree) time:
+
+        - repeat inside a repeat, like (a+)+
+        - alternation inside a repeat, like (a|ab)*
+        - unbounded repeats of the same characters one after another
+          (maybe with optional items between them), like \\w*\\w*
+
+    :return: description of that part or empty string
+    """
+    unbounded = []          # adjacent unbounded repeats before the item
+    for op, av in _flatten_regex(parsed):
+        if op in _REPEATS:
+            low, high, sub = av
+            if high > 1 and in_repeat:
+                return 'nested repeats'
+            found = _find_backtracking(sub, in_repeat or high > 1)
+            if found:
+                return found
+            if high == sre_parse.MAXREPEAT:
+                if any(_overlap(prev, sub) for prev in unbounded):
+                    return 'adjacent repeats'
+                if low > 0:
+                    unbounded.clear()   # the previous ones can't take its part
+                unbounded.append(sub)
+                continue
+            if low == 0:
+                continue            # optional item doesn't separate repeats
+        elif op == sre_parse.BRANCH:
+            if in_repeat:
+                return 'alternation inside repeat'
+            for sub in av[1]:
+                found = _find_backtracking(sub, in_repeat)
+                if found:
+                    return found
+        elif op in (sre_parse.SUBPATTERN, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            found = _find_backtracking(av[-1], in_repeat)
+            if found:
+                return found
+        elif op == sre_parse.AT:
+            continue                # doesn't match any characters
+        unbounded.clear()
+    return ''
+
+
+def _check_regex(pattern: str):
+    """ :raise BadStorageParamException: if the pattern isn't a valid regex
+                                         or could take too much time on one
+                                         string (see _find_backtracking).
+    """
+    try:
+        _compile_regex(pattern)
+        parsed = sre_parse.parse(pattern)
+    except (re.error, TypeError) as e:
+        raise BadStorageParamException(f"Bad regex {pattern}: {e}") from None
+    found = _find_backtracking(parsed)
+    if found:
+        raise BadStorageParamException(f"Too complex regex {pattern}: {found}.")
+
+
+def _regex_literals(pattern: str) -> list:
+    """ Find the literal parts of regex that must be in every string
+    it matches, so the rows could be filtered by LIKE or FTS before
+    running the regex.
+
+    Only the runs of literal characters on the top level of the parsed regex
+    are taken (the groups without flags are flattened), everything else
+    (repeats, alternations, classes etc.) ends the run.
+
+    :return: list of tuple(literal, True if it starts at the word boundary)
+    """
+    parsed = sre_parse.parse(pattern)
+    ignore_case = (parsed.state.flags & sre_parse.SRE_FLAG_IGNORECASE
+                   and not parsed.state.flags & sre_parse.SRE_FLAG_ASCII)
+    literals = []
+    current, boundary, start_boundary = [], False, False
+
+    def flush():
+        if current:
+            literals.append((''.join(current), start_boundary))
+            current.clear()
+
+    for op, av in _flatten_regex(parsed):
+        if op == sre_parse.LITERAL:
+            ch = chr(av)
+            if not ignore_case or ch.isascii() and ch not in _UNICODE_FOLDED:
+                if not current:
+                    start_boundary = boundary
+                current.append(ch)
+                continue
+        flush()
+        boundary = _is_word_boundary(op, av)
+    flush()
+    return literals
+
+
+def _like_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _regex_filter(pattern: str, column: str):
+    """ SQL conditions for the rows that could match the regex: LIKE for
+    every literal part and REGEXP itself (the last one, so it's executed
+    only for the rows that passed the others).
+
+    :return: tuple(conditions, params)
+    """
+    conditions, params = [], []
+    for literal, _ in _regex_literals(pattern):
+        if len(literal) < 2:
+            continue        # almost every row has it
+        conditions.append(f"{column} LIKE ? ESCAPE '\\'")
+        params.append(f'%{_like_escape(literal)}%')
+    conditions.append(f"{column} REGEXP ?")
+    params.append(pattern)
+    return ' AND '.join(conditions), params
+
+
+def _regex_search_query(pattern: str, c_id) -> str:
+    """ FTS5 query for the words of regex that start at the word boundary
+    (every row that matches the regex contains a word with such prefix).
+
+    :return: query or empty string if there are no such words
+    """
+    words = []
+    for literal, start_boundary in _regex_literals(pattern):
+        for match in re.finditer(r'[^\W_]+', literal):
+            # FTS tokens are letters and digits, the non-ascii ones could be
+            # changed by tokenizer (e.g. diacritics), so they aren't used
+            if (match.start() > 0 or start_boundary) and match.group().isascii():
+                words.append(f'"{match.group()}"*')
+    if not words:
+        return ''
+    return f'CID : "{c_id}" AND Content : ({" ".join(words)})'
+
+
+def _parse_offset(cursor) -> int:
+    """ Get the offset of the next page of results from the cursor of
+    search (see find_messages).
+    """
+    return 0 if cursor is None else _parse_cursor(cursor)
+
+
 def _check_connected(async_method):
     """ Decorator for asynchronous methods that checks
     if the method start was used before.
@@ -315,7 +1255,7 @@ def _check_connected(async_method):
 
     @wraps(async_method)
     async def _async_method(self, *args, **kwargs):
-        if self._conn is None:
+        if not self._started:
             raise NotWorkingException(f"Worker for {self._filename} isn't started. Use the SqliteStorageClient.start()")
         return await async_method(self, *args, **kwargs)
 
@@ -329,76 +1269,134 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
     def __init__(self, filedb: str):
         self._filename = filedb
 
-        # initialisation of worker, but not launching
-        self._worker = AsyncWorker(filedb)
+        # the connections are shared between all the clients of database
+        self._storage = SqliteStorage(filedb)
+        self._worker = self._storage.worker
         self._work_queue = self._worker.get_queue()
-        self._worker_task = None
-        self._conn = None
-        self._curs = None
+        self._started = False
 
-    # FIXME be careful, I don't know whether it's right to make only one connection
-    async def start(self):
-        """ Prepare the client for work.
+    @classmethod
+    async def prepare(cls, path: str):
+        """ Create all the tables and launch the worker. Call it once
+        when the server starts.
+        """
+        await SqliteStorage(path).start()
+
+    @classmethod
+    async def reporting(cls, path: str, period: float):
+        await SqliteStorage(path).reporting(period)
 
-        It connects to the database, gets cursor, launches the worker and
-        executes script for creating all the tables, indexes and triggers.
+    @classmethod
+    async def checkpointing(cls, path: str, period: float):
+        await SqliteStorage(path).checkpointing(period)
+
+    async def start(self):
+        """ Prepare the client for work. The client doesn't have its own
+        connections, it borrows them from SqliteStorage.
         """
         logger.info(f"[*] Storage client for {self._filename} created.")
-        if self._conn is not None:
-            return
         try:
-            self._conn = sqlite3.connect(self._filename, check_same_thread=False)
-            self._curs = self._conn.cursor()
-            if not self._worker.is_work:
-                self._curs.executescript(PREPARE_DATABASE_QUERY)
-                # launch worker in background
-                self._worker_task = await curio.spawn(self._worker.start)
-
+            # does nothing if the storage has been already prepared
+            await self._storage.start()
         except Exception as e:
             logger.error(f"Exception during creation of new SqliteStorageClient: {e}")
             raise
+        self._started = True
 
     async def end(self):
-        """ Closes the connection between client and database,
-        interrupts the worker.
+        """ Stop using the storage, the connections stay in SqliteStorage
+        for the other clients.
         """
         logger.info(f"[*] Storage client for {self._filename} closed.")
-        if self._conn is not None:
-            # await self._worker_task.cancel()
-            self._conn.close()
-            self._conn = None
-            self._curs = None
+        self._started = False
 
     @_check_connected
-    async def _do_read_query(self, query: str, params=()):
+    async def _do_read_query(self, query: str, params=(), one=False, timeout=None):
         """ Makes the query that doesn't change the database.
+
+        :param one: return only the first row (or None)
+        :param timeout: max time of execution (seconds)
+        :return: list of rows
         """
         logger.info(f"[*] Run in thread read query {query} with params {params}.")
-        await curio.run_in_thread(partial(self._curs.execute, query, params))
+        return await self._storage.read(query, params, one, timeout)
+
+    async def _do_write_query(self, query: str, params=(), wait=False):
+        """ Makes the query that changes the database via AsyncWorker.
+
+        :param wait: wait until the query is committed
+        :return: id of the last inserted row if wait is True, else None
+        :raises Exception: the exception of the query, if wait is True and
+                           the query failed.
+        """
+        if wait:
+            return await self._worker.execute(query, params)
+        await self._work_queue.put((query, params))
+
+    async def _do_write_many(self, query: str, params_list):
+        """ Makes the query for every params of the list by one executemany
+        in one transaction and waits until they are committed.
+        """
+        await self._worker.execute_many(query, params_list)
+
+    async def _do_write_statements(self, statements) -> int:
+        """ Makes all the queries of the list of tuple(query, params) in one
+        transaction and waits until they are committed.
+
+        :return: id of the row inserted by the first query
+        """
+        return await self._worker.execute_statements(statements)
 
     # ============================= user =======================================
     @_check_connected
+    async def _get_id(self, kind, name: str, query: str):
+        """ Get id by name from the id cache or from database.
+        """
+        ids = self._storage.ids
+        res = ids.get(kind, name)
+        if res is None:
+            generation = ids.generation
+            res = await self._do_read_query(query, (name,), one=True)
+            res = res if not res else res[0]
+            ids.put(kind, name, res, generation)
+        return res
+
     async def _get_user_id(self, user_name: str):
         """ Get user's id from Users by Name.
         """
         query = "SELECT Users.Id FROM Users WHERE Users.Name=?"
-        await self._do_read_query(query, (user_name,))
-        user_id = self._curs.fetchone()
-        return user_id if not user_id else user_id[0]
+        return await self._get_id(USER, user_name, query)
+
+    async def _get_users_ids(self, users_names) -> dict:
+        """ Get ids of many users: the ones that aren't in the id cache
+        are read by one query.
+
+        :return: dict name -> id (without the names that weren't found)
+        """
+        ids = self._storage.ids
+        res, missing = {}, []
+        for name in dict.fromkeys(users_names):
+            user_id = ids.get(USER, name)
+            if user_id is None:
+                missing.append(name)
+            else:
+                res[name] = user_id
+        if missing:
+            generation = ids.generation
+            query = "SELECT Name, Id FROM Users WHERE Name IN (SELECT value FROM json_each(?))"
+            for name, user_id in await self._do_read_query(query, (json.dumps(missing),)):
+                res[name] = user_id
+                ids.put(USER, name, user_id, generation)
+        return res
 
-    @_check_connected
     async def _get_c_id(self, c_name: str, destination=CHAT):
         """ Get chat's or channel's id from Chat/Channel respectively by name.
         """
         if destination == CHAT:
             query = "SELECT Chats.Id FROM Chats WHERE Name=?"
-            await self._do_read_query(query, (c_name,))
-            c_id = self._curs.fetchone()
         else:
             query = "SELECT Channels.Id FROM Channels WHERE Name=?"
-            await self._do_read_query(query, (c_name,))
-            c_id = self._curs.fetchone()
-        return c_id if not c_id else c_id[0]
+        return await self._get_id(destination, c_name, query)
 
     @_check_connected
     async def get_users_belong(self, user: User) -> list:
@@ -412,20 +1410,22 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
             raise BadStorageParamException(f"There is no user with name {user.name}")
         query = '''SELECT Name, Created, CreatorID FROM Chats 
                     WHERE Chats.Id IN (SELECT CID FROM UsersChats WHERE UID=?)'''
-        await self._do_read_query(query, (u_id,))
-        res = [Chat(*el) for el in self._curs.fetchall()]
+        rows = await self._do_read_query(query, (u_id,))
+        res = [Chat(*el) for el in rows]
 
         query = '''SELECT Name, Created, CreatorID FROM Channels
                     WHERE Id IN (SELECT CID FROM UsersChannels WHERE UID=?) 
                 '''
-        await self._do_read_query(query, (u_id,))
-        res = res + [Channel(*el) for el in self._curs.fetchall()]
+        rows = await self._do_read_query(query, (u_id,))
+        res = res + [Channel(*el) for el in rows]
         return res
 
     @_check_connected
-    async def new_user(self, name: str, password: bytearray):
-        """ Creates new user with given password (hash).
+    async def new_user(self, name: str, password: bytearray) -> int:
+        """ Creates new user with given password (hash) and waits until
+        it's committed.
 
+        :return: id of the new user
         :raises BadStorageParamException: if the user with given
                                           name already exists
         """
@@ -437,11 +1437,39 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
 
         query = "INSERT INTO Users(Name, PasswordHash) VALUES (?, ?)"
         params = (name, password)
-        await self._work_queue.put((query, params))
+        ids = self._storage.ids
+        generation = ids.generation
+        try:
+            user_id = await self._do_write_query(query, params, wait=True)
+        except sqlite3.IntegrityError:
+            # somebody has registered the same name in the meantime
+            raise BadStorageParamException(f"User with name {name} already exists.") from None
+        ids.put(USER, name, user_id, generation)
+        return user_id
 
     @_check_connected
     async def modify_user(self, user: User, new_name: str, new_password: bytes):
-        raise NotImplementedError()
+        """ Change name and/or password (hash) of the user.
+
+        :param new_name: new name or None if it doesn't change
+        :param new_password: new hash or None if it doesn't change
+        :raises BadStorageParamException: if there is no such user or the
+                                          new name is already used
+        """
+        logger.info(f"[*] Modifying user {user.name} in database...")
+        name = user.name
+        if not (await self._get_user_id(name)):
+            raise BadStorageParamException(f"There is no user with name {name}.")
+        if new_name is not None and new_name != name and await self._get_user_id(new_name):
+            raise BadStorageParamException(f"User with name {new_name} already exists.")
+
+        query = """UPDATE Users SET Name=COALESCE(?, Name), 
+                                    PasswordHash=COALESCE(?, PasswordHash)
+                   WHERE Name=?"""
+        try:
+            await self._do_write_query(query, (new_name, new_password, name), wait=True)
+        finally:
+            self._storage.ids.discard(USER, name)
 
     @_check_connected
     async def get_user_info(self, name: str, include_password=False) -> tuple:
@@ -451,8 +1479,7 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
         """
         logger.info(f"[*] Getting information about {name} from database...")
         query = "SELECT PasswordHash FROM Users WHERE Name=?"
-        await self._do_read_query(query, (name,))
-        res = self._curs.fetchone()
+        res = await self._do_read_query(query, (name,), one=True)
         res = res if res is not None else ()
         return res
 
@@ -470,7 +1497,14 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
 
         query = "DELETE FROM Users WHERE Name=?"
         params = (name,)
-        await self._work_queue.put((query, params))
+        try:
+            await self._do_write_query(query, params, wait=True)
+        finally:
+            # chats and channels of the user are deleted too (ON DELETE CASCADE)
+            ids = self._storage.ids
+            ids.discard(USER, name)
+            ids.discard_kind(CHAT)
+            ids.discard_kind(CHANNEL)
 
     @_check_connected
     async def add_user(self, chatOrChannel, user: User,
@@ -518,9 +1552,124 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
         if not c_id:
             raise BadStorageParamException(f"There is no channel/chat with name {c_name}.")
 
-        # FIXME also check later what does the curs.fetchone() return.
-        #   Does it always return only tuple?
-        await self._work_queue.put((query, (user_id, c_id, permission)))
+        await self._do_write_query(query, (user_id, c_id, permission), wait=True)
+
+    @_check_connected
+    async def add_users(self, chatOrChannel, users: List[User],
+                        permission=MEMBER,
+                        destination=CHAT) -> List[User]:
+        """ Add many users to the chat/channel at once: ids of all the users
+        are read by one query and all of them are inserted by one executemany
+        in one transaction.
+
+        The users that don't exist are skipped, the ones that are already in
+        the chat/channel keep their permissions.
+
+        :param chatOrChannel: chat or channel.
+        :param users: list of users
+        :param permission: permissions of users in chat (POSSIBLE_PERMISSIONS)
+        :param destination: CHAT or CHANNEL
+
+        :return: list of the users that are in the chat/channel now
+        :raise BadStorageParamException: if there is no such chat/channel.
+        """
+        logger.info(f"[*] Saving adding of {len(users)} users to {chatOrChannel} to the database...")
+        c_name = chatOrChannel.name
+        assert destination in POSSIBLE_PERMISSIONS, \
+            f"Bad destination {destination}"
+        assert permission in POSSIBLE_PERMISSIONS[destination], \
+            f"Bad permission {permission}"
+
+        if destination == CHAT:
+            query = '''INSERT OR IGNORE INTO UsersChats (UID, CID, Permission) 
+                       VALUES (?, ?, ?)'''
+        else:
+            query = '''INSERT OR IGNORE INTO UsersChannels (UID, CID, Permission) 
+                       VALUES (?, ?, ?)'''
+
+        c_id = await self._get_c_id(c_name, destination)
+        if not c_id:
+            raise BadStorageParamException(f"There is no channel/chat with name {c_name}.")
+
+        users_ids = await self._get_users_ids(user.name for user in users)
+        if users_ids:
+            await self._do_write_many(query, [(user_id, c_id, permission)
+                                              for user_id in users_ids.values()])
+        added = {}
+        for user in users:
+            if user.name in users_ids:
+                added.setdefault(user.name, user)
+        return list(added.values())
+
+    @_check_connected
+    async def get_permission(self, chatOrChannel, user: User, destination=CHAT):
+        """ Get the permission of user in the chat/channel.
+
+        :param destination: CHAT or CHANNEL
+        :return: one of POSSIBLE_PERMISSIONS or CREATOR, None if the user
+                 isn't there
+        """
+        if destination == CHAT:
+            query = "SELECT Permission FROM UsersChats WHERE UID=? AND CID=?"
+        else:
+            query = "SELECT Permission FROM UsersChannels WHERE UID=? AND CID=?"
+        user_id = await self._get_user_id(user.name)
+        c_id = await self._get_c_id(chatOrChannel.name, destination)
+        if not user_id or not c_id:
+            return None
+        rows = await self._do_read_query(query, (user_id, c_id))
+        return rows[0][0] if rows else None
+
+    @_check_connected
+    async def get_activity(self, user: User,
+                           max_unread=ACTIVITY_MAX_UNREAD) -> List[ChatActivity]:
+        """ Get the id of the last message and the amount of unread ones
+        in every chat and channel where the user is member.
+
+        Both of them are read by the indexes of messages, the unread ones
+        are counted up to max_unread, so it doesn't depend on how many
+        messages the user has missed.
+
+        :return: list of ChatActivity
+        :raise BadStorageParamException: if there is no such user.
+        """
+        logger.info(f"[*] Getting activity of the chats of {user} from database...")
+        u_id = await self._get_user_id(user.name)
+        if not u_id:
+            raise BadStorageParamException(f"There is no user with name {user.name}")
+        res = []
+        for kind, members, chats, messages in ((CHAT, 'UsersChats', 'Chats', 'ChatMessages'),
+                                               (CHANNEL, 'UsersChannels', 'Channels',
+                                                'ChannelMessages')):
+            query = f'''SELECT {chats}.Name, 
+                            coalesce((SELECT max(Id) FROM {messages} WHERE CID=M.CID), 0),
+                            (SELECT count(*) FROM (SELECT 1 FROM {messages} 
+                                WHERE CID=M.CID AND Id>M.LastRead LIMIT ?))
+                        FROM {members} AS M JOIN {chats} ON {chats}.Id=M.CID
+                        WHERE M.UID=?'''
+            rows = await self._do_read_query(query, (max_unread, u_id))
+            res.extend(ChatActivity(name, kind, last_seq, unread)
+                       for name, last_seq, unread in rows)
+        return res
+
+    @_check_connected
+    async def set_last_read(self, chatOrChannel, user: User, message_id: int,
+                            destination=CHAT):
+        """ Remember that the user has read all the messages of chat/channel
+        up to the one with message_id (doesn't wait for commit).
+
+        :param destination: CHAT or CHANNEL
+        """
+        if destination == CHAT:
+            query = '''UPDATE UsersChats SET LastRead=max(LastRead, ?) 
+                       WHERE UID=? AND CID=?'''
+        else:
+            query = '''UPDATE UsersChannels SET LastRead=max(LastRead, ?) 
+                       WHERE UID=? AND CID=?'''
+        user_id = await self._get_user_id(user.name)
+        c_id = await self._get_c_id(chatOrChannel.name, destination)
+        if user_id and c_id:
+            await self._do_write_query(query, (message_id, user_id, c_id))
 
     # FIXME
     #  CHECK ONCE MORE IF YOU'RE USING RIGHT PARAMETERS
@@ -559,7 +1708,7 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
             raise BadStorageParamException(f"There is no user with name {user_name}.")
         if not c_id:
             raise BadStorageParamException(f"There is no channel/chat with name {c_name}.")
-        await self._work_queue.put((query, (permission, user_id, c_id)))
+        await self._do_write_query(query, (permission, user_id, c_id), wait=True)
 
     # FIXME
     #  CHECK ONCE MORE IF YOU'RE USING RIGHT PARAMETERS
@@ -591,7 +1740,7 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
             raise BadStorageParamException(f"There is no user with name {user_name}.")
         if not c_id:
             raise BadStorageParamException(f"There is no channel/chat with name {c_name}.")
-        await self._work_queue.put((query, (user_id, c_id)))
+        await self._do_write_query(query, (user_id, c_id), wait=True)
 
     # FIXME
     #  CHECK ONCE MORE IF YOU'RE USING RIGHT PARAMETERS
@@ -599,37 +1748,40 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
     async def find(self, pattern: str, destination=CHAT, use_regex=False) -> list:
         """ Find chats/channels similar to the given pattern.
 
-        Using of regex hasn't implemented yet.
-
-        :param pattern: substring or regex pattern
+        :param pattern: LIKE pattern or regex
         :param destination: CHAT or CHANNEL
         :param use_regex: True if you wand to use regex
         :return: list of names.
+        :raise BadStorageParamException: if the regex is wrong or the search
+                                         took too long.
         """
-        if use_regex:
-            raise NotImplementedError("Find using regex hasn't still being implemented.")
         if not pattern:
             return []
+        condition, params = 'Name LIKE ?', [pattern]
+        if use_regex:
+            _check_regex(pattern)
+            condition, params = _regex_filter(pattern, 'Name')
         if destination == CHAT:
-            query = '''SELECT 
+            query = f'''SELECT 
                             Name, 
                             (SELECT Users.Name FROM Users WHERE Users.Id = Chats.CreatorID) as Creator, 
                             Created 
                        FROM Chats 
-                       WHERE Name LIKE ?'''
+                       WHERE {condition}'''
         else:
-            query = '''SELECT 
+            query = f'''SELECT 
                             Name, 
                             (SELECT Users.Name FROM Users WHERE Users.Id = Channels.CreatorID) as Creator, 
                             Created 
                        FROM Channels 
-                       WHERE Name LIKE ?'''
+                       WHERE {condition}'''
 
-        await self._do_read_query(query, (pattern,))
+        rows = await self._do_read_query(query, params,
+                                         timeout=DB_REGEX_TIMEOUT if use_regex else None)
         if destination == CHAT:
-            return [Chat(*el) for el in self._curs.fetchall()]
+            return [Chat(*el) for el in rows]
         else:
-            return [Channel(*el) for el in self._curs.fetchall()]
+            return [Channel(*el) for el in rows]
 
     # FIXME
     #  CHECK ONCE MORE IF YOU'RE USING RIGHT PARAMETERS
@@ -637,31 +1789,40 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
     async def find_users(self, pattern: str, use_regex=False) -> List[User]:
         """ Find users similar to the given pattern.
 
-        Using of regex hasn't implemented yet.
-
-        :param pattern: substring or regex pattern
+        :param pattern: LIKE pattern or regex
         :param use_regex: True if you wand to use regex
         :return: list of names.
+        :raise BadStorageParamException: if the regex is wrong or the search
+                                         took too long.
         """
         logger.info(f"[*] Getting users from database using pattern {pattern}...")
-        if use_regex:
-            raise NotImplementedError("Find using regex hasn't still been implemented.")
+        if not use_regex:
+            query = "SELECT Name FROM Users WHERE NAME LIKE ?"
+            rows = await self._do_read_query(query, (pattern,))
+            return [User(*el) for el in rows]
 
-        query = "SELECT Name FROM Users WHERE NAME LIKE ?"
-        await self._do_read_query(query, (pattern,))
-        return [User(*el) for el in self._curs.fetchall()]
+        _check_regex(pattern)
+        condition, params = _regex_filter(pattern, 'Name')
+        query = f"SELECT Name FROM Users WHERE {condition}"
+        rows = await self._do_read_query(query, params, timeout=DB_REGEX_TIMEOUT)
+        return [User(*el) for el in rows]
 
     # ============================= chat =======================================
 
     # FIXME I have no idea whether it actually works.
     @_check_connected
-    async def create_chat(self, creator: User, chat_name: str, members: List[User]):
-        """ Creates a new chat.
+    async def create_chat(self, creator: User, chat_name: str,
+                          members: List[User]) -> Tuple[int, List[User]]:
+        """ Creates a new chat and waits until the chat with all the
+        members (and the creator) is committed, all of them in one
+        transaction.
 
         :param creator: user that created it.
         :param chat_name: name of chat
-        :param members: list of names of users that must be added.
+        :param members: list of names of users that must be added (the ones
+                        that don't exist are skipped, see add_users).
 
+        :return: tuple(id of the new chat, list of its members)
         :raise BadStorageParamException: if there is no such user or chat with
                                          such name already exists.
         """
@@ -673,19 +1834,44 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
         if chat_id:
             raise BadStorageParamException(f"Chat with name {chat_name} already exists.")
 
+        users = [creator] + list(members)
+        users_ids = await self._get_users_ids(user.name for user in users)
+        users_ids[creator_name] = creator_id
         query = '''INSERT INTO Chats (Name, CreatorID) 
                     VALUES (?, ?)'''
-        await self._work_queue.put( (query, (chat_name, creator_id)) )
-
-        # ignore if there have already been records about belonging such user
-        # to such chat
-        query = '''INSERT OR IGNORE INTO UsersChats (UID, CID)
-                    VALUES (?, (SELECT Id FROM Chats WHERE Name=?))'''
-        for member in members:
-            mem_id = await self._get_user_id(member.name)
-            if not mem_id:
-                continue
-            await self._work_queue.put( (query, (mem_id, chat_name)) )
+        members_query = '''INSERT OR IGNORE INTO UsersChats (UID, CID, Permission)
+                           VALUES (?, (SELECT Id FROM Chats WHERE Name=?), ?)'''
+        members_params = ManyParams((user_id, chat_name, MEMBER)
+                                    for user_id in users_ids.values())
+        ids = self._storage.ids
+        generation = ids.generation
+        try:
+            chat_id = await self._do_write_statements([(query, (chat_name, creator_id)),
+                                                       (members_query, members_params)])
+        except sqlite3.IntegrityError:
+            raise BadStorageParamException(f"Chat with name {chat_name} already exists.") from None
+        ids.put(CHAT, chat_name, chat_id, generation)
+        added = {}
+        for user in users:
+            if user.name in users_ids:
+                added.setdefault(user.name, user)
+        return chat_id, list(added.values())
+
+    @_check_connected
+    async def delete_chat(self, chat: Chat):
+        """ Delete the chat with all its messages and members.
+
+        :raises BadStorageParamException: if there is no chat with such name.
+        """
+        logger.info(f"[*] Deleting chat {chat.name} from database...")
+        chat_name = chat.name
+        if not (await self._get_c_id(chat_name, destination=CHAT)):
+            raise BadStorageParamException(f"There is no chat with name {chat_name}.")
+        query = "DELETE FROM Chats WHERE Name=?"
+        try:
+            await self._do_write_query(query, (chat_name,), wait=True)
+        finally:
+            self._storage.ids.discard(CHAT, chat_name)
 
     @_check_connected
     async def get_chat_info(self, chat_name: str) -> Chat:
@@ -694,8 +1880,7 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
                           Created 
                    FROM Chats WHERE Name=?'''
 
-        await self._do_read_query(query, (chat_name, ))
-        res = self._curs.fetchone()
+        res = await self._do_read_query(query, (chat_name, ), one=True)
         return Chat(*res) if res else None
 
     # FIXME check if works
@@ -717,8 +1902,8 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
                    FROM UsersChats      
                    WHERE UsersChats.CID=?'''
 
-        await self._do_read_query(query, (chat_id, ))
-        return {el[0] for el in self._curs.fetchall()}
+        rows = await self._do_read_query(query, (chat_id, ))
+        return {el[0] for el in rows}
 
     # TODO implement
     @_check_connected
@@ -739,9 +1924,26 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
             raise BadStorageParamException(f"There is no user with name {creator_name}")
         channel_id = await self._get_c_id(channel_name, destination=CHANNEL)
         if channel_id:
-            raise BadStorageParamException(f"Chat with name {channel_name} already exists.")
+            raise BadStorageParamException(f"Channel with name {channel_name} already exists.")
         query = "INSERT INTO Channels (Name, CreatorID) VALUES (?, ?)"
-        await self._work_queue.put( (query, (channel_name, creator_id)) )
+        ids = self._storage.ids
+        generation = ids.generation
+        try:
+            channel_id = await self._do_write_query(query, (channel_name, creator_id), wait=True)
+        except sqlite3.IntegrityError:
+            raise BadStorageParamException(f"Channel with name {channel_name} already exists.") from None
+        ids.put(CHANNEL, channel_name, channel_id, generation)
+        return channel_id
+
+    @_check_connected
+    async def get_channel_info(self, channel_name: str) -> Channel:
+        query = '''SELECT Name, 
+                          Created,
+                          (SELECT Users.Name FROM Users WHERE Users.Id=CreatorID) as Creator
+                   FROM Channels WHERE Name=?'''
+
+        res = await self._do_read_query(query, (channel_name, ), one=True)
+        return Channel(*res) if res else None
 
     # ========================== messages ======================================
     @_check_connected
@@ -757,13 +1959,58 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
                           C.Content 
                    FROM ChatMessages C 
                    LEFT JOIN Users U on C.AuthorID = U.Id
-                   WHERE C.CID=? ORDER BY C.Created DESC '''
-        await self._do_read_query(query, (c_id,))
+                   WHERE C.CID=? ORDER BY C.Created DESC, C.Id DESC '''
+        rows = await self._do_read_query(query, (c_id,))
 
-        return [Message(*el) for el in self._curs.fetchall()]
+        return [Message(*el) for el in rows]
 
     @_check_connected
-    async def add_message(self, chat: Chat, message: Message):
+    async def get_history(self, chat: Chat, limit=HISTORY_PAGE_SIZE,
+                          cursor=None, with_ids=False) -> Tuple[list, str]:
+        """ Get one page of the history of chat using keyset pagination:
+        cursor is the Id of the oldest message of the previous page, so
+        the query doesn't depend on the amount of messages before it.
+
+        :param with_ids: return tuple(id, message) instead of each message
+
+        :raise BadStorageParamException: if there is no such chat or
+                                         the cursor is wrong.
+        """
+        chat_name = chat.name
+        c_id = await self._get_c_id(chat_name)
+        if not c_id:
+            raise BadStorageParamException(f"There is no chat with name {chat_name}.")
+        if limit < 1:
+            raise BadStorageParamException(f"Bad limit of history page: {limit}")
+        before_id = _parse_cursor(cursor)
+        query = '''SELECT C.Id,
+                          U.Name, 
+                          C.Created,
+                          C.Status, 
+                          C.Type, 
+                          C.Content 
+                   FROM ChatMessages C 
+                   LEFT JOIN Users U on C.AuthorID = U.Id
+                   WHERE C.CID=? AND C.Id<? ORDER BY C.Id DESC LIMIT ?'''
+
+        # one more row shows whether there is the next page
+        rows = await self._do_read_query(query, (c_id, before_id, limit + 1))
+        next_cursor = _make_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+        if with_ids:
+            return [(el[0], Message(*el[1:])) for el in reversed(rows[:limit])], next_cursor
+        return [Message(*el[1:]) for el in reversed(rows[:limit])], next_cursor
+
+    def history_cursor(self, message_id: int) -> str:
+        return _make_cursor(message_id)
+
+    @_check_connected
+    async def add_message(self, chat: Chat, message: Message) -> Tuple[int, Message]:
+        """ Save new message of chat and wait until it's committed.
+
+        :return: id of the message and the message as it's saved
+                 (with the time of creation from the storage)
+        :raise BadStorageParamException: if there is no such chat or author.
+        """
         message_type = message.content_type
         chat_name = chat.name
         author_name = message.author
@@ -781,40 +2028,87 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
 
         query = '''INSERT INTO ChatMessages (CID, 
                             AuthorID,  
+                            Created,
                             Type, 
                             Content
                    ) 
-                   VALUES (?, ?, ?, ?)'''
-        params = (c_id, u_id, message_type, content)
-        await self._work_queue.put((query, params))
+                   VALUES (?, ?, ?, ?, ?)'''
+        # the same format as CURRENT_TIMESTAMP
+        created = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        params = (c_id, u_id, created, message_type, content)
+        message_id = await self._do_write_query(query, params, wait=True)
+        return message_id, message._replace(created=created)
 
     @_check_connected
     async def find_messages(self, chat: Chat, pattern: str,
                             author_name='',
-                            use_regex=False) -> List[Message]:
-
-        chat_name = Chat.name
-        if use_regex:
-            raise NotImplementedError("Find using regex hasn't still been implemented.")
-
+                            use_regex=False,
+                            limit=SEARCH_PAGE_SIZE,
+                            cursor=None) -> Tuple[List[Message], str]:
+        """ Full-text search of the text messages of chat (via FTS5 index).
+
+        :param pattern: words that must be in the message, the word that
+                        ends with * is a prefix (e.g. 'hel* world'), or regex
+        :param author_name: find only the messages of this user (if given)
+        :param use_regex: find the messages that match the regex (from the
+                          newest), the time of search is limited by
+                          DB_REGEX_TIMEOUT
+        :param limit: max amount of messages
+        :param cursor: cursor from the previous page or None for the first one
+        :return: tuple(messages from the most relevant, cursor of the next
+                 page or None if there are no more results)
+        :raise BadStorageParamException: if there is no such chat, the cursor
+                                         or regex is wrong or the search took
+                                         too long.
+        """
+        chat_name = chat.name
         c_id = await self._get_c_id(chat_name, destination=CHAT)
         if not c_id:
             raise BadStorageParamException(f"There is no chat with name {chat_name}.")
-
-        query = f'''
-            SELECT 
-            (SELECT Users.Name FROM Users WHERE Users.Id=AuthorID) as Author,
-            Created,
-            Type,
-            Content
-            FROM ChatMessages 
-            WHERE Type={TEXT} AND CID=? AND Content LIKE ?
-             
-            -- check if user name similar to required 
-            AND AuthorID IN (SELECT Id FROM Users WHERE Name LIKE ?)           
-        '''
-        await self._do_read_query(query, (c_id, pattern, author_name))
-        return [Message(*el) for el in self._curs.fetchall()]
+        if limit < 1:
+            raise BadStorageParamException(f"Bad limit of search page: {limit}")
+        offset = _parse_offset(cursor)
+        if use_regex:
+            return await self._find_messages_regex(c_id, pattern, author_name,
+                                                   limit, offset)
+        search_query = _make_search_query(pattern, c_id)
+        if not search_query:
+            return [], None
+
+        query = '''SELECT U.Name, C.Created, C.Status, C.Type, C.Content
+                   FROM ChatMessagesSearch
+                   JOIN ChatMessages C ON C.Id = ChatMessagesSearch.rowid
+                   LEFT JOIN Users U ON U.Id = C.AuthorID
+                   WHERE ChatMessagesSearch MATCH ? AND C.CID=? 
+                         AND (?='' OR U.Name=?)
+                   ORDER BY ChatMessagesSearch.rank LIMIT ? OFFSET ?'''
+        params = (search_query, c_id, author_name, author_name, limit + 1, offset)
+        rows = await self._do_read_query(query, params)
+        next_cursor = _make_cursor(offset + limit) if len(rows) > limit else None
+        return [Message(*el) for el in rows[:limit]], next_cursor
+
+    async def _find_messages_regex(self, c_id, pattern: str, author_name: str,
+                                   limit: int, offset: int):
+        """ The same as find_messages with use_regex.
+        """
+        _check_regex(pattern)
+        condition, params = _regex_filter(pattern, 'C.Content')
+        search_query = _regex_search_query(pattern, c_id)
+        if search_query:
+            # only the messages that have all the words of regex
+            condition = f'''C.Id IN (SELECT rowid FROM ChatMessagesSearch 
+                                     WHERE ChatMessagesSearch MATCH ?) AND {condition}'''
+            params = [search_query] + params
+        query = f'''SELECT U.Name, C.Created, C.Status, C.Type, C.Content
+                    FROM ChatMessages C
+                    LEFT JOIN Users U ON U.Id = C.AuthorID
+                    WHERE C.CID=? AND C.Type={TEXT} AND (?='' OR U.Name=?) 
+                          AND {condition}
+                    ORDER BY C.Id DESC LIMIT ? OFFSET ?'''
+        params = [c_id, author_name, author_name] + params + [limit + 1, offset]
+        rows = await self._do_read_query(query, params, timeout=DB_REGEX_TIMEOUT)
+        next_cursor = _make_cursor(offset + limit) if len(rows) > limit else None
+        return [Message(*el) for el in rows[:limit]], next_cursor
 
     # ========================= publications ===================================
     @_check_connected
@@ -828,14 +2122,109 @@ class SqliteStorageClient(StorageClientInterface, metaclass=DebugMetaclassForAbs
                    Type,
                    Content
                    FROM ChannelMessages      
-                   WHERE CID=? ORDER BY Created DESC '''
+                   WHERE CID=? ORDER BY Created DESC, Id DESC '''
 
-        await self._do_read_query(query, (c_id,))
-        return [Publication(*el) for el in self._curs.fetchall()]
+        rows = await self._do_read_query(query, (c_id,))
+        return [Publication(*el) for el in rows]
 
     @_check_connected
-    async def add_publication(self, channel: Channel, publication: Publication):
-        raise NotImplementedError()
+    async def get_publications_history(self, channel: Channel, limit=HISTORY_PAGE_SIZE,
+                                       cursor=None) -> Tuple[List[Tuple[int, Publication]], str]:
+        """ Get one page of the history of channel (the same keyset
+        pagination as get_history).
+
+        :return: tuple(list of tuple(sequence number, publication) from the
+                 oldest to the newest, cursor of the page of older ones)
+        :raise BadStorageParamException: if there is no such channel or
+                                         the cursor is wrong.
+        """
+        channel_name = channel.name
+        c_id = await self._get_c_id(channel_name, destination=CHANNEL)
+        if not c_id:
+            raise BadStorageParamException(f'There is no channel with name {channel_name}.')
+        if limit < 1:
+            raise BadStorageParamException(f"Bad limit of history page: {limit}")
+        before_id = _parse_cursor(cursor)
+        # Type is TEXT column in ChannelMessages, so it's converted back
+        query = '''SELECT Id, Created, CAST(Type AS INTEGER), Content
+                   FROM ChannelMessages
+                   WHERE CID=? AND Id<? ORDER BY Id DESC LIMIT ?'''
+        rows = await self._do_read_query(query, (c_id, before_id, limit + 1))
+        next_cursor = _make_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+        return [(el[0], Publication(*el[1:])) for el in reversed(rows[:limit])], next_cursor
 
-    async def find_publication(self, pattern: str, use_regex=False) -> List[Publication]:
-        raise NotImplementedError()
+    @_check_connected
+    async def get_publications_after(self, channel: Channel, seq: int,
+                                     limit=HISTORY_PAGE_SIZE) -> List[Tuple[int, Publication]]:
+        """ Get the publications of channel that are newer than the one
+        with given sequence number (for the subscribers that catch up).
+
+        :return: list of tuple(sequence number, publication) from the oldest
+        :raise BadStorageParamException: if there is no such channel.
+        """
+        channel_name = channel.name
+        c_id = await self._get_c_id(channel_name, destination=CHANNEL)
+        if not c_id:
+            raise BadStorageParamException(f'There is no channel with name {channel_name}.')
+        if limit < 1:
+            raise BadStorageParamException(f"Bad limit of page: {limit}")
+        query = '''SELECT Id, Created, CAST(Type AS INTEGER), Content
+                   FROM ChannelMessages
+                   WHERE CID=? AND Id>? ORDER BY Id LIMIT ?'''
+        rows = await self._do_read_query(query, (c_id, seq, limit))
+        return [(el[0], Publication(*el[1:])) for el in rows]
+
+    @_check_connected
+    async def add_publication(self, channel: Channel,
+                              publication: Publication) -> Tuple[int, Publication]:
+        """ Save new publication of channel and wait until it's committed.
+
+        :return: sequence number of the publication (it grows with every
+                 publication) and the publication as it's saved
+        :raise BadStorageParamException: if there is no such channel.
+        """
+        assert publication.content_type in MESSAGE_TYPES, \
+            f'Bad type of publication: {publication.content_type}'
+        channel_name = channel.name
+        c_id = await self._get_c_id(channel_name, destination=CHANNEL)
+        if not c_id:
+            raise BadStorageParamException(f'There is no channel with name {channel_name}.')
+        query = '''INSERT INTO ChannelMessages (CID, Created, Type, Content)
+                   VALUES (?, ?, ?, ?)'''
+        created = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        params = (c_id, created, publication.content_type, publication.content)
+        seq = await self._do_write_query(query, params, wait=True)
+        return seq, publication._replace(created=created)
+
+    @_check_connected
+    async def find_publication(self, pattern: str, use_regex=False,
+                               limit=SEARCH_PAGE_SIZE,
+                               cursor=None) -> Tuple[List[Publication], str]:
+        """ Full-text search of the text publications of all the channels.
+        The same as find_messages.
+        """
+        if limit < 1:
+            raise BadStorageParamException(f"Bad limit of search page: {limit}")
+        offset = _parse_offset(cursor)
+        if use_regex:
+            _check_regex(pattern)
+            condition, params = _regex_filter(pattern, 'Content')
+            query = f'''SELECT Created, CAST(Type AS INTEGER), Content FROM ChannelMessages
+                        WHERE Type={TEXT} AND {condition}
+                        ORDER BY Id DESC LIMIT ? OFFSET ?'''
+            rows = await self._do_read_query(query, params + [limit + 1, offset],
+                                             timeout=DB_REGEX_TIMEOUT)
+            next_cursor = _make_cursor(offset + limit) if len(rows) > limit else None
+            return [Publication(*el) for el in rows[:limit]], next_cursor
+        search_query = _make_search_query(pattern)
+        if not search_query:
+            return [], None
+
+        query = '''SELECT C.Created, CAST(C.Type AS INTEGER), C.Content
+                   FROM ChannelMessagesSearch
+                   JOIN ChannelMessages C ON C.Id = ChannelMessagesSearch.rowid
+                   WHERE ChannelMessagesSearch MATCH ?
+                   ORDER BY ChannelMessagesSearch.rank LIMIT ? OFFSET ?'''
+        rows = await self._do_read_query(query, (search_query, limit + 1, offset))
+        next_cursor = _make_cursor(offset + limit) if len(rows) > limit else None
+        return [Publication(*el) for el in rows[:limit]], next_cursor
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Framed protocol of data transferring (see FRAMED_PROTOCOL in
+protocol_constants).
+
+Every frame is a fixed header + payload, so one transfer is just
+one write and one read instead of the READY_FOR_TRANSFERRING ping-pong.
+"""
+
+import struct
+import zlib
+from collections import namedtuple
+
+import curio
+
+from .constants.protocol_constants import *
+from .sequrity import make_mac, check_mac, derive_key
+
+FRAME_HEADER = struct.Struct(FRAME_HEADER_FORMAT)
+
+Frame = namedtuple("Frame", ["type", "flags", "chat_id", "payload", "stream"],
+                   defaults=(CONTROL_STREAM,))
+
+
+class BadFrameError(ValueError):
+    pass
+
+
+def get_chat_id(chat_name: str) -> int:
+    """ Get identifier of chat that is put into the header of frame.
+
+    Both server and client can compute it knowing only the name of chat.
+    :param chat_name: name of chat (empty for the data without chat)
+    :return: unsigned 32-bit integer
+    """
+    if not chat_name:
+        return 0
+    return zlib.crc32(bytes(chat_name, encoding='utf-8'))
+
+
+def pack_frame(frame_type: int, payload: bytes, chat_id=0, flags=0,
+               stream=CONTROL_STREAM, mac_key=None, number=0) -> bytes:
+    """ Create the frame ready for sending.
+
+    :param frame_type: FRAME_COMMAND or one of FRAME_TYPES
+    :param payload: any data
+    :param chat_id: result of get_chat_id
+    :param flags: FLAG_SIGNED or 0
+    :param stream: CONTROL_STREAM or PUSH_STREAM
+    :param mac_key: key of this socket and direction (see derive_key), if
+                    given the frame gets FLAG_MAC
+    :param number: number of the frame in this direction (for the mac)
+    :return: header + payload
+    """
+    if mac_key is None:
+        return FRAME_HEADER.pack(FRAME_VERSION, frame_type, flags, stream,
+                                 chat_id, len(payload)) + payload
+    header = FRAME_HEADER.pack(FRAME_VERSION, frame_type, flags | FLAG_MAC, stream,
+                               chat_id, len(payload) + MAC_LENGTH)
+    return header + make_mac(mac_key, number.to_bytes(8, 'big'), header, payload) + payload
+
+
+def unpack_header(header: bytes, max_payload=MAX_FRAME_PAYLOAD) -> tuple:
+    """ Parse the header of frame.
+
+    :param max_payload: max length of payload that is allowed
+    :return: tuple(type, flags, stream, chat_id, payload length)
+    :raises BadFrameError: if the version is unknown or the frame is too big.
+    """
+    version, frame_type, flags, stream, chat_id, length = FRAME_HEADER.unpack(header)
+    if version != FRAME_VERSION:
+        raise BadFrameError(f"Unknown version of frame: {version}")
+    if length > max_payload:
+        raise BadFrameError(f"Too big frame: {length} bytes")
+    return frame_type, flags, stream, chat_id, length
+
+
+class FramedSocket:
+    """ Wrapper of the curio socket that sends and receives frames.
+
+    Methods sendall and recv work like for the usual socket, but
+    each sendall is one frame of type FRAME_COMMAND and each recv returns
+    the payload of one frame. So the code of the old protocol works through
+    this wrapper without any changes.
+
+    Frames are written under the lock, so several tasks (e.g. UserAssistant
+    and ChatAssistant via FramedStream) could send via one socket.
+
+    Until the client logs in only small frames are received (see
+    set_max_payload), so nobody could make server buffer MAX_FRAME_PAYLOAD
+    without logging in.
+    """
+
+    def __init__(self, sock, max_payload=MAX_LOGIN_FRAME_PAYLOAD):
+        self._sock = sock
+        self._buffer = b''
+        self._write_lock = curio.Lock()
+        self._max_payload = max_payload
+
+        # keys derived from the session key (see SESSION_KEY) and numbers
+        # of frames in both directions
+        self._send_key = None
+        self._recv_key = None
+        self._sent = 0
+        self._received = 0
+
+    def __getattr__(self, item):
+        return getattr(self._sock, item)
+
+    def stream(self, stream_id: int):
+        """ Get the object for sending frames to the given stream of
+        this connection.
+        """
+        return FramedStream(self, stream_id)
+
+    def set_mac_key(self, key: bytes, socket_label=MAIN_SOCKET_LABEL):
+        """ Since now all the frames are authenticated with the keys derived
+        from the session key for this socket and each direction.
+
+        :param socket_label: MAIN_SOCKET_LABEL or AUX_SOCKET_LABEL
+        """
+        self._send_key = derive_key(key, socket_label, TO_CLIENT_LABEL)
+        self._recv_key = derive_key(key, socket_label, TO_SERVER_LABEL)
+        self._sent = 0
+        self._received = 0
+
+    def set_max_payload(self, max_payload: int):
+        """ Change max length of the payload of received frames (e.g. to
+        MAX_FRAME_PAYLOAD once the client has logged in).
+        """
+        self._max_payload = max_payload
+
+    async def send_frame(self, frame_type: int, payload: bytes, chat_id=0, flags=0,
+                         stream=CONTROL_STREAM):
+        async with self._write_lock:
+            frame = pack_frame(frame_type, payload, chat_id, flags, stream,
+                               self._send_key, self._sent)
+            self._sent += 1
+            await self._sock.sendall(frame)
+
+    async def sendall(self, data: bytes):
+        await self.send_frame(FRAME_COMMAND, data)
+
+    async def _recv_exactly(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = await self._sock.recv(min(size - len(data), CHUNK))
+            if not chunk:
+                if data:
+                    raise ConnectionError("Connection closed in the middle of frame.")
+                return b''
+            data += chunk
+        return data
+
+    async def recv_frame(self):
+        """ Receive the next frame.
+
+        :return: Frame or None if the connection is closed.
+        """
+        header = await self._recv_exactly(FRAME_HEADER.size)
+        if not header:
+            return None
+        frame_type, flags, stream, chat_id, length = unpack_header(header, self._max_payload)
+        payload = await self._recv_exactly(length) if length else b''
+        if length and not payload:
+            raise ConnectionError("Connection closed in the middle of frame.")
+        if self._recv_key is not None:
+            payload = self._check_frame(header, flags, payload)
+        return Frame(frame_type, flags, chat_id, payload, stream)
+
+    def _check_frame(self, header: bytes, flags: int, payload: bytes) -> bytes:
+        """ Check the mac of received frame.
+
+        :return: payload without mac
+        :raises BadFrameError: if there is no mac or it's wrong.
+        """
+        if not flags & FLAG_MAC or len(payload) < MAC_LENGTH:
+            raise BadFrameError("Frame without mac.")
+        mac, payload = payload[:MAC_LENGTH], payload[MAC_LENGTH:]
+        if not check_mac(mac, self._recv_key, self._received.to_bytes(8, 'big'),
+                         header, payload):
+            raise BadFrameError("Wrong mac of frame.")
+        self._received += 1
+        return payload
+
+    async def recv(self, size: int) -> bytes:
+        """ Receive at most size bytes of the payload of the next frame.
+
+        :return: empty bytes if the connection is closed.
+        """
+        if not self._buffer:
+            frame = await self.recv_frame()
+            if frame is None:
+                return b''
+            self._buffer = frame.payload
+        res, self._buffer = self._buffer[:size], self._buffer[size:]
+        return res
+
+
+class FramedStream:
+    """ One of the streams of multiplexed connection (see MULTIPLEXED_PROTOCOL).
+
+    It's used instead of auxiliary socket: all the frames are sent with
+    the given stream id via the main socket. Server never reads from
+    this stream.
+    """
+
+    def __init__(self, framed_socket: FramedSocket, stream_id: int):
+        self._framed_socket = framed_socket
+        self._stream_id = stream_id
+
+    async def send_frame(self, frame_type: int, payload: bytes, chat_id=0, flags=0):
+        await self._framed_socket.send_frame(frame_type, payload, chat_id, flags,
+                                             stream=self._stream_id)
+
+    async def sendall(self, data: bytes):
+        await self.send_frame(FRAME_COMMAND, data)
+
+    async def close(self):
+        """ The stream lives as long as the main socket, that is closed
+        by UserAssistant.
+        """
+        pass
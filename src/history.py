@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+The latest messages of chat that ChatAssistant keeps in memory.
+"""
+
+import sys
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+from typing import List, Tuple
+
+from .constants import *
+
+
+def message_size(message_id: int, message: Message) -> int:
+    """ Approximate amount of memory taken by the message in the window.
+    """
+    return (sys.getsizeof(message_id) + sys.getsizeof(message)
+            + sum(map(sys.getsizeof, message)))
+
+
+class HistoryWindow:
+    """ Ring buffer of the latest messages of chat: at most max_messages of
+    them and at most max_bytes of memory (but at least the newest one).
+
+    When the oldest messages are dropped, the cursor of history moves to
+    them, so they are read from the storage page by page on demand like all
+    the older ones.
+
+    Ids, messages and their sizes are kept in the parallel deques, without
+    any objects per message besides the messages themselves.
+    """
+
+    __slots__ = ('_ids', '_messages', '_sizes', '_make_cursor', 'cursor',
+                 'max_messages', 'max_bytes', 'nbytes', 'dropped')
+
+    def __init__(self, make_cursor, max_messages=HISTORY_WINDOW_SIZE,
+                 max_bytes=HISTORY_WINDOW_BYTES):
+        """ Initialization.
+
+        :param make_cursor: function that makes the cursor of history
+                            (messages older than the one with given id)
+        :param max_messages: max amount of messages in memory
+        :param max_bytes: max size of messages in memory (approximately)
+        """
+        self._ids = deque()
+        self._messages = deque()
+        self._sizes = deque()
+        self._make_cursor = make_cursor
+        self.cursor = None             # cursor of the messages older than the window
+        self.max_messages = max(1, max_messages)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.dropped = 0               # amount of messages that went to the storage
+
+    def __len__(self):
+        return len(self._messages)
+
+    def reset(self, entries: List[Tuple[int, Message]], cursor):
+        """ Fill the window by the messages from storage.
+
+        :param entries: list of tuple(id, message) from the oldest to the newest
+        :param cursor: cursor of the messages older than entries
+        """
+        self._ids.clear()
+        self._messages.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+        self.cursor = cursor
+        for message_id, message in entries:
+            self._push(len(self._ids), message_id, message)
+        self._shrink()
+
+    def append(self, message_id: int, message: Message):
+        """ Add new message and drop the oldest ones if there are too many.
+        """
+        # messages that are committed together could come in any order
+        pos = len(self._ids)
+        while pos and self._ids[pos - 1] > message_id:
+            pos -= 1
+        if pos == 0 and self._ids and self.cursor is not None:
+            # it's older than all the window, so it's already in the storage part
+            return
+        self._push(pos, message_id, message)
+        self._shrink()
+
+    def latest(self, limit: int) -> Tuple[List[Message], str]:
+        """ The latest messages of the window.
+
+        :return: tuple(at most limit messages from the oldest to the newest,
+                 cursor of the messages older than them)
+        """
+        if limit >= len(self._messages):
+            return list(self._messages), self.cursor
+        start = len(self._messages) - limit
+        return (list(islice(self._messages, start, None)),
+                self._make_cursor(self._ids[start]))
+
+    def latest_entries(self, limit: int) -> List[Tuple[int, Message]]:
+        """ The latest messages of the window with their ids.
+        """
+        start = max(0, len(self._messages) - limit)
+        return list(zip(islice(self._ids, start, None),
+                        islice(self._messages, start, None)))
+
+    def after(self, message_id: int, limit: int):
+        """ The messages that are newer than the one with message_id.
+
+        :return: list of at most limit tuple(id, message) from the oldest, or
+                 None if some of them could be in the storage part
+        """
+        if self.cursor is not None and (not self._ids or message_id < self._ids[0]):
+            return None
+        start = bisect_right(self._ids, message_id)
+        return list(zip(islice(self._ids, start, start + limit),
+                        islice(self._messages, start, start + limit)))
+
+    def last_id(self) -> int:
+        """ Id of the newest message of the window (0 if it's empty).
+        """
+        return self._ids[-1] if self._ids else 0
+
+    def stats(self) -> dict:
+        return {
+            'messages': len(self._messages),
+            'bytes': self.nbytes,
+            'dropped': self.dropped,
+        }
+
+    def _push(self, pos: int, message_id: int, message: Message):
+        size = message_size(message_id, message)
+        self._ids.insert(pos, message_id)
+        self._messages.insert(pos, message)
+        self._sizes.insert(pos, size)
+        self.nbytes += size
+
+    def _shrink(self):
+        dropped = 0
+        while len(self._messages) > self.max_messages or \
+                (self.nbytes > self.max_bytes and len(self._messages) > 1):
+            self._ids.popleft()
+            self._messages.popleft()
+            self.nbytes -= self._sizes.popleft()
+            dropped += 1
+        if dropped:
+            self.dropped += dropped
+            self.cursor = self._make_cursor(self._ids[0])
@@ -9,20 +9,86 @@
 
 from Crypto.PublicKey import RSA
 from Crypto.Signature.pkcs1_15 import PKCS115_SigScheme
+from Crypto.Cipher import PKCS1_OAEP
 from Crypto.Hash import SHA256
 from Crypto.Protocol.KDF import bcrypt, bcrypt_check
 from base64 import b64encode
 from Crypto.Random import get_random_bytes
+import hashlib
+import hmac
 
-from .constants.app_constants import RSA_PRIVATE_KEY_PATH, RSA_PUBLIC_KEY_PATH
-from .constants.protocol_constants import ATOM_LENGTH
+from .constants.app_constants import RSA_PRIVATE_KEY_PATH, RSA_PUBLIC_KEY_PATH, \
+    CRYPTO_SELF_CHECK
+from .constants.protocol_constants import ATOM_LENGTH, SESSION_KEY_LENGTH
 
 RSA_KEY = None
 RSA_SIGNER = None
+CRYPTO = None
 
 passphrase = "ThE s3Cre1 pa$$w0rd 4 RSA."
 
 
+class CryptoService:
+    """ All the operations with the RSA keys of server.
+
+    Keys are parsed once and kept in memory, so signing and verification
+    don't touch the disk. In self-check mode every signature is verified
+    right after signing (it's twice as slow, so use it only for debugging).
+    """
+
+    def __init__(self, private_key, self_check=False):
+        """ Initialization.
+
+        :param private_key: RSA key of server (RsaKey with private part)
+        :param self_check: verify every signature made by this object
+        """
+        self.private_key = private_key
+        self.public_key = private_key.publickey()
+        self.self_check = self_check
+        self._signer = PKCS115_SigScheme(self.private_key)
+        self._verifier = PKCS115_SigScheme(self.public_key)
+        self._decrypter = PKCS1_OAEP.new(self.private_key)
+
+    @classmethod
+    def from_files(cls, private_key_path=RSA_PRIVATE_KEY_PATH, self_check=False):
+        with open(private_key_path, 'rb') as file:
+            key = RSA.import_key(file.read(), passphrase)
+        return cls(key, self_check)
+
+    def sign(self, message: bytes) -> bytes:
+        """ Create digital signature of message using server's
+        private key.
+
+        :param message: any data
+        :return: array of 256 bytes
+        """
+        signature = self._signer.sign(SHA256.new(message))
+        if self.self_check:
+            self.verify(message, signature)
+        return signature
+
+    # noinspection PyTypeChecker
+    def verify(self, message: bytes, signature: bytes):
+        """ Verify whether the message is really from the server.
+
+        :raises ValueError: if the signature is wrong.
+        """
+        self._verifier.verify(SHA256.new(message), signature)
+
+    def decrypt_session_key(self, encrypted_key: bytes) -> bytes:
+        """ Decrypt the session key that client encrypted with server's
+        public key.
+
+        :param encrypted_key: array of 256 bytes
+        :return: array of SESSION_KEY_LENGTH bytes
+        :raises ValueError: if the key is wrong.
+        """
+        key = self._decrypter.decrypt(encrypted_key)
+        if len(key) != SESSION_KEY_LENGTH:
+            raise ValueError(f"Bad length of session key: {len(key)}")
+        return key
+
+
 def generate_signature_keys():
     """ Generate RSA key pair for digital signature of server.
 
@@ -33,6 +99,7 @@ def generate_signature_keys():
     """
     global RSA_KEY
     global RSA_SIGNER
+    global CRYPTO
 
     RSA_KEY = RSA.generate(2048)
     encrypted_key = RSA_KEY.export_key(passphrase=passphrase, pkcs=8,
@@ -43,19 +110,20 @@ def generate_signature_keys():
     with open(RSA_PUBLIC_KEY_PATH, 'wb') as file:
         file.write(RSA_KEY.publickey().export_key())
 
-    RSA_SIGNER = PKCS115_SigScheme(RSA_KEY)
+    CRYPTO = CryptoService(RSA_KEY, CRYPTO_SELF_CHECK)
+    RSA_SIGNER = CRYPTO._signer
 
 
 def read_keys():
     """ Read generated keys from files.
 
     Calls when the server starts to work.
-    Changes the global variables RSA_KEY, RSA_SIGNER
+    Changes the global variables RSA_KEY, RSA_SIGNER, CRYPTO
     """
-    global RSA_KEY, RSA_SIGNER
-    with open(RSA_PRIVATE_KEY_PATH, 'rb') as file:
-        RSA_KEY = RSA.import_key(file.read(), passphrase)
-    RSA_SIGNER = PKCS115_SigScheme(RSA_KEY)
+    global RSA_KEY, RSA_SIGNER, CRYPTO
+    CRYPTO = CryptoService.from_files(RSA_PRIVATE_KEY_PATH, CRYPTO_SELF_CHECK)
+    RSA_KEY = CRYPTO.private_key
+    RSA_SIGNER = CRYPTO._signer
 
 
 def sign_message(message: bytes) -> bytes:
@@ -65,9 +133,44 @@ def sign_message(message: bytes) -> bytes:
     :param message: any data
     :return: array of 256 bytes
     """
-    tmp = SHA256.new(message)
-    signature = RSA_SIGNER.sign(tmp)
-    return signature
+    return CRYPTO.sign(message)
+
+
+def decrypt_session_key(encrypted_key: bytes) -> bytes:
+    """ Decrypt the session key that client encrypted with server's
+    public key.
+
+    :param encrypted_key: array of 256 bytes
+    :return: array of SESSION_KEY_LENGTH bytes
+    :raises ValueError: if the key is wrong.
+    """
+    return CRYPTO.decrypt_session_key(encrypted_key)
+
+
+def make_mac(key: bytes, *parts: bytes) -> bytes:
+    """ Create HMAC-SHA256 of all the parts using session key.
+
+    :return: array of 32 bytes
+    """
+    mac = hmac.new(key, digestmod=hashlib.sha256)
+    for part in parts:
+        mac.update(part)
+    return mac.digest()
+
+
+def check_mac(mac: bytes, key: bytes, *parts: bytes) -> bool:
+    """ Checks whether the mac of parts is right.
+    """
+    return hmac.compare_digest(mac, make_mac(key, *parts))
+
+
+def derive_key(key: bytes, *labels: bytes) -> bytes:
+    """ Derive the key of one purpose (e.g. one socket and direction) from
+    the session key, the macs made by it are wrong for all the others.
+
+    :return: array of 32 bytes
+    """
+    return make_mac(key, b'/'.join(labels))
 
 
 def generate_check_phrase() -> bytes:
@@ -106,11 +209,7 @@ def verify(message: bytes, signature: bytes):
 
     :raises ValueError: if the signature is wrong.
     """
-    tmp = SHA256.new(message)
-    with open(RSA_PUBLIC_KEY_PATH, 'rb') as file:
-        key = RSA.import_key(file.read())
-    signer = PKCS115_SigScheme(key)
-    signer.verify(tmp, signature)
+    CRYPTO.verify(message, signature)
 
 
 def hash_password(password):
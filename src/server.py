@@ -24,49 +24,119 @@ TODO:
 # TODO write logs
 
 
+import time
+
 import curio
 from curio import socket
 
 from .session import *
+from .framing import FramedSocket, get_chat_id
+from . import codec
+from .workers import CRYPTO_POOL, sign_message_async, hash_password_async, \
+    check_password_async
 from .database import BadStorageParamException, YouRBannedWroteError
 from .constants.protocol_constants import *
 from .constants.app_constants import *
 from .constants.database_constants import *
 
-ANNOYING_SOCKETS = {}
-TIME_SLEEP = 1
 TIMEOUT = 40
 
+# how often unclaimed auxiliary connections are checked for expiration
+EXPIRING_PERIOD = 5
+
+
+class PendingConnections:
+    """ Registry of auxiliary connections that are waiting for their
+    UserAssistant (key - check phrase).
+
+    UserAssistant that waits for the connection sleeps on curio.Event and
+    wakes up as soon as the connection arrives. Connections that nobody
+    claims during `ttl` seconds are closed and removed.
+    """
+
+    def __init__(self, ttl=TIMEOUT):
+        self._ttl = ttl
+        self._connections = {}      # check_phrase: (connection, addr, arrival time)
+        self._waiters = {}          # check_phrase: curio.Event
+
+    def __len__(self):
+        return len(self._connections)
+
+    async def add(self, check_phrase: bytes, connection, addr) -> bool:
+        """ Save the new auxiliary connection and wake up its waiter.
+
+        :return: False if there is already a connection with such check
+                 phrase (the new one isn't saved, the first one is kept)
+        """
+        if check_phrase in self._connections:
+            logger.info(f"[*] Duplicate annoying connection from {addr}, rejected.")
+            return False
+        self._connections[check_phrase] = (connection, addr, time.monotonic())
+        if check_phrase in self._waiters:
+            await self._waiters[check_phrase].set()
+        return True
+
+    async def get(self, check_phrase: bytes) -> tuple:
+        """ Wait for the auxiliary connection with given check phrase.
+
+        :return: tuple(connection, addr)
+        """
+        if check_phrase not in self._connections:
+            event = self._waiters.setdefault(check_phrase, curio.Event())
+            try:
+                await event.wait()
+            finally:
+                del self._waiters[check_phrase]
+        connection, addr, _ = self._connections.pop(check_phrase)
+        return connection, addr
+
+    async def expire(self):
+        """ Close all the connections that are waiting longer than ttl.
+        """
+        now = time.monotonic()
+        expired = [check_phrase for check_phrase, (_, _, arrival) in self._connections.items()
+                   if now - arrival > self._ttl]
+        for check_phrase in expired:
+            connection, addr, _ = self._connections.pop(check_phrase)
+            logger.info(f"[*] Annoying connection from {addr} expired.")
+            await connection.close()
+
+    async def expiring(self):
+        """ Mainloop of expiring (runs in background).
+        """
+        while True:
+            await curio.sleep(EXPIRING_PERIOD)
+            await self.expire()
+
+
+ANNOYING_SOCKETS = PendingConnections()
+
 
 async def add_annoying_connection(client_connection, addr):
     """ Function that handles all the auxiliary connections.
 
-    It receives the check phrase and if it's OK, added socket to the dictionary
-    with key == check phrase
+    It receives the check phrase and if it's OK, added socket to the
+    ANNOYING_SOCKETS with key == check phrase
     """
     client_connection.setblocking(0)
     logger.info(f"[*] Annoying connection from {addr}")
     try:
         check_phrase = await curio.timeout_after(TIMEOUT, client_connection.recv, ATOM_LENGTH)
         if len(check_phrase) != ATOM_LENGTH:
-            client_connection.sendall(b"Bad check phrase.")
-            client_connection.close()
+            await client_connection.sendall(b"Bad check phrase.")
+            await client_connection.close()
             return
 
-        global ANNOYING_SOCKETS
-        ANNOYING_SOCKETS[check_phrase] = (client_connection, addr)
+        if not await ANNOYING_SOCKETS.add(check_phrase, client_connection, addr):
+            await client_connection.sendall(b"Bad check phrase.")
+            await client_connection.close()
 
     except curio.TaskTimeout:
-        client_connection.close()
+        await client_connection.close()
 
 
 async def get_required_connection(check_phrase) -> tuple:
-    while True:
-        if check_phrase in ANNOYING_SOCKETS:
-            res = ANNOYING_SOCKETS[check_phrase]
-            del ANNOYING_SOCKETS[check_phrase]
-            return res
-        await curio.sleep(TIME_SLEEP)
+    return await ANNOYING_SOCKETS.get(check_phrase)
 
 
 class OutSocketNotFoundError(Exception):
@@ -106,13 +176,30 @@ class UserAssistant(metaclass=DebugMetaclass):
         # client for connection with database
         self._db_client = db_client
 
+        # if client switched to the framed protocol via self.use_framed_protocol
+        self._framed = False
+
+        # if client switched to the multiplexed protocol via
+        # self.use_multiplexed_protocol (there is no auxiliary socket then)
+        self._multiplexed = False
+
+        # key for authentication of frames (see self.use_session_key)
+        self._session_key = None
+
     async def main_process(self):
         logger.info(f"[*] Start the main process with client {self._main_addr}...")
 
         while True:
             try:
                 logger.info(f"[<--] Getting command from {self._main_addr}...")
-                command = await self._client_main.recv(ATOM_LENGTH)
+                if self._framed:
+                    frame = await self._client_main.recv_frame()
+                    if frame is not None and frame.type in FRAME_HANDLERS:
+                        await FRAME_HANDLERS[frame.type](self, frame)
+                        continue
+                    command = frame.payload if frame is not None else b''
+                else:
+                    command = await self._client_main.recv(ATOM_LENGTH)
                 logger.info(f"[*] Got {command} from {self._main_addr}...")
                 if command not in COMMANDS and command:
                     await self._client_main.sendall(b"Wrong command.")
@@ -132,6 +219,10 @@ class UserAssistant(metaclass=DebugMetaclass):
                 await self._client_main.close()
                 break
 
+        await self._leave_chat()
+        if self._user_observer is not None:
+            ACTIVITY_HUB.disconnect(self._user_observer)
+            await self._user_observer.stop()
         await self._db_client.end()
 
     async def confirm_user(self):
@@ -172,7 +263,7 @@ class UserAssistant(metaclass=DebugMetaclass):
         else:
             password_hash = password_hash[0]
         try:
-            check_password(supposed_password, password_hash)
+            await check_password_async(supposed_password, password_hash)
         except ValueError:
             logger.info(f"[*] WRONG_PASSWORD from {self._main_addr}")
             await self._client_main.sendall(WRONG_PASSWORD)
@@ -181,6 +272,9 @@ class UserAssistant(metaclass=DebugMetaclass):
         # raises Exception if not successful
         self._logged_in = True
         self._logged_user = User(name)
+        if self._framed:
+            # the client is authenticated, so the big frames are allowed
+            self._client_main.set_max_payload(MAX_FRAME_PAYLOAD)
         await self._get_out_socket()
         logger.info(f"[*] Client {self._main_addr} logged as {name}.")
 
@@ -191,48 +285,43 @@ class UserAssistant(metaclass=DebugMetaclass):
         await self._client_main.sendall(READY_FOR_TRANSFERRING)
         logger.info(f'[*] Waiting for READY_FOR_TRANSFERRING from {self._main_addr}...')
         resp = await self._client_main.recv(ATOM_LENGTH)
-        if resp == READY_FOR_TRANSFERRING:
+        if resp == READY_FOR_TRANSFERRING and self._multiplexed:
+            self._client_out = self._client_main.stream(PUSH_STREAM)
+            self._client_out_addr = self._main_addr
+            self._user_observer = UserObserver(self._logged_user, self._client_out,
+                                               framed=True,
+                                               use_mac=self._session_key is not None)
+            await self._client_out.sendall(READY_FOR_TRANSFERRING)
+            await self._user_observer.start()
+        elif resp == READY_FOR_TRANSFERRING:
             check_phrase = generate_check_phrase()  # FIXME it might be incorrect
             await self._client_main.sendall(check_phrase)
             self._client_out, self._client_out_addr = \
                 await curio.timeout_after(TIMEOUT, get_required_connection,
                                           check_phrase)
-            self._user_observer = UserObserver(self._logged_user, self._client_out)
+            if self._framed:
+                self._client_out = FramedSocket(self._client_out)
+            if self._session_key is not None:
+                self._client_out.set_mac_key(self._session_key, AUX_SOCKET_LABEL)
+            self._user_observer = UserObserver(self._logged_user, self._client_out,
+                                               framed=self._framed,
+                                               use_mac=self._session_key is not None)
             await self._client_out.sendall(READY_FOR_TRANSFERRING)
+            await self._user_observer.start()
         else:
             raise UnknownAnswerError(resp)
+        # activity in all the chats and channels of user is sent since now
+        await ACTIVITY_HUB.connect(self._user_observer, self._db_client)
 
     # FIXME Check whether it works
     # TODO add protocol
     async def send_all_chats(self):
         await self._check_logged()
 
-        logger.info(f'[-->] Sending {READY_FOR_TRANSFERRING} to the {self._client_out_addr}...')
-        await self._client_out.sendall(READY_FOR_TRANSFERRING)
-
-        logger.info(f'[<--] Waiting {READY_FOR_TRANSFERRING} from the {self._client_out_addr}...')
-        resp = await self._client_out.recv(ATOM_LENGTH)
-        if resp != READY_FOR_TRANSFERRING:
-            raise UnknownAnswerError(resp)
-
-        metadata = JSON_OUT_METADATA.copy()
-
+        # via the queue of observer in all the protocols, so the writer task
+        # is the only one that talks to the aux socket
         data = await self._db_client.get_users_belong(self._logged_user)
-        pickled_data = pickle.dumps(data)
-        metadata[CONTENT_TYPE] = CHATS_LIST
-        metadata[CONTENT_SIZE] = len(pickled_data)
-        metadata[SIGNATURE_OF_SERVER] = sign_message(pickled_data).hex()
-        verify(pickled_data, bytes.fromhex(metadata[SIGNATURE_OF_SERVER]))
-        logger.info(f'[-->] Sending {metadata} to the {self._client_out_addr}...')
-        await self._client_out.sendall(bytes(json.dumps(metadata), encoding='utf-8'))
-
-        logger.info(f'[<--] Waiting {READY_FOR_TRANSFERRING} from the {self._client_out_addr}...')
-        resp = await self._client_out.recv(ATOM_LENGTH)
-        if resp == READY_FOR_TRANSFERRING:
-            logger.info(f'[-->] Sending pickled data of {len(pickled_data)} bytes to the {self._client_out_addr}')
-            await self._client_out.sendall(pickled_data)
-        else:
-            raise UnknownAnswerError(resp)
+        await self._user_observer.send_chats(data)
 
     @staticmethod
     def _convert_json(json_format, given_data):
@@ -288,10 +377,18 @@ class UserAssistant(metaclass=DebugMetaclass):
             await self._client_main.sendall(WRONG_NAME)
             return
 
-        await self._db_client.new_user(name, hash_password(password))
-        # raises Exception if not successful
+        try:
+            # returns when the user is committed
+            await self._db_client.new_user(name, await hash_password_async(password))
+        except BadStorageParamException:
+            logger.info(f"[*] WRONG_NAME from {self._main_addr}")
+            await self._client_main.sendall(WRONG_NAME)
+            return
         self._logged_in = True
         self._logged_user = User(name)
+        if self._framed:
+            # the client is authenticated, so the big frames are allowed
+            self._client_main.set_max_payload(MAX_FRAME_PAYLOAD)
         await self._get_out_socket()
         logger.info(f"[*] Client {self._main_addr} logged as {name}.")
 
@@ -299,13 +396,103 @@ class UserAssistant(metaclass=DebugMetaclass):
     async def log_out(self):
         pass
 
+    async def use_framed_protocol(self):
+        """ Switch the connection to the framed protocol.
+
+        1. Client sends command __FRAMED_PROTOCOL__ to server.
+        2. Server responds __READY_FOR_TRANSFERRING__.
+        3. Since then all the data via main and auxiliary sockets is sent
+           by frames.
+        """
+        if self._logged_in:
+            await self._client_main.sendall(b"You should log out before.")
+            return
+        if self._framed:
+            await self._client_main.sendall(READY_FOR_TRANSFERRING)
+            return
+        logger.info(f"[*] Switching {self._main_addr} to the framed protocol...")
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+        self._client_main = FramedSocket(self._client_main)
+        self._framed = True
+
+    async def use_multiplexed_protocol(self):
+        """ Switch the connection to the multiplexed protocol: the framed
+        protocol without auxiliary socket.
+
+        1. Client sends command __MULTIPLEXED_PROTOCOL__ to server.
+        2. Server responds __READY_FOR_TRANSFERRING__.
+        3. Since then all the data is sent by frames via main socket,
+           updates use PUSH_STREAM.
+        """
+        if self._logged_in:
+            await self._client_main.sendall(b"You should log out before.")
+            return
+        if self._framed:
+            await self._client_main.sendall(b"Protocol is already chosen.")
+            return
+        await self.use_framed_protocol()
+        self._multiplexed = True
+
+    async def use_session_key(self):
+        """ Create the session key, so all the frames since now are
+        authenticated by HMAC instead of RSA signatures.
+
+        1. Client sends command __SESSION_KEY__ to server.
+        2. Server checks if all the parameters are correct.
+        3. Server sends __READY_FOR_TRANSFERRING__.
+        4. Client sends the random key encrypted by public key of server.
+        5. Server decrypts the key and responds HMAC of the encrypted key.
+        """
+        if not self._framed:
+            await self._client_main.sendall(b"Session key requires framed protocol.")
+            return
+        if self._logged_in:
+            await self._client_main.sendall(b"You should log out before.")
+            return
+        if self._session_key is not None:
+            await self._client_main.sendall(b"Session key is already set.")
+            return
+
+        logger.info(f"[*] Creating session key for {self._main_addr}...")
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+        encrypted_key = await self._client_main.recv(ATOM_LENGTH)
+        try:
+            key = decrypt_session_key(encrypted_key)
+        except ValueError:
+            await self._client_main.sendall(b"Bad session key.")
+            return
+        await self._client_main.sendall(make_mac(key, encrypted_key))
+        self._client_main.set_mac_key(key)
+        self._session_key = key
+
+    async def _recv_content(self, size: int) -> bytes:
+        """ Fetch the content of given size from the main socket.
+
+        In the old protocol it's preceded by __READY_FOR_TRANSFERRING__, in the
+        framed one it's just the next frame.
+        """
+        if self._framed:
+            logger.info(f'[<--] Fetching frame of {size} bytes from {self._main_addr}...')
+            frame = await self._client_main.recv_frame()
+            return frame.payload if frame is not None else b''
+
+        logger.info(f'[-->] Sending {READY_FOR_TRANSFERRING} to the {self._main_addr}...')
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+        logger.info(f'[<--] Fetching {size} bytes from {self._main_addr}...')
+        content = b''
+        for _ in range(0, size, CHUNK):
+            content += await self._client_main.recv(CHUNK)
+        done = len(content)
+        if size - done > 0:
+            content += await self._client_main.recv(size - done)
+        return content
+
     async def _server_signification(self):
         await self._client_main.sendall(READY_FOR_TRANSFERRING)
         logger.info(f"[<--] Fetching message from {self._main_addr} for server signification...")
         request_phrase = await self._client_main.recv(ATOM_LENGTH)
         logger.info(f"[-->] Sending signature to {self._main_addr}...")
-        await self._client_main.sendall(sign_message(request_phrase))  # len: 256
-        verify(request_phrase, sign_message(request_phrase))
+        await self._client_main.sendall(await sign_message_async(request_phrase))  # len: 256
 
     async def create_chat(self):
         await self._check_logged()
@@ -322,43 +509,93 @@ class UserAssistant(metaclass=DebugMetaclass):
             await self._client_main.sendall(BAD_JSON_FORMAT)
             return
 
-        # FIXME: DANGEROUS, VULNERABILITY, HAZARD, THREAT
-        #  It's so dangerous to fetch any pickle file from clients.
-        #  There is 2 variants:
-        #          1. use something else instead of pickle
-        #          2. check client before (likely harder way)
-        #  ...
-        #  Once more: DON'T RUN THIS MESSENGER ON PUBLIC SERVER UNTIL IT USES PICKLE HERE
         name = data[NAME]
         content_type = data[CONTENT_TYPE]
 
         if content_type != CHAT_MEMBERS:
             await self._client_main.sendall(b"Incorrect content type")
         content_size = data[CONTENT_SIZE]
-        list_members_pickled = b''
-        logger.info(f'[-->] Sending {READY_FOR_TRANSFERRING} to the {self._main_addr}...')
-        await self._client_main.sendall(READY_FOR_TRANSFERRING)
-        logger.info(f'[<--] Fetching {content_size} bytes from {self._main_addr}...')
-        for _ in range(0, content_size, CHUNK):
-            list_members_pickled += await self._client_main.recv(CHUNK)
-        done = len(list_members_pickled)
-        if content_size - done:
-            list_members_pickled += await self._client_main.recv(content_size - done)
-        try:
-            list_members = pickle.loads(list_members_pickled)
-        except (pickle.UnpicklingError, TypeError, AttributeError):
-            await self._client_main.sendall(b"Bad pickle data.")
+        list_members = self._load_members(await self._recv_content(content_size))
+        if list_members is None:
+            await self._client_main.sendall(b"Bad list of members.")
             return
 
         # TODO add client_out_addr to ChatAssistant
+        await self._leave_chat()
         try:
             # after this all the messages and members will be sent to _client_out
-            chat_assistant = await create_chat(name, self._logged_user, list_members, self._client_out)
+            chat_assistant = await create_chat(name, self._logged_user, list_members,
+                                               self._user_observer)
             self._current_chat = chat_assistant
         except BadStorageParamException as e:
             logger.exception(e)
             await self._client_main.sendall(WRONG_NAME)
 
+    async def create_channel(self):
+        """ Create new channel and open it (see Channels in protocol_constants).
+        """
+        await self._check_logged()
+
+        logger.info(f"[*] Starting the process of creating the new channel.")
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+
+        logger.info(f"[<--] Fetching json from {self._main_addr}...")
+        resp = await self._client_main.recv(ATOM_LENGTH)
+        data = self._convert_json(JSON_CREATE_CHANNEL_FORMAT, resp)
+        if not data or type(data[NAME]) is not str or not data[NAME]:
+            await self._client_main.sendall(BAD_JSON_FORMAT)
+            return
+        await self._leave_chat()
+        try:
+            # after this the publications will be sent to _client_out
+            self._current_chat = await create_channel(data[NAME], self._logged_user,
+                                                      self._user_observer)
+        except BadStorageParamException as e:
+            logger.info(f"[*] Can't create channel: {e}")
+            await self._client_main.sendall(WRONG_NAME)
+            return
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+
+    @staticmethod
+    def _load_members(list_members_encoded: bytes):
+        """ Decode the list of users sent by client.
+
+        :return: list of User or None if the data is wrong.
+        """
+        try:
+            # codec creates only the basic types and namedtuples, so it's safe
+            list_members = codec.loads(list_members_encoded)
+        except codec.CodecError:
+            return None
+        if type(list_members) is not list \
+                or not all(type(member) is User for member in list_members):
+            return None
+        return list_members
+
+    async def invite(self):
+        """ Add many users to the current chat at once (see INVITE in
+        protocol_constants).
+        """
+        await self._check_logged()
+        if not isinstance(self._current_chat, ChatAssistant):
+            await self._client_main.sendall(b"You didn't enter the chat.")
+            return
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+
+        logger.info(f"[<--] Fetching json from {self._main_addr}...")
+        resp = await self._client_main.recv(ATOM_LENGTH)
+        data = self._convert_json(JSON_INVITE_FORMAT, resp)
+        if not data or data[CONTENT_TYPE] != CHAT_MEMBERS \
+                or type(data[CONTENT_SIZE]) is not int or data[CONTENT_SIZE] < 0:
+            await self._client_main.sendall(BAD_JSON_FORMAT)
+            return
+        list_members = self._load_members(await self._recv_content(data[CONTENT_SIZE]))
+        if list_members is None:
+            await self._client_main.sendall(b"Bad list of members.")
+            return
+        await self._current_chat.add_users(list_members)
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+
     async def _check_logged(self):
         if not self._logged_in:
             await self._client_main.sendall(b"You didn't log in.")
@@ -372,22 +609,29 @@ class UserAssistant(metaclass=DebugMetaclass):
         logger.info(f"[<--] Fetching json from {self._main_addr}...")
         resp = await self._client_main.recv(ATOM_LENGTH)
         data = self._convert_json(JSON_OPEN_CHAT_FORMAT, resp)
-        if not data:
+        if not data or type(data.get(SEQ, 0)) not in {int, type(None)}:
             await self._client_main.sendall(BAD_JSON_FORMAT)
             return
         await self._client_main.sendall(READY_FOR_TRANSFERRING)
         logger.info(f'[*] Got {data}.')
         name = data[NAME]
         chat_type = data[CONTENT_TYPE]
+        await self._leave_chat()
+        # it's current before attaching, so it's detached even if
+        # the attaching fails
         if chat_type == CHAT:
             chat_assistant = await get_chat_assistant(name)
 
             members = await chat_assistant.get_members()
+            self._current_chat = chat_assistant
             if self._logged_user.name in members:
                 await chat_assistant.attach_user_observer(self._user_observer)
             else:
                 await chat_assistant.add_user(self._user_observer)
-            self._current_chat = chat_assistant
+        elif chat_type == CHANNEL:
+            channel_assistant = await get_channel_assistant(name)
+            self._current_chat = channel_assistant
+            await channel_assistant.attach_user_observer(self._user_observer, data.get(SEQ))
         else:
             raise NotImplementedError()
 
@@ -402,35 +646,129 @@ class UserAssistant(metaclass=DebugMetaclass):
         data = self._convert_json(JSON_MESSAGE_TEMPLATE, resp)
         if not data:
             await self._client_main.sendall(BAD_JSON_FORMAT)
+            return
         content_type = data[CONTENT_TYPE]
         size = data[CONTENT_SIZE]
         if content_type == TEXT:
-            await self._client_main.sendall(READY_FOR_TRANSFERRING)
-            text = b''
-            for _ in range(0, size, CHUNK):
-                text += await self._client_main.recv(CHUNK)
-            done = len(text)
-            if size - done:
-                text += await self._client_main.recv(size - done)
-            text = str(text, encoding='utf-8')
-            message = Message(self._logged_user.name, str(datetime.datetime.now()), 0, content_type, text)
-            try:
-                await self._current_chat.new_message(message)
-            except YouRBannedWroteError:
-                await self._client_main.sendall(b"You are banned in this chat.")
-            await self._client_main.sendall(READY_FOR_TRANSFERRING)
+            text = await self._recv_content(size)
+            await self._new_text_message(str(text, encoding='utf-8'))
         else:
             raise NotImplementedError()
 
+    async def message_frame(self, frame):
+        """ Framed version of message: the whole text comes in one frame
+        of type FRAME_TYPES[NEW_MESSAGE] and server answers once.
+        """
+        if self._current_chat is None:
+            await self._client_main.sendall(b"You didn't enter the chat.")
+            return
+        if frame.chat_id != get_chat_id(self._current_chat.get_name()):
+            await self._client_main.sendall(b"Wrong chat.")
+            return
+        await self._new_text_message(str(frame.payload, encoding='utf-8'))
+
+    async def _new_text_message(self, text: str):
+        message = Message(self._logged_user.name, str(datetime.datetime.now()), 0, TEXT, text)
+        try:
+            await self._current_chat.new_message(message)
+        except YouRBannedWroteError:
+            await self._client_main.sendall(b"You are banned in this chat.")
+        except NotPublisherError:
+            await self._client_main.sendall(b"Only moderators could publish in this channel.")
+            return
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+
     async def delete_chat(self):
         pass
 
+    async def history(self):
+        """ Send the page of older messages of the current chat
+        (see HISTORY in protocol_constants).
+        """
+        await self._check_logged()
+        if not isinstance(self._current_chat, ChatAssistant):
+            await self._client_main.sendall(b"You didn't enter the chat.")
+            return
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+
+        logger.info(f"[<--] Fetching json from {self._main_addr}...")
+        resp = await self._client_main.recv(ATOM_LENGTH)
+        data = self._convert_json(JSON_HISTORY_FORMAT, resp)
+        if not data or type(data[LIMIT]) is not int or data[LIMIT] < 1:
+            await self._client_main.sendall(BAD_JSON_FORMAT)
+            return
+        limit = min(data[LIMIT], MAX_HISTORY_PAGE_SIZE)
+        try:
+            messages, cursor = await self._current_chat.get_history(data[CURSOR], limit)
+        except BadStorageParamException:
+            await self._client_main.sendall(b"Bad cursor.")
+            return
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+        await self._user_observer.send_history(self._current_chat, messages, cursor)
+
+    async def search(self):
+        """ Find the messages of the current chat and send the page of
+        results (see SEARCH in protocol_constants).
+        """
+        await self._check_logged()
+        if not isinstance(self._current_chat, ChatAssistant):
+            await self._client_main.sendall(b"You didn't enter the chat.")
+            return
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+
+        logger.info(f"[<--] Fetching json from {self._main_addr}...")
+        resp = await self._client_main.recv(ATOM_LENGTH)
+        data = self._convert_json(JSON_SEARCH_FORMAT, resp)
+        if not data or type(data[LIMIT]) is not int or data[LIMIT] < 1 \
+                or type(data[PATTERN]) is not str or type(data[AUTHOR]) is not str \
+                or type(data.get(REGEX, False)) is not bool:
+            await self._client_main.sendall(BAD_JSON_FORMAT)
+            return
+        limit = min(data[LIMIT], MAX_SEARCH_PAGE_SIZE)
+        try:
+            messages, cursor = await self._current_chat.search(data[PATTERN], data[AUTHOR],
+                                                               data[CURSOR], limit,
+                                                               data.get(REGEX, False))
+        except BadStorageParamException as e:
+            await self._client_main.sendall(bytes(str(e), encoding='utf-8'))
+            return
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+        await self._user_observer.send_search_results(self._current_chat, messages, cursor)
+
+    async def catch_up(self):
+        """ Send the publications of the current channel that client
+        doesn't have (see Channels in protocol_constants).
+        """
+        await self._check_logged()
+        if not isinstance(self._current_chat, ChannelAssistant):
+            await self._client_main.sendall(b"You didn't enter the channel.")
+            return
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+
+        logger.info(f"[<--] Fetching json from {self._main_addr}...")
+        resp = await self._client_main.recv(ATOM_LENGTH)
+        data = self._convert_json(JSON_CATCH_UP_FORMAT, resp)
+        if not data or type(data[SEQ]) is not int or data[SEQ] < 0 \
+                or type(data[LIMIT]) is not int or data[LIMIT] < 1:
+            await self._client_main.sendall(BAD_JSON_FORMAT)
+            return
+        limit = min(data[LIMIT], MAX_HISTORY_PAGE_SIZE)
+        await self._client_main.sendall(READY_FOR_TRANSFERRING)
+        await self._current_chat.catch_up(self._user_observer, data[SEQ], limit)
+
+    async def _leave_chat(self):
+        """ Detach from the current chat or channel (if there is one).
+        """
+        if self._current_chat is not None:
+            chat, self._current_chat = self._current_chat, None
+            await chat.detach_user_assistant(self._logged_user)
+
     async def exit_from_chat(self):
         await self._check_logged()
         if self._current_chat is None:
             await self._client_main.sendall(b"You didn't enter the chat.")
             return
-        await self._current_chat.detach_user_assistant(self._logged_user)
+        await self._leave_chat()
         await self._client_main.sendall(READY_FOR_TRANSFERRING)
         await self.send_all_chats()
 
@@ -444,6 +782,19 @@ COMMANDS = {
     MESSAGE: UserAssistant.message,
     DELETE_CHAT: UserAssistant.delete_chat,
     EXIT_FROM_CHAT: UserAssistant.exit_from_chat,
+    HISTORY: UserAssistant.history,
+    SEARCH: UserAssistant.search,
+    INVITE: UserAssistant.invite,
+    CREATE_CHANNEL: UserAssistant.create_channel,
+    CATCH_UP: UserAssistant.catch_up,
+    FRAMED_PROTOCOL: UserAssistant.use_framed_protocol,
+    MULTIPLEXED_PROTOCOL: UserAssistant.use_multiplexed_protocol,
+    SESSION_KEY: UserAssistant.use_session_key,
+}
+
+# handlers of the frames that aren't commands (framed protocol only)
+FRAME_HANDLERS = {
+    FRAME_TYPES[NEW_MESSAGE]: UserAssistant.message_frame,
 }
 
 
@@ -476,12 +827,30 @@ async def tcp_server(host, port, target):
 async def chat_servers():
     logger.info(f"[*] Started main server at {MAIN_SERVER_HOST}:{MAIN_SERVER_PORT}")
     logger.info(f"[*] Started data server at {DATA_SERVER_HOST}:{DATA_SERVER_PORT}")
+    # create the tables and launch the worker of database once for all the clients
+    await StorageClientImplementation.prepare(SERVER_DATABASE)
     async with curio.TaskGroup() as g:
         await g.spawn(tcp_server, MAIN_SERVER_HOST, MAIN_SERVER_PORT,
                       main_client_handler)
         await g.spawn(tcp_server, DATA_SERVER_HOST, DATA_SERVER_PORT,
                       add_annoying_connection)
+        await g.spawn(ANNOYING_SOCKETS.expiring)
+        await g.spawn(CRYPTO_POOL.reporting, CRYPTO_STATS_PERIOD)
+        await g.spawn(CHAT_ASSISTANTS.expiring)
+        await g.spawn(CHAT_ASSISTANTS.reporting, CHATS_STATS_PERIOD)
+        await g.spawn(CHANNEL_ASSISTANTS.expiring)
+        await g.spawn(CHANNEL_ASSISTANTS.reporting, CHATS_STATS_PERIOD)
+        await g.spawn(ACTIVITY_HUB.sending)
+        await g.spawn(ACTIVITY_HUB.reporting, CHATS_STATS_PERIOD)
+        await g.spawn(StorageClientImplementation.reporting, SERVER_DATABASE,
+                      DB_STATS_PERIOD)
+        await g.spawn(StorageClientImplementation.checkpointing, SERVER_DATABASE,
+                      DB_CHECKPOINT_PERIOD)
 
 
 def run():
-    curio.run(chat_servers())
+    CRYPTO_POOL.start()
+    try:
+        curio.run(chat_servers())
+    finally:
+        CRYPTO_POOL.shutdown()
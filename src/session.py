@@ -10,59 +10,326 @@
 from .database import StorageClientInterface, SqliteStorageClient
 from .database import BadStorageParamException
 from .sequrity import *
+from .framing import get_chat_id
+from . import codec
+from .workers import sign_message_async
+from .history import HistoryWindow
 from .constants import *
 from .logger import DebugMetaclass, logger
 
 import datetime
+import time
+from collections import OrderedDict, deque
 from typing import Set, List, Dict
 import json
-import pickle
+
+import curio
 
 
 StorageClientImplementation = SqliteStorageClient
 
 
+class SignedData:
+    """ Serialized update that is signed at most once, no matter how
+    many observers send it. The signature is made only when some observer
+    needs it (the ones that use session key don't).
+    """
+
+    # amount of RSA signatures that weren't made due to sharing
+    # of the signature between observers
+    signatures_saved = 0
+
+    __slots__ = ('data', '_signature', '_signing', '_signed_payload')
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._signature = None
+        self._signing = None
+        self._signed_payload = None
+
+    async def get_signature(self) -> bytes:
+        """ Sign the data in the crypto pool (only the first time).
+        """
+        if self._signing is None:
+            # other observers wait for the same signature instead of signing again
+            self._signing = curio.Lock()
+        async with self._signing:
+            if self._signature is None:
+                self._signature = await sign_message_async(self.data)
+            else:
+                SignedData.signatures_saved += 1
+        return self._signature
+
+    async def get_signed_payload(self) -> bytes:
+        """ Payload of the frame with FLAG_SIGNED: signature + data (it's
+        concatenated only the first time as well).
+        """
+        if self._signed_payload is None:
+            self._signed_payload = await self.get_signature() + self.data
+        return self._signed_payload
+
+
+def sign_data(data: bytes) -> SignedData:
+    """ Prepare the serialized update for sending. The result is immutable,
+    so it could be sent to any amount of observers.
+    """
+    return SignedData(data)
+
+
+class NotPublisherError(Exception):
+    pass
+
+
+class Snapshots:
+    """ Serialized state of chat or channel (e.g. its members) that is sent
+    to everybody who opens it. Each snapshot is built once and kept until
+    its content type changes, so all of them get the same SignedData.
+    Every change of the state drops only the snapshots of the content types
+    it touches, the others are kept (e.g. new message doesn't change
+    the members).
+    """
+
+    __slots__ = ('_cache', 'hits', 'builds')
+
+    def __init__(self):
+        self._cache = {}         # content_type -> SignedData
+        self.hits = 0
+        self.builds = 0
+
+    def invalidate(self, *content_types):
+        """ Drop the snapshots of content_types (all of them if nothing
+        is given), so they are built again by the next get.
+        """
+        if not content_types:
+            self._cache.clear()
+        for content_type in content_types:
+            self._cache.pop(content_type, None)
+
+    def get(self, content_type, make_data) -> SignedData:
+        """ Get the snapshot or build it by make_data(content_type).
+        """
+        if content_type in self._cache:
+            self.hits += 1
+            return self._cache[content_type]
+        signed_data = self._cache[content_type] = sign_data(make_data(content_type))
+        self.builds += 1
+        return signed_data
+
+
 class UserObserver(metaclass=DebugMetaclass):
     """ Assistant-observer that checks user's chats and reports about
     any changing.
+
+    All the updates are put to the bounded outbound queue, that is drained
+    by the own writer task (see start), so slow client doesn't block
+    the others. If the queue is full, the overflow_policy is applied.
     """
 
-    def __init__(self, user: User, user_out_socket):
+    def __init__(self, user: User, user_out_socket, framed=False, use_mac=False,
+                 queue_size=OBSERVER_QUEUE_SIZE,
+                 overflow_policy=OBSERVER_OVERFLOW_POLICY):
+        """ Initialization.
+
+        :param user: user we observe for
+        :param user_out_socket: auxiliary socket of user
+        :param framed: True if the client uses framed protocol, so the
+                       user_out_socket is FramedSocket
+        :param use_mac: True if the user_out_socket authenticates frames
+                        with session key, so RSA signatures aren't needed
+        :param queue_size: max amount of updates waiting for sending
+        :param overflow_policy: DROP_OLDEST, DISCONNECT or RESYNC
+        """
+        assert overflow_policy in {DROP_OLDEST, DISCONNECT, RESYNC}, \
+            f"Bad overflow policy {overflow_policy}"
         self.user = user
         self._recipient = user_out_socket
+        self._framed = framed
+        self._use_mac = use_mac
         self._last_update = {}
 
+        # queue of tuple(source, SignedData, content_type), source is None for
+        # CHATS_LIST and CHATS_ACTIVITY
+        self._queue = deque()
+        self._queue_size = queue_size
+        self._overflow_policy = overflow_policy
+        self._resync_pending = set()     # sources that will be resent entirely
+        self._has_updates = curio.Event()
+        self._writer_task = None
+        self.disconnected = False
+
     def get_name(self):
         return self.user.name
 
+    async def start(self):
+        """ Launch the writer task.
+        """
+        if self._writer_task is None:
+            self._writer_task = await curio.spawn(self._writing, daemon=True)
+
+    async def stop(self):
+        """ Stop the writer task. All the updates that haven't been sent
+        yet are lost.
+        """
+        self._queue.clear()
+        if self._writer_task is not None:
+            await self._writer_task.cancel()
+            self._writer_task = None
+
+    async def _writing(self):
+        """ Mainloop of the writer task: sends updates from the queue one by one.
+        """
+        while True:
+            while not self._queue:
+                self._has_updates.clear()
+                await self._has_updates.wait()
+            source, data, content_type = self._queue.popleft()
+            try:
+                if content_type == RESYNC:
+                    self._resync_pending.discard(source)
+                    await self._resync(source)
+                else:
+                    chat_name = source.get_name() if source is not None else ''
+                    await self._transfer(chat_name, data, content_type)
+            except (OSError, curio.TaskTimeout) as e:
+                logger.error(f"[*] Can't send update to {self.user}: {e}")
+                await self._disconnect()
+                return
+
+    async def _put(self, source, data, content_type):
+        """ Put the update to the outbound queue, never blocks.
+        """
+        if self.disconnected:
+            return
+        if source in self._resync_pending:
+            # the whole chat will be sent anyway
+            return
+        if len(self._queue) >= self._queue_size:
+            logger.warning(f"[*] Outbound queue of {self.user} is full, "
+                           f"applying {self._overflow_policy}...")
+            if self._overflow_policy == DISCONNECT:
+                await self._disconnect()
+                return
+            elif self._overflow_policy == RESYNC:
+                self._coalesce()
+                if source in self._resync_pending:
+                    return
+            elif not self._drop_oldest_update():
+                # there are only snapshots in the queue, they are replaced by
+                # resyncs that are never older than them
+                self._coalesce()
+                if source in self._resync_pending:
+                    return
+                if len(self._queue) >= self._queue_size:
+                    await self._disconnect()
+                    return
+        self._queue.append((source, data, content_type))
+        await self._has_updates.set()
+
+    def _drop_oldest_update(self) -> bool:
+        """ Drop the oldest incremental update (see INCREMENTAL_TYPES) from
+        the queue, the snapshots and resyncs are never dropped.
+
+        :return: False if there is no such update in the queue
+        """
+        for i, (source, data, content_type) in enumerate(self._queue):
+            if content_type in INCREMENTAL_TYPES:
+                del self._queue[i]
+                return True
+        return False
+
+    def _coalesce(self):
+        """ Replace all the updates of chats in the queue with one resync
+        per chat. Only the newest list of chats is kept, the activity of
+        chats is kept entirely (every update has only the changed chats).
+        """
+        chats_list = None
+        activity = []
+        sources = []
+        for source, data, content_type in self._queue:
+            if content_type == CHATS_ACTIVITY:
+                activity.append((source, data, content_type))
+            elif source is None:
+                chats_list = (source, data, content_type)
+            elif source not in sources:
+                sources.append(source)
+        self._queue.clear()
+        if chats_list is not None:
+            self._queue.append(chats_list)
+        self._queue.extend(activity)
+        for source in sources:
+            self._resync_pending.add(source)
+            self._queue.append((source, None, RESYNC))
+
+    async def _resync(self, source):
+        """ Send all the snapshots of the source (e.g. members and messages
+        of chat) directly, bypassing the queue.
+        """
+        for content_type in source.SNAPSHOTS:
+            await self._transfer(source.get_name(), await source.get_snapshot(content_type),
+                                 content_type)
+
+    async def _disconnect(self):
+        """ Stop sending anything to the client and close its auxiliary
+        connection. ChatAssistant detaches such observers.
+        """
+        self.disconnected = True
+        self._queue.clear()
+        self._resync_pending.clear()
+        logger.info(f"[*] Disconnecting aux connection of {self.user}...")
+        try:
+            await self._recipient.close()
+        except OSError:
+            pass
+
+    def backlog(self) -> int:
+        """ Amount of updates waiting for sending.
+        """
+        return len(self._queue)
+
     async def connect(self, source):
         """ Connect to new source and get report about all the
-        messages and members.
+        messages and members (or the latest publications of channel).
+
+        The snapshots are shared by all the observers of source, so they're
+        serialized and signed only once until the source changes.
+
+        :param source: ChatAssistant or ChannelAssistant
+        """
+        for content_type in source.SNAPSHOTS:
+            await self.send_signed(source, await source.get_snapshot(content_type),
+                                   content_type=content_type)
+
+    async def send_history(self, source, messages: List[Message], cursor):
+        """ Sends the page of older messages that client requested.
 
         :param source: ChatAssistant or ChannelAssistant
+        :param messages: messages from the oldest to the newest
+        :param cursor: cursor of the next page (None if there are no older messages)
         """
-        await self.send_all_members(source)
-        await self.send_all_messages(source)
+        data = codec.dumps((messages, cursor))
+        await self.send(source, data, content_type=HISTORY_PAGE)
 
-    async def send_all_members(self, source):
-        """ Gets the set of all the members of the chat and sends it
-        to the client.
+    async def send_search_results(self, source, messages: List[Message], cursor):
+        """ Sends the page of messages that were found by client's request.
 
         :param source: ChatAssistant or ChannelAssistant
+        :param messages: messages from the most relevant
+        :param cursor: cursor of the next page (None if there are no more)
         """
-        members = await source.get_members()  # type: Set[User]
-        data = pickle.dumps(members)
-        await self.send(source, data, content_type=CHAT_MEMBERS)
+        data = codec.dumps((messages, cursor))
+        await self.send(source, data, content_type=SEARCH_RESULTS)
 
-    async def send_all_messages(self, source):
-        """ Gets the list of all the messages of the chat and sends it
-        to the client.
+    async def send_publications(self, source, seq, entries: List[tuple], last_seq: int):
+        """ Sends the publications of channel that client doesn't have.
 
-        :param source:  ChatAssistant or ChannelAssistant
+        :param source: ChannelAssistant
+        :param seq: sequence number of the last publication client has
+        :param entries: list of tuple(sequence number, Publication) from the oldest
+        :param last_seq: sequence number of the last publication of channel
         """
-        messages = await source.get_messages()   # type: List[Message]
-        data = pickle.dumps(messages)
-        await self.send(source, data, content_type=CHAT_MESSAGES)
+        data = codec.dumps((seq, [el[0] for el in entries], [el[1] for el in entries],
+                            last_seq))
+        await self.send(source, data, content_type=CHANNEL_PUBLICATIONS)
 
     async def update_users(self, source, user: User):
         """ Notifies the client about the new User.
@@ -70,7 +337,7 @@ class UserObserver(metaclass=DebugMetaclass):
         :param source: ChatAssistant
         :param user: new User
         """
-        data = pickle.dumps(user)
+        data = codec.dumps(user)
         await self.send(source, data, content_type=NEW_USER)
 
     async def update_messages(self, source, message: Message):
@@ -79,7 +346,7 @@ class UserObserver(metaclass=DebugMetaclass):
         :param source: ChatAssistant or ChannelAssistant
         :param message: new message
         """
-        data = pickle.dumps(message)
+        data = codec.dumps(message)
         await self.send(source, data, content_type=NEW_MESSAGE)
 
     async def update_permission(self, source, permission=MEMBER):
@@ -90,7 +357,7 @@ class UserObserver(metaclass=DebugMetaclass):
         :return:
         """
         assert permission in POSSIBLE_PERMISSIONS[CHAT]
-        data = pickle.dumps(permission)
+        data = codec.dumps(permission)
         await self.send(source, data, content_type=NEW_PERMISSION)
 
     async def send(self, source, data, content_type=NEW_MESSAGE):
@@ -100,16 +367,62 @@ class UserObserver(metaclass=DebugMetaclass):
         :param data: obvious
         :param content_type: the type transfer data (from TRANSFERS_TYPES)
         """
+        await self.send_signed(source, sign_data(data), content_type)
+
+    async def send_signed(self, source, signed_data: SignedData, content_type=NEW_MESSAGE):
+        """ Sends the data that has already been signed (e.g. the same
+        update for all the members of chat).
+
+        :param source: ChatAssistant or ChannelAssistant
+        :param signed_data: result of sign_data
+        :param content_type: the type transfer data (from TRANSFERS_TYPES)
+        """
+        assert content_type in TRANSFERS_TYPES
+        await self._put(source, signed_data, content_type)
+
+    async def send_chats(self, chats: list):
+        """ Sends the list of all the user's chats and channels.
+
+        :param chats: list of Chat and Channel
+        """
+        data = codec.dumps(chats)
+        await self._put(None, sign_data(data), CHATS_LIST)
+
+    async def send_activity(self, activity: List[ChatActivity]):
+        """ Sends the activity in the chats and channels of the user
+        (see ActivityHub).
+        """
+        data = codec.dumps(activity)
+        await self._put(None, sign_data(data), CHATS_ACTIVITY)
+
+    async def _transfer(self, chat_name, signed_data: SignedData, content_type):
+        data = signed_data.data
+        if self._use_mac:
+            logger.info(f'[-->] Sending {content_type} frame of {len(data)} bytes '
+                        f'to the aux socket of {self.user}...')
+            await self._recipient.send_frame(FRAME_TYPES[content_type], data,
+                                             chat_id=get_chat_id(chat_name))
+            return
+
+        if self._framed:
+            logger.info(f'[-->] Sending {content_type} frame of {len(data)} bytes '
+                        f'to the aux socket of {self.user}...')
+            await self._recipient.send_frame(FRAME_TYPES[content_type],
+                                             await signed_data.get_signed_payload(),
+                                             chat_id=get_chat_id(chat_name),
+                                             flags=FLAG_SIGNED)
+            return
+
+        signature = await signed_data.get_signature()
         await self._recipient.sendall(READY_FOR_TRANSFERRING)
         resp = await self._recipient.recv(ATOM_LENGTH)
         if resp != READY_FOR_TRANSFERRING:
             return
-        assert content_type in TRANSFERS_TYPES
         metadata = JSON_METADATA_OBSERVERS.copy()
         metadata[CONTENT_SIZE] = len(data)
         metadata[CONTENT_TYPE] = content_type
-        metadata[SIGNATURE_OF_SERVER] = sign_message(data).hex()
-        metadata[CHAT_NAME] = source.get_name()
+        metadata[SIGNATURE_OF_SERVER] = signature.hex()
+        metadata[CHAT_NAME] = chat_name
 
         logger.info(f'[-->] Sending {metadata} to the aux socket of {self.user}...')
         await self._recipient.sendall(bytes(json.dumps(metadata), encoding='utf-8'))
@@ -120,39 +433,40 @@ class UserObserver(metaclass=DebugMetaclass):
 
 
 class ChatAssistant(metaclass=DebugMetaclass):
-    """ Observed object singleton that realizes active session of chat.
+    """ Observed object that realizes active session of chat.
 
     It means that this object will be active only
     if there is at least one member of this chat that will be in
-    this chat at the moment.
+    this chat at the moment (or a short time after that, see ChatRegistry).
+    There is only one assistant for each chat - all of them are in CHAT_ASSISTANTS.
     """
 
-    __instances = {}
-
-    # FIXME I DON'T KNOW WHETHER IT WORKS
-    def __new__(cls, db_client: StorageClientInterface, chat: Chat, just_created=False):
-        if chat.name not in ChatAssistant.__instances:
-            ChatAssistant.__instances[chat.name] = \
-                super(ChatAssistant, cls).__new__(cls)
-        return ChatAssistant.__instances[chat.name]
-
-    @classmethod
-    def get_already_working(cls, chat_name: str):
-        return ChatAssistant.__instances.get(chat_name, None)
+    # what is sent to everybody who opens the chat (see get_snapshot)
+    SNAPSHOTS = (CHAT_MEMBERS, CHAT_MESSAGES)
 
-    def __init__(self, db_client: StorageClientInterface, chat: Chat, just_created=False):
+    def __init__(self, db_client: StorageClientInterface, chat: Chat, just_created=False,
+                 members=()):
         """ Initialization, but not launching of chatAssistant
 
         :param db_client: started or not client of database.
         :param chat: chat we make assistant for
+        :param just_created: the chat has just been created, so it's
+                             not read from database
+        :param members: names of the members of the created chat
         """
         self._observers = {}           # type: Dict[str: UserObserver]
+        self._holders = 0              # UserAssistants that have opened the chat
+        self._ended = False
         self._db_client = db_client
         self._chat = chat
-        self._messages = []            # type: List[Message]
-        self._members = set()          # type: Set[User]
+        # the latest messages, the older ones are read from database on demand
+        self._messages = HistoryWindow(db_client.history_cursor)
+        self._members = set(members)   # type: Set[str]
         self._just_created = just_created
 
+        # serialized members and latest messages (see get_snapshot)
+        self._snapshots = Snapshots()
+
     def get_name(self):
         return self._chat.name
 
@@ -165,30 +479,63 @@ class ChatAssistant(metaclass=DebugMetaclass):
         """
         await self._db_client.start()
         if not self._just_created:
-            self._messages = await self._db_client.get_messages(self._chat)
+            entries, cursor = await self._db_client.get_history(
+                self._chat, self._messages.max_messages, with_ids=True)
+            self._messages.reset(entries, cursor)
             self._members = await self._db_client.get_members(self._chat)
-        else:
-            self._members = {self._chat.creator.name}
 
     async def end(self):
-        """ End session. Calls if there are no active members.
+        """ End session. Calls by CHAT_ASSISTANTS when there have been no active
+        members for a while. The next calls do nothing.
         """
+        if self._ended:
+            return
+        self._ended = True
+        CHAT_ASSISTANTS.remove(self)
         del self._messages
         await self._db_client.end()
-        del self.__instances[self._chat.name]
 
     async def add_user(self, userObserver: UserObserver, permission=MEMBER):
         """ Add user to the chat in database and create new UserAssistant for
         notifying. Also notifies all the active members about this.
 
+        He holds the chat the same as after attach_user_observer.
+
         :param userObserver: TODO
         :param permission: what permission this user will has
         """
+        self._holders += 1
         await self._db_client.add_user(self._chat, userObserver.user,
                                        permission, destination=CHAT)
-        await self.attach_user_observer(userObserver)
+        self._members.add(userObserver.user.name)
+        self._snapshots.invalidate(CHAT_MEMBERS)
+        await self._connect(userObserver)
         await self.notify_new_member(userObserver.user)
 
+    async def add_users(self, users: List[User], permission=MEMBER) -> List[User]:
+        """ Add many users to the chat in database (in one transaction) and
+        notify all the active members about the new ones.
+
+        :return: list of the users that are members of the chat now.
+        """
+        added = await self._db_client.add_users(self._chat, users,
+                                                permission, destination=CHAT)
+        new_members = [user for user in added if user.name not in self._members]
+        self._members.update(user.name for user in new_members)
+        for user in new_members:
+            ACTIVITY_HUB.join(user.name, CHAT, self.get_name())
+        if new_members:
+            self._snapshots.invalidate(CHAT_MEMBERS)
+        if len(new_members) == 1:
+            await self.notify_new_member(new_members[0])
+        elif new_members:
+            # one update with all the members instead of one per new member,
+            # it's the same snapshot that the members get on opening
+            signed_data = await self.get_snapshot(CHAT_MEMBERS)
+            for el in self._get_observers():
+                await el.send_signed(self, signed_data, CHAT_MEMBERS)
+        return added
+
     async def change_user_permission(self, user: User, new_permission=MEMBER):
         await self._db_client.change_user_permission(self._chat, user,
                                                      permission=new_permission)
@@ -197,41 +544,142 @@ class ChatAssistant(metaclass=DebugMetaclass):
 
     async def new_message(self, message: Message):
         """ Write new message and notify all of active users about it.
+        Does nothing if the session is ended.
         """
-        await self._db_client.add_message(self._chat, message)
-        self._messages.append(message)
+        if self._ended:
+            return
+        # only the committed message is sent, with the time from database
+        message_id, message = await self._db_client.add_message(self._chat, message)
+        self._messages.append(message_id, message)
+        self._snapshots.invalidate(CHAT_MESSAGES)
         await self.notify_new_message(message)
+        await ACTIVITY_HUB.post(CHAT, self.get_name(), message_id, message.author)
 
     async def attach_user_observer(self, userObserver: UserObserver):
         """ Add userObserver to the set of observers and notify him about it.
+
+        He holds the chat (it stays in memory) until detach_user_assistant,
+        that must be called even if this one has failed.
         """
+        self._holders += 1
+        await self._connect(userObserver)
+
+    async def _connect(self, userObserver: UserObserver):
         self._observers[userObserver.get_name()] = userObserver
+        ACTIVITY_HUB.focus(userObserver.get_name(), CHAT, self.get_name(),
+                           self._messages.last_id())
         await userObserver.connect(self)
 
     async def detach_user_assistant(self, user: User):
-        """ Remove userAssistant from the set of observers.
+        """ Remove userAssistant from the set of observers. All the messages
+        that were in the chat are read by him. Does nothing if the session
+        is ended.
         """
+        if self._ended:
+            return
         if user.name in self._observers:
             del self._observers[user.name]
-        if len(self._observers) == 0:
-            await self.end()
+        self._holders -= 1
+        ACTIVITY_HUB.unfocus(user.name, CHAT, self.get_name())
+        await self._db_client.set_last_read(self._chat, user, self._messages.last_id(),
+                                            destination=CHAT)
+        if self._holders == 0:
+            # it stays in memory for a while, in case somebody comes back
+            await CHAT_ASSISTANTS.release(self)
+
+    def is_active(self) -> bool:
+        """ Check if the chat is opened by at least one UserAssistant (even
+        if his observer is disconnected, only detach_user_assistant
+        releases the chat).
+        """
+        return self._holders > 0
+
+    def _get_observers(self) -> List[UserObserver]:
+        """ Get all the active observers, the disconnected ones are detached.
+        """
+        for el in [el for el in self._observers.values() if el.disconnected]:
+            del self._observers[el.get_name()]
+        return list(self._observers.values())
+
+    async def _broadcast(self, data: bytes, content_type):
+        """ Put the same update to the queues of all the observers, so it's
+        signed at most once (see SignedData).
+        """
+        observers = self._get_observers()
+        if not observers:
+            return
+        signed_data = sign_data(data)
+        for el in observers:
+            await el.send_signed(self, signed_data, content_type)
 
     async def notify_new_message(self, message: Message):
         """ Inform all of the users that the new message was added.
+        Doesn't wait for sending, just puts update to the observers' queues.
         """
-        for el in self._observers.values():
-            await el.update_messages(self, message)
+        await self._broadcast(codec.dumps(message), NEW_MESSAGE)
 
     async def notify_new_member(self, member: User):
         """ Inform all of the users that the new member was added.
         """
-        for el in self._observers.values():
-            await el.update_users(self, member)
+        await self._broadcast(codec.dumps(member), NEW_USER)
 
     async def get_messages(self) -> List[Message]:
-        """ Get all the history of the chat.
+        """ Get the latest messages of the chat (from the oldest to the newest).
+        """
+        return self._messages.latest(HISTORY_PAGE_SIZE)[0]
+
+    def get_history_cursor(self):
+        """ Get the cursor of the messages that are older than get_messages.
+        """
+        return self._messages.latest(HISTORY_PAGE_SIZE)[1]
+
+    async def get_snapshot(self, content_type) -> SignedData:
+        """ Get the serialized members (CHAT_MEMBERS) or the latest messages
+        with cursor (CHAT_MESSAGES) of the chat, ready for sending.
+
+        The snapshot is built only once for the current version of chat,
+        so all the members that open the chat get the same SignedData,
+        that is signed at most once as well.
+        """
+        return self._snapshots.get(content_type, self._make_snapshot)
+
+    def _make_snapshot(self, content_type) -> bytes:
+        if content_type == CHAT_MEMBERS:
+            return codec.dumps(self._members)
+        elif content_type == CHAT_MESSAGES:
+            return codec.dumps(self._messages.latest(HISTORY_PAGE_SIZE))
+        raise ValueError(f"There is no snapshot of {content_type}")
+
+    def stats(self) -> dict:
+        """ Memory taken by the latest messages, amount of observers and
+        how often the snapshots are reused.
+        """
+        res = self._messages.stats()
+        res['observers'] = len(self._observers)
+        res['snapshot_hits'] = self._snapshots.hits
+        res['snapshot_builds'] = self._snapshots.builds
+        return res
+
+    async def get_history(self, cursor, limit=HISTORY_PAGE_SIZE):
+        """ Get the page of older messages from database.
+
+        :return: tuple(messages, cursor of the next page)
+        :raise BadStorageParamException: if the cursor is wrong.
         """
-        return self._messages
+        return await self._db_client.get_history(self._chat, limit, cursor)
+
+    async def search(self, pattern: str, author_name='', cursor=None,
+                     limit=SEARCH_PAGE_SIZE, use_regex=False):
+        """ Find the messages of chat by words or regex (see find_messages
+        of storage).
+
+        :return: tuple(messages, cursor of the next page)
+        :raise BadStorageParamException: if the cursor or regex is wrong or
+                                         the search took too long.
+        """
+        return await self._db_client.find_messages(self._chat, pattern, author_name,
+                                                   use_regex=use_regex, limit=limit,
+                                                   cursor=cursor)
 
     async def get_members(self) -> Set[ChatUser]:
         """ Get the set of all the members of the chat.
@@ -246,45 +694,666 @@ class ChatAssistant(metaclass=DebugMetaclass):
         pass
 
 
-# TODO
-#  There is a possible bug with chat creating.
-#  The changes in database don't commit in time of creation, it could get some time.
-#  So, if some user getting online in that time, when the chat is creating
-#  he doesn't get information about adding himself to this chat.
 async def create_chat(chat_name: str, creator: User,
-                      members: List[User], creator_socket) -> ChatAssistant:
+                      members: List[User], creator_observer: UserObserver) -> ChatAssistant:
     """ Factory that creates new chat and returns its assistant.
 
     :param chat_name:
     :param creator:
     :param members:
-    :param creator_socket:
+    :param creator_observer: UserObserver of the creator
     :return:
     """
     new_db_client = StorageClientImplementation(SERVER_DATABASE)
     members.append(creator)
     await new_db_client.start()
-    await new_db_client.create_chat(creator, chat_name, members)
+    _, added = await new_db_client.create_chat(creator, chat_name, members)
+    for member in added:
+        ACTIVITY_HUB.join(member.name, CHAT, chat_name)
 
     chat = Chat(chat_name, creator, datetime.datetime.now())
-    new_chat_assistant = ChatAssistant(new_db_client, chat, just_created=True)
+    new_chat_assistant = ChatAssistant(new_db_client, chat, just_created=True,
+                                       members=[member.name for member in added])
     await new_chat_assistant.start()
-    await new_chat_assistant.attach_user_observer(UserObserver(creator, creator_socket))
+    await CHAT_ASSISTANTS.add(new_chat_assistant)
+    await new_chat_assistant.attach_user_observer(creator_observer)
     return new_chat_assistant
 
 
-async def get_chat_assistant(chat_name: str) -> ChatAssistant:
-    chat_assistant = ChatAssistant.get_already_working(chat_name)
-    if chat_assistant is None:
-        new_db_client = StorageClientImplementation(SERVER_DATABASE)
-        await new_db_client.start()
-        chat = await new_db_client.get_chat_info(chat_name)
-        if not chat:
-            raise BadStorageParamException(f"There is no chat with name {chat_name}")
-        chat_assistant = ChatAssistant(new_db_client, chat)
-        await chat_assistant.start()
+async def _load_chat_assistant(chat_name: str) -> ChatAssistant:
+    new_db_client = StorageClientImplementation(SERVER_DATABASE)
+    await new_db_client.start()
+    chat = await new_db_client.get_chat_info(chat_name)
+    if not chat:
+        await new_db_client.end()
+        raise BadStorageParamException(f"There is no chat with name {chat_name}")
+    chat_assistant = ChatAssistant(new_db_client, chat)
+    await chat_assistant.start()
     return chat_assistant
 
 
-class ChannelAssistant:
-    pass
+async def get_chat_assistant(chat_name: str) -> ChatAssistant:
+    """ Get the assistant of chat from CHAT_ASSISTANTS or load it from database.
+
+    :raise BadStorageParamException: if there is no such chat.
+    """
+    return await CHAT_ASSISTANTS.get_or_load(chat_name, _load_chat_assistant)
+
+
+class ChatRegistry:
+    """ All the ChatAssistants (or ChannelAssistants) in memory: the active
+    ones (opened by UserAssistants) and the warm ones, whose users have left
+    less than idle_timeout seconds ago. Warm chats are reopened without any work
+    with database.
+
+    If there are more than max_chats of them or they take more than
+    max_bytes, the least recently used warm chats are ended. The active
+    ones are never ended, so they could exceed the limits.
+    """
+
+    def __init__(self, idle_timeout=CHATS_IDLE_TIMEOUT, max_chats=CHATS_MAX_AMOUNT,
+                 max_bytes=CHATS_MAX_BYTES, kind='chat'):
+        """ Initialization.
+
+        :param idle_timeout: how long the chat without observers stays in
+                             memory (seconds, 0 - end it at once)
+        :param max_chats: max amount of chats in memory
+        :param max_bytes: max memory taken by the messages of all the chats
+        :param kind: 'chat' or 'channel' (for the log)
+        """
+        self._kind = kind
+        self._idle_timeout = idle_timeout
+        self._max_chats = max(1, max_chats)
+        self._max_bytes = max_bytes
+        self._chats = OrderedDict()     # name -> ChatAssistant, from the least recently used
+        self._last_used = {}            # name -> time.monotonic() of the last use
+        self._loading = {}              # name -> curio.Event, chats that are being loaded
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._chats)
+
+    def get(self, chat_name: str):
+        """ Get the assistant of chat if it's in memory.
+
+        :return: ChatAssistant or None
+        """
+        assistant = self._chats.get(chat_name)
+        if assistant is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._touch(chat_name)
+        return assistant
+
+    async def get_or_load(self, chat_name: str, load) -> ChatAssistant:
+        """ Get the assistant of chat or create it by load(chat_name). It's
+        loaded only once, even if many users open the chat at the same time.
+        """
+        while chat_name in self._loading:
+            await self._loading[chat_name].wait()
+        assistant = self.get(chat_name)
+        if assistant is None:
+            loaded = self._loading[chat_name] = curio.Event()
+            try:
+                assistant = await load(chat_name)
+                await self.add(assistant)
+            finally:
+                del self._loading[chat_name]
+                await loaded.set()
+        return assistant
+
+    async def add(self, assistant: ChatAssistant):
+        self._chats[assistant.get_name()] = assistant
+        self._touch(assistant.get_name())
+        # nobody has opened it yet, but it's going to be opened
+        await self._shrink(keep=assistant)
+
+    def remove(self, assistant: ChatAssistant):
+        """ Forget the assistant (it's called by ChatAssistant.end).
+        """
+        name = assistant.get_name()
+        if self._chats.get(name) is assistant:
+            del self._chats[name]
+            del self._last_used[name]
+
+    async def release(self, assistant: ChatAssistant):
+        """ The last observer has left the chat: it becomes warm.
+        """
+        if self._idle_timeout <= 0:
+            await assistant.end()
+            return
+        self._touch(assistant.get_name())
+        await self._shrink()
+
+    def _touch(self, chat_name: str):
+        self._chats.move_to_end(chat_name)
+        self._last_used[chat_name] = time.monotonic()
+
+    async def _shrink(self, keep=None):
+        """ End the least recently used warm chats while there are too many
+        of them or they take too much memory.
+
+        :param keep: assistant that isn't ended anyway
+        """
+        total = sum(assistant.stats()['bytes'] for assistant in self._chats.values())
+        for assistant in list(self._chats.values()):
+            if len(self._chats) <= self._max_chats and total <= self._max_bytes:
+                break
+            if assistant.is_active() or assistant is keep:
+                continue
+            total -= assistant.stats()['bytes']
+            self.evictions += 1
+            logger.info(f"[*] The {self._kind} {assistant.get_name()} is evicted from memory.")
+            await assistant.end()
+
+    async def expire(self):
+        """ End the warm chats that haven't been used for idle_timeout.
+        """
+        deadline = time.monotonic() - self._idle_timeout
+        for name, assistant in list(self._chats.items()):
+            if self._last_used.get(name, deadline) > deadline:
+                break       # the next ones are used even later
+            if not assistant.is_active():
+                self.expirations += 1
+                logger.info(f"[*] The {self._kind} {name} expired.")
+                await assistant.end()
+
+    async def expiring(self):
+        """ Mainloop of expiring (runs in background).
+        """
+        if self._idle_timeout <= 0:
+            return
+        while True:
+            await curio.sleep(max(1., self._idle_timeout / 4))
+            await self.expire()
+
+    def stats(self) -> dict:
+        """ Amount of chats, memory taken by their messages and the metrics
+        of cache.
+        """
+        res = {'chats': len(self._chats), 'active': 0, 'messages': 0, 'bytes': 0,
+               'dropped': 0, 'observers': 0, 'snapshot_hits': 0, 'snapshot_builds': 0}
+        for assistant in self._chats.values():
+            res['active'] += assistant.is_active()
+            for key, value in assistant.stats().items():
+                res[key] = res.get(key, 0) + value
+        total = (self.hits + self.misses) or 1
+        res.update(hits=self.hits, misses=self.misses, hit_rate=self.hits / total,
+                   evictions=self.evictions, expirations=self.expirations)
+        return res
+
+    async def reporting(self, period: float):
+        """ Write the stats (and the biggest chat) to the log every period
+        seconds (if something has changed).
+        """
+        last = None
+        while True:
+            await curio.sleep(period)
+            stats = self.stats()
+            if stats != last:
+                logger.info(f"[*] The {self._kind}s in memory: {stats}")
+                biggest = max(self._chats.values(), default=None,
+                              key=lambda assistant: assistant.stats()['bytes'])
+                if biggest is not None:
+                    logger.info(f"[*] The biggest {self._kind} {biggest.get_name()}: "
+                                f"{biggest.stats()}")
+                last = stats
+
+
+CHAT_ASSISTANTS = ChatRegistry()
+
+
+class ChannelAssistant(metaclass=DebugMetaclass):
+    """ Observed object that realizes active session of channel.
+
+    Channel could have a huge amount of subscribers and only a few
+    publishers (creator and moderators). Every publication is encoded and
+    signed once and then the background task puts it to the queues of all
+    the connected subscribers, CHANNEL_FANOUT_BATCH queues at once, so the
+    publisher doesn't wait for them.
+
+    Nobody waits for the slow subscribers either: the one with
+    CHANNEL_MAX_LAG updates in the queue gets CHANNEL_BEHIND instead of
+    publications and catches up by the sequence numbers (see catch_up),
+    the same as the ones that were offline. The latest publications are
+    kept in memory, so it usually doesn't touch database.
+
+    There is only one assistant for each channel - all of them are in
+    CHANNEL_ASSISTANTS.
+    """
+
+    # what is sent to everybody who opens the channel (see get_snapshot)
+    SNAPSHOTS = (CHANNEL_PUBLICATIONS,)
+
+    def __init__(self, db_client: StorageClientInterface, channel: Channel):
+        """ Initialization, but not launching of ChannelAssistant.
+
+        :param db_client: started or not client of database.
+        :param channel: channel we make assistant for
+        """
+        self._observers = {}           # type: Dict[str: UserObserver]
+        self._holders = 0              # UserAssistants that have opened the channel
+        self._ended = False
+        self._publishers = set()       # names of the observers that could publish
+        self._lagging = set()          # names of the observers that should catch up
+        self._db_client = db_client
+        self._channel = channel
+        # the latest publications (id is the sequence number)
+        self._publications = HistoryWindow(db_client.history_cursor)
+        self._snapshots = Snapshots()
+
+        # publications are committed one by one, so the previous sequence
+        # number of each of them is known
+        self._publishing = curio.Lock()
+        self._pending = deque()        # SignedData of publications waiting for fan-out
+        self._has_pending = curio.Event()
+        self._fan_out_task = None
+
+        # metrics
+        self._delivered = 0            # publications put to the queues of subscribers
+        self._skipped = 0              # publications that lagging subscribers didn't get
+        self._catch_ups = 0
+        self._catch_ups_from_db = 0
+
+    def get_name(self):
+        return self._channel.name
+
+    def get_db_client(self):
+        return self._db_client
+
+    async def start(self):
+        """ Launch the assistant: read the latest publications and start
+        the task of fan-out.
+        """
+        await self._db_client.start()
+        entries, cursor = await self._db_client.get_publications_history(
+            self._channel, self._publications.max_messages)
+        self._publications.reset(entries, cursor)
+        self._fan_out_task = await curio.spawn(self._fanning_out, daemon=True)
+
+    async def end(self):
+        """ End session. Calls by CHANNEL_ASSISTANTS when there have been no
+        subscribers for a while. The next calls do nothing.
+        """
+        if self._ended:
+            return
+        self._ended = True
+        CHANNEL_ASSISTANTS.remove(self)
+        if self._fan_out_task is not None:
+            await self._fan_out_task.cancel()
+            self._fan_out_task = None
+        await self._db_client.end()
+
+    async def attach_user_observer(self, userObserver: UserObserver, seq=None):
+        """ Add userObserver to the subscribers (the user becomes a member
+        of channel if he wasn't) and send him the latest publications or
+        the ones newer than seq.
+
+        He holds the channel (it stays in memory) until detach_user_assistant,
+        that must be called even if this one has failed.
+
+        :param seq: sequence number of the last publication that client has
+        """
+        name = userObserver.get_name()
+        self._holders += 1
+        permission = await self._db_client.get_permission(self._channel, userObserver.user,
+                                                          destination=CHANNEL)
+        if permission is None:
+            await self._db_client.add_user(self._channel, userObserver.user,
+                                           MEMBER, destination=CHANNEL)
+        if permission in {CREATOR, MODERATOR}:
+            self._publishers.add(name)
+        else:
+            self._publishers.discard(name)
+        self._observers[name] = userObserver
+        self._lagging.discard(name)
+        ACTIVITY_HUB.focus(name, CHANNEL, self.get_name(), self._publications.last_id())
+        if seq is None:
+            await userObserver.connect(self)
+        else:
+            await self.catch_up(userObserver, seq)
+
+    async def detach_user_assistant(self, user: User):
+        """ Remove userAssistant from the set of subscribers. All the
+        publications that were in the channel are read by him. Does nothing
+        if the session is ended.
+        """
+        if self._ended:
+            return
+        self._observers.pop(user.name, None)
+        self._holders -= 1
+        self._publishers.discard(user.name)
+        self._lagging.discard(user.name)
+        ACTIVITY_HUB.unfocus(user.name, CHANNEL, self.get_name())
+        await self._db_client.set_last_read(self._channel, user, self._publications.last_id(),
+                                            destination=CHANNEL)
+        if self._holders == 0:
+            await CHANNEL_ASSISTANTS.release(self)
+
+    def is_active(self) -> bool:
+        """ Check if the channel is opened by at least one UserAssistant (even
+        if his observer is disconnected, only detach_user_assistant
+        releases the channel).
+        """
+        return self._holders > 0
+
+    def _get_observers(self) -> List[UserObserver]:
+        """ Get all the active observers, the disconnected ones are detached.
+        """
+        for el in [el for el in self._observers.values() if el.disconnected]:
+            del self._observers[el.get_name()]
+        return list(self._observers.values())
+
+    async def new_message(self, message: Message):
+        """ Publish the message of creator or moderator.
+
+        Does nothing if the session is ended.
+
+        :raise NotPublisherError: if the author can't publish in this channel.
+        """
+        if self._ended:
+            return
+        if message.author not in self._publishers:
+            raise NotPublisherError(f"{message.author} can't publish in {self.get_name()}.")
+        await self.publish(Publication(message.created, message.content_type,
+                                       message.content))
+
+    async def publish(self, publication: Publication) -> int:
+        """ Save the publication and put it to the queue of fan-out. Returns
+        as soon as it's committed, without waiting for subscribers.
+
+        :return: sequence number of the publication
+        """
+        async with self._publishing:
+            prev_seq = self._publications.last_id()
+            seq, publication = await self._db_client.add_publication(self._channel, publication)
+            self._publications.append(seq, publication)
+            self._snapshots.invalidate(CHANNEL_PUBLICATIONS, CHANNEL_BEHIND)
+            self._pending.append(sign_data(codec.dumps((prev_seq, seq, publication))))
+        await self._has_pending.set()
+        await ACTIVITY_HUB.post(CHANNEL, self.get_name(), seq)
+        return seq
+
+    async def _fanning_out(self):
+        """ Mainloop of the fan-out task: delivers publications one by one.
+        """
+        while True:
+            while not self._pending:
+                self._has_pending.clear()
+                await self._has_pending.wait()
+            await self._fan_out(self._pending.popleft())
+
+    async def _fan_out(self, signed_data: SignedData):
+        """ Put the publication to the queues of all the subscribers that
+        aren't lagging, CHANNEL_FANOUT_BATCH at once.
+        """
+        observers = self._get_observers()
+        for start in range(0, len(observers), CHANNEL_FANOUT_BATCH):
+            for el in observers[start:start + CHANNEL_FANOUT_BATCH]:
+                name = el.get_name()
+                if name in self._lagging:
+                    self._skipped += 1
+                    continue
+                if el.backlog() >= CHANNEL_MAX_LAG:
+                    # he'll catch up when he is able to
+                    self._lagging.add(name)
+                    self._skipped += 1
+                    await el.send_signed(self, await self.get_snapshot(CHANNEL_BEHIND),
+                                         CHANNEL_BEHIND)
+                    continue
+                await el.send_signed(self, signed_data, NEW_PUBLICATION)
+                self._delivered += 1
+            # let the others work between the batches
+            await curio.sleep(0)
+
+    async def catch_up(self, userObserver: UserObserver, seq: int,
+                       limit=HISTORY_PAGE_SIZE):
+        """ Send to the subscriber the publications newer than seq, from
+        memory if they are there. The subscriber that has got the last
+        publication of channel gets the new ones again.
+        """
+        self._catch_ups += 1
+        entries = self._publications.after(seq, limit)
+        if entries is None:
+            self._catch_ups_from_db += 1
+            entries = await self._db_client.get_publications_after(self._channel, seq, limit)
+        last_seq = self._publications.last_id()
+        if not entries or entries[-1][0] >= last_seq:
+            self._lagging.discard(userObserver.get_name())
+        await userObserver.send_publications(self, seq, entries, last_seq)
+
+    async def get_snapshot(self, content_type) -> SignedData:
+        """ Get the latest publications (CHANNEL_PUBLICATIONS) or the last
+        sequence number (CHANNEL_BEHIND) of channel, ready for sending.
+        Each of them is built once after every publication.
+        """
+        return self._snapshots.get(content_type, self._make_snapshot)
+
+    def _make_snapshot(self, content_type) -> bytes:
+        if content_type == CHANNEL_PUBLICATIONS:
+            entries = self._publications.latest_entries(HISTORY_PAGE_SIZE)
+            return codec.dumps((None, [el[0] for el in entries], [el[1] for el in entries],
+                                self._publications.last_id()))
+        elif content_type == CHANNEL_BEHIND:
+            return codec.dumps(self._publications.last_id())
+        raise ValueError(f"There is no snapshot of {content_type}")
+
+    def stats(self) -> dict:
+        """ Memory taken by the latest publications, amount of subscribers
+        and how the publications are delivered.
+        """
+        res = self._publications.stats()
+        res.update(observers=len(self._observers), lagging=len(self._lagging),
+                   snapshot_hits=self._snapshots.hits,
+                   snapshot_builds=self._snapshots.builds,
+                   delivered=self._delivered, skipped=self._skipped,
+                   catch_ups=self._catch_ups, catch_ups_from_db=self._catch_ups_from_db)
+        return res
+
+
+async def create_channel(channel_name: str, creator: User,
+                         creator_observer: UserObserver) -> ChannelAssistant:
+    """ Factory that creates new channel and returns its assistant.
+
+    :raise BadStorageParamException: if there is such channel already.
+    """
+    new_db_client = StorageClientImplementation(SERVER_DATABASE)
+    await new_db_client.start()
+    try:
+        await new_db_client.create_channel(creator, channel_name)
+    except BadStorageParamException:
+        await new_db_client.end()
+        raise
+
+    channel = Channel(channel_name, datetime.datetime.now(), creator.name)
+    channel_assistant = ChannelAssistant(new_db_client, channel)
+    await channel_assistant.start()
+    await CHANNEL_ASSISTANTS.add(channel_assistant)
+    await channel_assistant.attach_user_observer(creator_observer)
+    return channel_assistant
+
+
+async def _load_channel_assistant(channel_name: str) -> ChannelAssistant:
+    new_db_client = StorageClientImplementation(SERVER_DATABASE)
+    await new_db_client.start()
+    channel = await new_db_client.get_channel_info(channel_name)
+    if not channel:
+        await new_db_client.end()
+        raise BadStorageParamException(f"There is no channel with name {channel_name}")
+    channel_assistant = ChannelAssistant(new_db_client, channel)
+    await channel_assistant.start()
+    return channel_assistant
+
+
+async def get_channel_assistant(channel_name: str) -> ChannelAssistant:
+    """ Get the assistant of channel from CHANNEL_ASSISTANTS or load it
+    from database.
+
+    :raise BadStorageParamException: if there is no such channel.
+    """
+    return await CHANNEL_ASSISTANTS.get_or_load(channel_name, _load_channel_assistant)
+
+
+CHANNEL_ASSISTANTS = ChatRegistry(kind='channel')
+
+
+class ActivityHub:
+    """ Activity in all the chats and channels of the connected users.
+
+    Full updates are sent only for the chat that user has opened, about the
+    other ones he gets ChatActivity: the last message and the amount of
+    unread ones. The changes are collected and sent at most once per period
+    (see sending), so the busy chat costs one small update per member per
+    period, no matter how many messages are there.
+
+    Only the members that are connected right now are kept in memory, the
+    others get everything from database when they log in (see connect).
+    One user has one observer here - the one of his latest connection.
+    """
+
+    def __init__(self, period=ACTIVITY_PERIOD, max_unread=ACTIVITY_MAX_UNREAD):
+        """ Initialization.
+
+        :param period: how often the changes are sent (seconds)
+        :param max_unread: max amount of unread messages that are counted
+        """
+        self._period = period
+        self._max_unread = max_unread
+        self._observers = {}           # user name -> UserObserver
+        self._activity = {}            # user name -> {(kind, chat name): [last seq, unread]}
+        self._members = {}             # (kind, chat name) -> names of the connected members
+        self._focus = {}               # user name -> (kind, chat name) he has opened
+        self._changed = {}             # user name -> (kind, chat name) changed since sending
+        self._has_changes = curio.Event()
+
+        # metrics
+        self.posts = 0                 # messages and publications
+        self.updates = 0               # CHATS_ACTIVITY sent to users
+
+    def __len__(self):
+        return len(self._observers)
+
+    async def connect(self, userObserver: UserObserver, db_client: StorageClientInterface):
+        """ Start tracking the chats and channels of user and send him the
+        activity in all of them.
+        """
+        name = userObserver.get_name()
+        activity = await db_client.get_activity(userObserver.user, self._max_unread)
+        self.disconnect(self._observers.get(name))
+        self._observers[name] = userObserver
+        self._activity[name] = {}
+        for el in activity:
+            self._activity[name][el.kind, el.name] = [el.last_seq, el.unread]
+            self._members.setdefault((el.kind, el.name), set()).add(name)
+        await userObserver.send_activity(activity)
+
+    def disconnect(self, userObserver: UserObserver):
+        """ Forget the user (if it's his latest connection).
+        """
+        if userObserver is None or self._observers.get(userObserver.get_name()) \
+                is not userObserver:
+            return
+        name = userObserver.get_name()
+        del self._observers[name]
+        for key in self._activity.pop(name):
+            members = self._members[key]
+            members.discard(name)
+            if not members:
+                del self._members[key]
+        self._focus.pop(name, None)
+        self._changed.pop(name, None)
+
+    def join(self, user_name: str, kind, chat_name: str, last_seq=0):
+        """ The user has become a member of the chat or channel.
+        """
+        activity = self._activity.get(user_name)
+        if activity is None or (kind, chat_name) in activity:
+            return
+        activity[kind, chat_name] = [last_seq, 0]
+        self._members.setdefault((kind, chat_name), set()).add(user_name)
+
+    def focus(self, user_name: str, kind, chat_name: str, last_seq: int):
+        """ The user has opened the chat: everything is read, the new
+        messages he gets entirely.
+        """
+        if user_name not in self._observers:
+            return
+        self.join(user_name, kind, chat_name)
+        self._activity[user_name][kind, chat_name] = [last_seq, 0]
+        self._focus[user_name] = (kind, chat_name)
+
+    def unfocus(self, user_name: str, kind, chat_name: str):
+        """ The user has left the chat.
+        """
+        if self._focus.get(user_name) == (kind, chat_name):
+            del self._focus[user_name]
+
+    async def post(self, kind, chat_name: str, seq: int, author=''):
+        """ New message in the chat or publication in the channel.
+
+        :param seq: id of the message (sequence number of the publication)
+        :param author: name of the author, it isn't unread for him
+        """
+        self.posts += 1
+        key = (kind, chat_name)
+        changed = False
+        for name in self._members.get(key, ()):
+            counters = self._activity[name][key]
+            counters[0] = max(counters[0], seq)
+            if self._focus.get(name) == key or name == author:
+                continue
+            counters[1] = min(counters[1] + 1, self._max_unread)
+            self._changed.setdefault(name, set()).add(key)
+            changed = True
+        if changed:
+            await self._has_changes.set()
+
+    async def send_changes(self):
+        """ Send to every user the activity in his changed chats.
+        """
+        changed, self._changed = self._changed, {}
+        for name, keys in changed.items():
+            activity = self._activity[name]
+            await self._observers[name].send_activity(
+                [ChatActivity(chat_name, kind, *activity[kind, chat_name])
+                 for kind, chat_name in keys])
+            self.updates += 1
+
+    async def sending(self):
+        """ Mainloop of sending the changes (runs in background).
+        """
+        while True:
+            while not self._changed:
+                self._has_changes.clear()
+                await self._has_changes.wait()
+            await self.send_changes()
+            await curio.sleep(self._period)
+
+    def stats(self) -> dict:
+        return {
+            'users': len(self._observers),
+            'chats': len(self._members),
+            'posts': self.posts,
+            'updates': self.updates,
+        }
+
+    async def reporting(self, period: float):
+        """ Write the stats to the log every period seconds (if something
+        has changed).
+        """
+        last = None
+        while True:
+            await curio.sleep(period)
+            stats = self.stats()
+            if stats != last:
+                logger.info(f"[*] Activity of chats: {stats}")
+                last = stats
+
+
+ACTIVITY_HUB = ActivityHub()
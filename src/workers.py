@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+Pool of processes for the CPU-bound operations (bcrypt, RSA), so they
+don't block the event loop of server, and the pool of processes that are
+killed when their function takes too long (search by regex).
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import curio
+
+from .sequrity import sign_message, hash_password, check_password
+from .constants.app_constants import CRYPTO_WORKERS, CRYPTO_MAX_JOBS
+from .logger import logger
+
+
+class CryptoPool:
+    """ Runs the functions in the pool of processes.
+
+    At most max_jobs functions are submitted to the pool at the same
+    time, the others wait in the queue (so the pool doesn't accumulate
+    the jobs of clients that already disconnected).
+    """
+
+    def __init__(self, workers=CRYPTO_WORKERS, max_jobs=CRYPTO_MAX_JOBS):
+        """ Initialization.
+
+        :param workers: amount of processes (0 - amount of CPUs)
+        :param max_jobs: max amount of jobs in the pool at the same time
+        """
+        self._workers = workers or None
+        self._executor = None
+        self._jobs_limit = curio.Semaphore(max_jobs)
+
+        # metrics
+        self.waiting = 0            # jobs in the queue now
+        self.running = 0            # jobs in the pool now
+        self.max_waiting = 0
+        self.completed = 0
+        self.total_wait_time = 0.
+        self.total_run_time = 0.
+
+    def start(self):
+        """ Create the processes. Call it before opening any sockets,
+        otherwise the processes inherit them (and keep the ports busy
+        if the server is killed).
+        """
+        self._get_executor().submit(int).result()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self._workers)
+        return self._executor
+
+    async def run(self, func, *args):
+        """ Run func(*args) in other process and return the result.
+
+        Exceptions of func are raised here.
+        """
+        start = time.monotonic()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._jobs_limit.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.monotonic()
+        self.running += 1
+        try:
+            return await curio.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.total_wait_time += started - start
+            self.total_run_time += time.monotonic() - started
+            await self._jobs_limit.release()
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            'waiting': self.waiting,
+            'running': self.running,
+            'max_waiting': self.max_waiting,
+            'completed': self.completed,
+            'avg_wait': self.total_wait_time / completed,
+            'avg_run': self.total_run_time / completed,
+        }
+
+    async def reporting(self, period: float):
+        """ Write the metrics to the log every period seconds (if something
+        has changed).
+        """
+        last = None
+        while True:
+            await curio.sleep(period)
+            stats = self.stats()
+            if stats != last:
+                logger.info(f"[*] Crypto pool: {stats}")
+                last = stats
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def _serve(conn):
+    """ Loop of the process of TimeLimitedPool: get tuple(func, args) from
+    the connection and send back tuple(True, result) or tuple(False, exception).
+    """
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            res = True, func(*args)
+        except Exception as e:
+            res = False, e
+        conn.send(res)
+
+
+class TimeLimitedPool:
+    """ Runs the functions in the pool of processes with the limit of time.
+
+    The process whose function doesn't finish in time is killed and replaced
+    by the new one, so it works even for the code that can't be interrupted
+    in the thread (e.g. matching of one string by regex).
+
+    The processes are started by forkserver (or spawn), never forked from
+    the server with its threads and sockets, so the main module must be
+    guarded by if __name__ == '__main__'.
+    """
+
+    def __init__(self, workers: int):
+        """ Initialization, but not launching.
+
+        :param workers: amount of processes (the max amount of functions
+                        that run at the same time)
+        """
+        self._workers = max(1, workers)
+        self._idle = []                 # tuple(process, connection)
+        self._slots = curio.Semaphore(self._workers)
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context(
+            'forkserver' if 'forkserver' in methods else 'spawn')
+
+        # metrics
+        self.completed = 0
+        self.killed = 0
+
+    def start(self):
+        """ Create the processes. Call it before opening any sockets (the
+        forkserver is created at the first time too).
+        """
+        while len(self._idle) < self._workers:
+            self._idle.append(self._new_process())
+
+    def _new_process(self):
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_serve, args=(child_conn,),
+                                        daemon=True)
+        process.start()
+        child_conn.close()
+        return process, conn
+
+    @staticmethod
+    def _kill(process, conn):
+        process.kill()
+        process.join()
+        conn.close()
+
+    async def run(self, timeout: float, func, *args):
+        """ Run func(*args) in other process and return the result. Waits if
+        all the processes are busy (the waiting isn't limited by timeout).
+
+        Exceptions of func are raised here.
+
+        :raise TimeoutError: if func took more than timeout seconds.
+        """
+        async with self._slots:
+            if self._idle:
+                process, conn = self._idle.pop()
+            else:
+                process, conn = await curio.run_in_thread(self._new_process)
+            done = False
+            try:
+                conn.send((func, args))
+                if not await curio.run_in_thread(conn.poll, timeout):
+                    raise TimeoutError(f"Function {func.__name__} took more than "
+                                       f"{timeout} seconds.")
+                success, result = conn.recv()
+                done = True
+            finally:
+                if done:
+                    self._idle.append((process, conn))
+                    self.completed += 1
+                else:
+                    # the process is still running func (or the pipe
+                    # is broken), there's no other way to stop it
+                    self._kill(process, conn)
+                    self.killed += 1
+        if not success:
+            raise result
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'idle': len(self._idle),
+            'completed': self.completed,
+            'killed': self.killed,
+        }
+
+    def shutdown(self):
+        while self._idle:
+            self._kill(*self._idle.pop())
+
+
+CRYPTO_POOL = CryptoPool()
+
+
+async def sign_message_async(message: bytes) -> bytes:
+    return await CRYPTO_POOL.run(sign_message, message)
+
+
+async def hash_password_async(password) -> bytes:
+    return await CRYPTO_POOL.run(hash_password, password)
+
+
+async def check_password_async(user_password, password_hash):
+    """ The same as check_password.
+
+    :raises ValueError: if the password is wrong.
+    """
+    await CRYPTO_POOL.run(check_password, user_password, password_hash)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import os
+import sys
+
+import curio
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the server is launched from the root (config, keys and logs are
+# relative to it), the logger opens its files at the import
+os.chdir(ROOT)
+os.makedirs('logs', exist_ok=True)
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def run_storage(tmp_path):
+    """ Run main(client) with the started SqliteStorageClient of the new
+    database (all the storage is ended after that).
+
+    :return: function run(main) -> result of main
+    """
+    from src.database._sqlite_client import SqliteStorage, SqliteStorageClient
+
+    path = str(tmp_path / 'server.db')
+
+    def run(main):
+        async def running():
+            storage = SqliteStorage(path, regex_workers=1)
+            client = SqliteStorageClient(path)
+            await client.start()
+            try:
+                return await main(client)
+            finally:
+                await storage.end()
+        return curio.run(running)
+
+    run.path = path
+    return run
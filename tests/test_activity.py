@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+from src import session
+from src.constants import CHANNEL, CHAT, Channel, Chat, ChatActivity, Message, Publication, User
+from src.constants.database_constants import TEXT
+
+ROOM, NEWS = Chat('room', None, None), Channel('news', None, None)
+
+
+class FakeObserver:
+
+    def __init__(self, name: str):
+        self.user = User(name)
+        self.activity = []
+
+    def get_name(self):
+        return self.user.name
+
+    async def send_activity(self, activity):
+        self.activity.append(sorted(activity))
+
+
+async def flush(client):
+    """ Wait until everything queued before is committed (set_last_read
+    doesn't wait for it).
+    """
+    await client._worker.execute('SELECT 1')
+
+
+def test_unread_messages_are_counted_from_last_read(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.new_user('bob', b'hash')
+        await client.create_chat(User('alice'), 'room', [User('bob')])
+        await client.create_channel(User('alice'), 'news')
+        ids = [(await client.add_message(ROOM, Message('alice', None, 0, TEXT, f'm{i}')))[0]
+               for i in range(5)]
+        seq, _ = await client.add_publication(NEWS, Publication(None, TEXT, 'post'))
+
+        assert await client.get_activity(User('bob')) == [ChatActivity('room', CHAT, ids[-1], 5)]
+        assert await client.get_activity(User('bob'), max_unread=3) == \
+            [ChatActivity('room', CHAT, ids[-1], 3)]
+
+        await client.set_last_read(ROOM, User('bob'), ids[2])
+        # LastRead never goes back
+        await client.set_last_read(ROOM, User('bob'), ids[0])
+        await client.set_last_read(NEWS, User('alice'), seq, destination=CHANNEL)
+        await flush(client)
+        assert await client.get_activity(User('bob')) == [ChatActivity('room', CHAT, ids[-1], 2)]
+        assert sorted(await client.get_activity(User('alice'))) == \
+            [ChatActivity('news', CHANNEL, seq, 0), ChatActivity('room', CHAT, ids[-1], 5)]
+
+    run_storage(main)
+
+    # LastRead is kept in the database
+    async def reopened(client):
+        activity = await client.get_activity(User('bob'))
+        assert [el.unread for el in activity] == [2]
+
+    run_storage(reopened)
+
+
+def test_hub_counts_unread_of_connected_members(run_storage):
+
+    async def main(client):
+        for name in ('alice', 'bob', 'carol'):
+            await client.new_user(name, b'hash')
+        await client.create_chat(User('alice'), 'room', [User('bob'), User('carol')])
+        hub = session.ActivityHub(max_unread=3)
+        alice, bob = FakeObserver('alice'), FakeObserver('bob')
+        for observer in (alice, bob):
+            await hub.connect(observer, client)
+        assert bob.activity == [[ChatActivity('room', CHAT, 0, 0)]]
+
+        # bob has opened the chat, alice is the author
+        hub.focus('bob', CHAT, 'room', 0)
+        for seq in range(1, 6):
+            await hub.post(CHAT, 'room', seq, author='alice')
+        await hub.send_changes()
+        assert alice.activity[1:] == bob.activity[1:] == []
+
+        hub.unfocus('bob', CHAT, 'room')
+        for seq in range(6, 11):
+            await hub.post(CHAT, 'room', seq, author='alice')
+        await hub.send_changes()
+        # counted up to max_unread
+        assert bob.activity[-1] == [ChatActivity('room', CHAT, 10, 3)]
+        assert len(alice.activity) == 1 and hub.updates == 1
+
+        # opening makes everything read
+        hub.focus('bob', CHAT, 'room', 10)
+        await hub.post(CHAT, 'room', 11, author='carol')
+        await hub.send_changes()
+        assert alice.activity[-1] == [ChatActivity('room', CHAT, 11, 1)]
+        assert len(bob.activity) == 2
+
+        # the channel he has joined, carol isn't connected
+        hub.join('bob', CHANNEL, 'news', 0)
+        await hub.post(CHANNEL, 'news', 1)
+        await hub.send_changes()
+        assert bob.activity[-1] == [ChatActivity('news', CHANNEL, 1, 1)]
+        hub.disconnect(bob)
+        assert len(hub) == 1
+
+    run_storage(main)
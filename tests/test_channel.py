@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import curio
+import pytest
+
+from src import session
+from src.constants import Channel, Publication, User
+from src.constants.database_constants import TEXT
+from src.database._sqlite_client import SqliteStorageClient
+
+
+class FakeObserver:
+    """ Subscriber whose queue holds `backlog` updates.
+    """
+
+    def __init__(self, name: str, backlog=0):
+        self.user = User(name)
+        self.disconnected = False
+        self.updates = []
+        self.caught_up = []
+        self._backlog = backlog
+
+    def get_name(self):
+        return self.user.name
+
+    def backlog(self):
+        return self._backlog
+
+    async def connect(self, source):
+        pass
+
+    async def send_signed(self, source, signed_data, content_type):
+        self.updates.append(content_type)
+
+    async def send_publications(self, source, seq, entries, last_seq):
+        self.caught_up.append(([el[1].content for el in entries], last_seq))
+
+
+async def open_channel(path) -> session.ChannelAssistant:
+    channel = session.ChannelAssistant(SqliteStorageClient(path), Channel('news', None, None))
+    await channel.start()
+    await session.CHANNEL_ASSISTANTS.add(channel)
+    return channel
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    registry = session.ChatRegistry(idle_timeout=60, kind='channel')
+    monkeypatch.setattr(session, 'CHANNEL_ASSISTANTS', registry)
+    return registry
+
+
+async def publish(channel, *contents):
+    return [await channel.publish(Publication(None, TEXT, content)) for content in contents]
+
+
+def test_catch_up_from_window_and_database(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.new_user('bob', b'hash')
+        await client.create_channel(User('alice'), 'news')
+        channel = await open_channel(run_storage.path)
+        channel._publications.max_messages = 3
+        try:
+            seqs = await publish(channel, *(f'post{i}' for i in range(6)))
+            bob = FakeObserver('bob')
+
+            # the newest ones are in memory
+            await channel.catch_up(bob, seqs[3])
+            assert bob.caught_up[-1] == (['post4', 'post5'], seqs[-1])
+            assert channel.stats()['catch_ups_from_db'] == 0
+
+            # the older ones are read from database, page by page
+            await channel.catch_up(bob, seqs[0], limit=2)
+            assert bob.caught_up[-1] == (['post1', 'post2'], seqs[-1])
+            assert channel.stats()['catch_ups_from_db'] == 1
+
+            # nothing new
+            await channel.catch_up(bob, seqs[-1])
+            assert bob.caught_up[-1] == ([], seqs[-1])
+            assert channel.stats()['catch_ups'] == 3
+        finally:
+            await channel.end()
+
+    run_storage(main)
+
+
+def test_lagging_subscriber_gets_behind(run_storage, monkeypatch):
+    monkeypatch.setattr(session, 'CHANNEL_MAX_LAG', 2)
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        for name in ('bob', 'carol'):
+            await client.new_user(name, b'hash')
+        await client.create_channel(User('alice'), 'news')
+        channel = await open_channel(run_storage.path)
+        try:
+            fast, slow = FakeObserver('bob'), FakeObserver('carol', backlog=1)
+            for observer in (fast, slow):
+                await channel.attach_user_observer(observer)
+            seqs = await publish(channel, 'post0')
+            await curio.sleep(0.05)
+            assert fast.updates == slow.updates == [session.NEW_PUBLICATION]
+
+            # carol's queue reaches the threshold: she gets only CHANNEL_BEHIND
+            slow._backlog = 2
+            seqs += await publish(channel, 'post1', 'post2')
+            await curio.sleep(0.05)
+            assert fast.updates == [session.NEW_PUBLICATION] * 3
+            assert slow.updates == [session.NEW_PUBLICATION, session.CHANNEL_BEHIND]
+            assert channel.stats()['lagging'] == 1
+
+            # until she catches up to the last publication
+            slow._backlog = 0
+            await channel.catch_up(slow, seqs[0])
+            assert slow.caught_up[-1] == (['post1', 'post2'], seqs[-1])
+            seqs += await publish(channel, 'post3')
+            await curio.sleep(0.05)
+            assert slow.updates[-1] == session.NEW_PUBLICATION
+            assert channel.stats()['lagging'] == 0
+            for observer in (fast, slow):
+                await channel.detach_user_assistant(observer.user)
+        finally:
+            await channel.end()
+
+    run_storage(main)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import curio
+import pytest
+
+from client_src import framing as client_framing
+from src.constants.protocol_constants import AUX_SOCKET_LABEL, FRAME_COMMAND
+from src.framing import FramedSocket, BadFrameError
+
+KEY = bytes(range(32))
+
+
+class Wire:
+    """ Socket whose written bytes are read back (by the same or
+    another wrapper).
+    """
+
+    def __init__(self, data=b''):
+        self.data = data
+
+    def _recv(self, size: int) -> bytes:
+        res, self.data = self.data[:size], self.data[size:]
+        return res
+
+    def _sendall(self, data: bytes):
+        self.data += data
+
+
+class AsyncWire(Wire):
+
+    async def recv(self, size: int) -> bytes:
+        return self._recv(size)
+
+    async def sendall(self, data: bytes):
+        self._sendall(data)
+
+
+class SyncWire(Wire):
+    recv = Wire._recv
+    sendall = Wire._sendall
+
+
+def server_socket(wire, socket_label=None) -> FramedSocket:
+    sock = FramedSocket(wire, max_payload=1 << 16)
+    if socket_label is None:
+        sock.set_mac_key(KEY)
+    else:
+        sock.set_mac_key(KEY, socket_label)
+    return sock
+
+
+def client_socket(wire, socket_label=None):
+    sock = client_framing.FramedSocket(wire)
+    if socket_label is None:
+        sock.set_mac_key(KEY)
+    else:
+        sock.set_mac_key(KEY, socket_label)
+    return sock
+
+
+def test_frames_between_client_and_server():
+    wire = AsyncWire()
+    curio.run(server_socket(wire).sendall, b'to client')
+    assert client_socket(SyncWire(wire.data)).recv(100) == b'to client'
+
+    sync_wire = SyncWire()
+    client_socket(sync_wire).sendall(b'to server')
+    assert curio.run(server_socket(AsyncWire(sync_wire.data)).recv, 100) == b'to server'
+
+
+def test_reflected_frame_is_rejected():
+    # the frame of server with number 0 is sent back to server as the
+    # frame of client with the same number
+    wire = AsyncWire()
+    sock = server_socket(wire)
+    curio.run(sock.sendall, b'hello')
+    with pytest.raises(BadFrameError):
+        curio.run(sock.recv, 100)
+
+    sync_wire = SyncWire()
+    sock = client_socket(sync_wire)
+    sock.sendall(b'hello')
+    with pytest.raises(client_framing.BadFrameError):
+        sock.recv(100)
+
+
+def test_frame_of_other_socket_is_rejected():
+    # the update via auxiliary socket is replayed to the main one
+    wire = AsyncWire()
+    curio.run(server_socket(wire, AUX_SOCKET_LABEL).send_frame, FRAME_COMMAND, b'update')
+    with pytest.raises(client_framing.BadFrameError):
+        client_socket(SyncWire(wire.data)).recv(100)
+    assert client_socket(SyncWire(wire.data), AUX_SOCKET_LABEL).recv(100) == b'update'
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+from src.constants import Message
+from src.constants.database_constants import TEXT
+from src.history import HistoryWindow, message_size
+
+
+def make_cursor(message_id: int) -> str:
+    return format(message_id, 'x')
+
+
+def message(i: int, length=1) -> Message:
+    return Message('alice', '2026-10-18 00:00:00', 0, TEXT, f'{i}' * length)
+
+
+def contents(messages) -> list:
+    return [el.content for el in messages]
+
+
+def test_window_keeps_max_messages():
+    window = HistoryWindow(make_cursor, max_messages=3, max_bytes=10 ** 9)
+    for i in range(1, 4):
+        window.append(i, message(i))
+    assert window.latest(10) == ([message(1), message(2), message(3)], None)
+
+    window.append(4, message(4))
+    window.append(5, message(5))
+    assert len(window) == 3 and window.dropped == 2
+    # the cursor shows the messages older than the window
+    assert window.cursor == make_cursor(3)
+    assert window.latest(10) == ([message(3), message(4), message(5)], make_cursor(3))
+    assert window.latest(2) == ([message(4), message(5)], make_cursor(4))
+    assert window.latest_entries(2) == [(4, message(4)), (5, message(5))]
+    assert window.last_id() == 5
+
+
+def test_window_keeps_max_bytes():
+    size = message_size(1, message(1, 100))
+    window = HistoryWindow(make_cursor, max_messages=100, max_bytes=size * 2)
+    for i in range(1, 6):
+        window.append(i, message(i, 100))
+    assert len(window) == 2 and window.nbytes <= size * 2
+    assert window.cursor == make_cursor(4)
+    assert window.stats() == {'messages': 2, 'bytes': window.nbytes, 'dropped': 3}
+
+    # the newest message is kept, even if it's too big
+    window.append(6, message(6, 10 ** 4))
+    assert contents(window.latest(10)[0]) == ['6' * 10 ** 4]
+    assert window.cursor == make_cursor(6)
+
+
+def test_window_reset_and_order():
+    window = HistoryWindow(make_cursor, max_messages=3, max_bytes=10 ** 9)
+    window.reset([(i, message(i)) for i in range(2, 7)], make_cursor(2))
+    assert window.latest_entries(10) == [(i, message(i)) for i in range(4, 7)]
+    assert window.cursor == make_cursor(4)
+
+    # messages committed together could come in any order
+    window.append(8, message(8))
+    window.append(7, message(7))
+    assert contents(window.latest(10)[0]) == ['6', '7', '8']
+    # the message that is older than the window is in the storage part
+    window.append(1, message(1))
+    assert contents(window.latest(10)[0]) == ['6', '7', '8']
+
+
+def test_messages_after():
+    window = HistoryWindow(make_cursor, max_messages=3, max_bytes=10 ** 9)
+    for i in range(1, 6):
+        window.append(i, message(i))
+    assert window.after(3, 10) == [(4, message(4)), (5, message(5))]
+    assert window.after(4, 1) == [(5, message(5))]
+    assert window.after(5, 10) == []
+    # some of them were dropped to the storage
+    assert window.after(1, 10) is None
+
+    empty = HistoryWindow(make_cursor)
+    assert empty.after(0, 10) == [] and empty.last_id() == 0
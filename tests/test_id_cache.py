@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+from src.constants import CHAT, CHANNEL, Chat, User
+from src.database._sqlite_client import USER, IdCache, SqliteStorageClient
+
+
+def test_stale_id_is_not_cached():
+    ids = IdCache(size=2)
+    generation = ids.generation
+    ids.discard(USER, 'alice')          # deleted while it was being read
+    ids.put(USER, 'alice', 1, generation)
+    assert ids.get(USER, 'alice') is None
+
+    ids.put(USER, 'alice', 1, ids.generation)
+    ids.put(USER, 'bob', 2, ids.generation)
+    assert ids.get(USER, 'alice') == 1
+    ids.put(USER, 'carol', 3, ids.generation)    # bob is the least recently used
+    assert ids.get(USER, 'bob') is None
+    assert ids.get(USER, 'carol') == 3
+
+    ids.put(CHAT, 'room', 4, ids.generation)
+    ids.discard_kind(USER)
+    assert ids.get(USER, 'alice') is None and ids.get(CHAT, 'room') == 4
+
+
+def test_ids_are_invalidated_by_changes(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.new_user('bob', b'hash')
+        alice_id = await client._get_user_id('alice')
+        await client.create_chat(User('alice'), 'room', [])
+        await client.create_channel(User('alice'), 'news')
+        chat_id = await client._get_c_id('room', CHAT)
+        assert await client._get_c_id('news', CHANNEL)
+
+        await client.modify_user(User('alice'), 'alicia', None)
+        assert await client._get_user_id('alice') is None
+        assert await client._get_user_id('alicia') == alice_id
+
+        await client.delete_chat(Chat('room', None, None))
+        assert await client._get_c_id('room', CHAT) is None
+        await client.create_chat(User('bob'), 'room', [])
+        assert await client._get_c_id('room', CHAT) != chat_id
+
+        # chats and channels could be deleted together with the user
+        ids = client._storage.ids
+        assert ids.get(CHAT, 'room') and ids.get(CHANNEL, 'news')
+        await client.delete_user(User('alicia'))
+        assert await client._get_user_id('alicia') is None
+        assert ids.get(CHAT, 'room') is None and ids.get(CHANNEL, 'news') is None
+
+    run_storage(main)
+
+
+def test_id_read_during_deletion_is_not_cached(run_storage, monkeypatch):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        ids = client._storage.ids
+        ids.discard(USER, 'alice')
+        do_read_query = SqliteStorageClient._do_read_query
+
+        async def deleting(self, query, params=(), *args, **kwargs):
+            # the user is read, then deleted before the id gets to the cache
+            res = await do_read_query(self, query, params, *args, **kwargs)
+            ids.discard(USER, 'alice')
+            return res
+
+        monkeypatch.setattr(SqliteStorageClient, '_do_read_query', deleting)
+        assert await client._get_user_id('alice')
+        assert ids.get(USER, 'alice') is None
+
+    run_storage(main)
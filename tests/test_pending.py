@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import curio
+
+from src.server import PendingConnections
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_duplicate_check_phrase_is_rejected():
+    pending = PendingConnections(ttl=60)
+    first, second = FakeConnection(), FakeConnection()
+
+    async def main():
+        assert await pending.add(b'phrase', first, 'addr1')
+        assert not await pending.add(b'phrase', second, 'addr2')
+        assert len(pending) == 1
+        assert await pending.get(b'phrase') == (first, 'addr1')
+        assert len(pending) == 0
+
+        # the phrase is free again after the connection is claimed
+        assert await pending.add(b'phrase', second, 'addr2')
+
+    curio.run(main)
+    assert not first.closed
+
+
+def test_expired_connections_are_closed():
+    pending = PendingConnections(ttl=0)
+    connection = FakeConnection()
+
+    async def main():
+        await pending.add(b'phrase', connection, 'addr')
+        await curio.sleep(0.01)
+        await pending.expire()
+
+    curio.run(main)
+    assert connection.closed
+    assert len(pending) == 0
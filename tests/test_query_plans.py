@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+"""
+The queries that read the messages of one chat/channel must use the indexes
+of SCHEMA_MIGRATIONS (CID first), so they neither scan the whole table
+nor sort the rows in a temporary B-tree.
+"""
+
+import sqlite3
+
+import pytest
+
+from src.constants import Channel, Chat, Message, Publication, User
+from src.constants.database_constants import TEXT
+
+
+def explain(path, query, params) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        return ' | '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params))
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def read_queries(run_storage, monkeypatch):
+    """ Run the reading methods of client against a small migrated database
+    and return tuple(name of method, query, params) of the queries they make.
+    """
+    from src.database._sqlite_client import SqliteStorageClient
+
+    chat, channel = Chat('room', None, None), Channel('news', None, None)
+    queries = []
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.create_chat(User('alice'), 'room', [])
+        await client.create_channel(User('alice'), 'news')
+        for i in range(20):
+            await client.add_message(chat, Message('alice', None, 0, TEXT, f'message {i}'))
+            await client.add_publication(channel, Publication(None, TEXT, f'publication {i}'))
+
+        do_read_query = SqliteStorageClient._do_read_query
+
+        async def recording(self, query, params=(), *args, **kwargs):
+            if 'Messages' in query:
+                queries.append((current, query, params))
+            return await do_read_query(self, query, params, *args, **kwargs)
+
+        monkeypatch.setattr(SqliteStorageClient, '_do_read_query', recording)
+        for current, call in (('get_messages', lambda: client.get_messages(chat)),
+                              ('get_history', lambda: client.get_history(chat, limit=5)),
+                              ('get_publications', lambda: client.get_publications(channel)),
+                              ('get_publications_history',
+                               lambda: client.get_publications_history(channel, limit=5))):
+            await call()
+
+    run_storage(main)
+    return run_storage.path, queries
+
+
+# index that each method must use
+EXPECTED_INDEXES = {
+    'get_messages': 'ChatMessagesCreated (CID=?)',
+    'get_history': 'ChatMessagesHistory (CID=? AND Id<?)',
+    'get_publications': 'ChannelMessagesCreated (CID=?)',
+    'get_publications_history': 'ChannelMessagesHistory (CID=? AND Id<?)',
+}
+
+
+def test_messages_are_read_by_index(read_queries):
+    path, queries = read_queries
+    assert {name for name, _, _ in queries} == set(EXPECTED_INDEXES)
+    for name, query, params in queries:
+        plan = explain(path, query, params)
+        assert f'USING INDEX {EXPECTED_INDEXES[name]}' in plan, f'{name}: {plan}'
+        assert 'TEMP B-TREE' not in plan, f'{name}: {plan}'
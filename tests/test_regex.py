@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import re
+import time
+
+import curio
+import pytest
+
+from src.database import BadStorageParamException
+from src.database._sqlite_client import _regex_literals, _regex_search_query, \
+    _check_regex, _regexp
+from src.workers import TimeLimitedPool
+
+
+@pytest.mark.parametrize('pattern, literals', [
+    ('hello', [('hello', False)]),
+    (r'\x41bc', [('Abc', False)]),
+    (r'\101bc', [('Abc', False)]),
+    (r'фoo', [('фoo', False)]),
+    (r'a\.b\\c', [('a.b\\c', False)]),
+    (r'\bfoo\d+bar', [('foo', True), ('bar', False)]),
+    (r'^foo bar$', [('foo bar', True)]),
+    (r'foo\sbar', [('foo', False), ('bar', True)]),
+    (r'foo[\s,]bar', [('foo', False), ('bar', True)]),
+    (r'[)]foo', [(')foo', False)]),
+    (r'[ab]foo', [('foo', False)]),
+    (r'[^\s]foo', [('foo', False)]),
+    (r'(hello) (world)', [('hello world', False)]),
+    ('colou?r', [('colo', False), ('r', False)]),
+    ('ab*c', [('a', False), ('c', False)]),
+    ('ab+c', [('a', False), ('c', False)]),
+    ('a{2,3}bc', [('bc', False)]),
+    ('fo(o+)bar', [('fo', False), ('bar', False)]),
+    ('foo|bar', []),
+    ('x(foo|bar)y', [('x', False), ('y', False)]),
+    ('(?i)foo', [('foo', False)]),
+    ('(?i)kiss', []),
+    ('(?i)foфo', [('fo', False), ('o', False)]),
+    ('(?ia)kiss', [('kiss', False)]),
+    ('a(?i:bc)d', [('a', False), ('d', False)]),
+    ('.*', []),
+])
+def test_regex_literals(pattern, literals):
+    assert _regex_literals(pattern) == literals
+
+
+@pytest.mark.parametrize('pattern, words', [
+    ('hello world', '"world"*'),
+    ('helloworld', ''),
+    (r'\bhello world', '"hello"* "world"*'),
+    (r'hel+o\sworld', '"world"*'),
+    (r'\x68ello \bworld', '"world"*'),
+    (r'\b(foo|bar)', ''),
+    (r'[)]foo', '"foo"*'),
+    (r'\bcafé', ''),
+    (r'^foo_bar', '"foo"* "bar"*'),
+])
+def test_regex_search_query(pattern, words):
+    query = _regex_search_query(pattern, 7)
+    if words:
+        assert query == f'CID : "7" AND Content : ({words})'
+    else:
+        assert query == ''
+
+
+@pytest.mark.parametrize('pattern, reason', [
+    (r'(a+)+b', 'nested repeats'),
+    (r'(a*b?)*c', 'nested repeats'),
+    (r'(a|a)*b', 'alternation inside repeat'),
+    (r'(a|ab)*c', 'alternation inside repeat'),
+    (r'(x(ab|cd)?)+y', 'alternation inside repeat'),
+    (r'\w*\w*\w*x', 'adjacent repeats'),
+    (r'a.*.*b', 'adjacent repeats'),
+    (r'\d+-?\w+', 'adjacent repeats'),
+    (r'(\w+)(\w+)$', 'adjacent repeats'),
+])
+def test_check_regex_refuses(pattern, reason):
+    with pytest.raises(BadStorageParamException, match=reason):
+        _check_regex(pattern)
+
+
+@pytest.mark.parametrize('pattern', [
+    r'burst1\d$', r'\bhel+o\s+world', r'a.*b.*c', r'\w+\s*-\s*\d+',
+    r'(ab)+c', r'(a|b)+', r'x(foo|bar)y', r'a{2,5}b{3}', r'\w+\s+\w+', r'\w*\s+\w*',
+])
+def test_check_regex_accepts(pattern):
+    _check_regex(pattern)
+
+
+def test_check_regex_bad_pattern():
+    with pytest.raises(BadStorageParamException, match='Bad regex'):
+        _check_regex('(a')
+
+
+def test_regexp_limits_length():
+    assert _regexp('x', 'x' + 'a' * 10000)
+    assert not _regexp('x', 'a' * 10000 + 'x')
+    assert not _regexp('x', None)
+
+
+def test_time_limited_pool():
+    pool = TimeLimitedPool(1)
+
+    async def main():
+        assert await pool.run(1, pow, 2, 10) == 1024
+        with pytest.raises(ValueError):
+            await pool.run(1, int, 'not a number')
+        start = time.monotonic()
+        # can't be interrupted inside re, only the process is killed
+        with pytest.raises(TimeoutError):
+            await pool.run(0.3, re.search, r'(a|a)*b', 'a' * 40)
+        assert time.monotonic() - start < 2
+        assert await pool.run(1, pow, 2, 3) == 8
+
+    try:
+        curio.run(main)
+    finally:
+        pool.shutdown()
+    assert pool.stats() == {'idle': 0, 'completed': 3, 'killed': 1}
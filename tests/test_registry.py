@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import curio
+
+from src import session
+from src.constants import Chat, Message, User
+
+
+class FakeStorage:
+    """ Only what ChatAssistant needs without database.
+    """
+
+    def __init__(self):
+        self.ended = False
+        self.last_read = []
+
+    def history_cursor(self, message_id: int) -> str:
+        return format(message_id, 'x')
+
+    async def start(self):
+        pass
+
+    async def end(self):
+        assert not self.ended, 'ended twice'
+        self.ended = True
+
+    async def set_last_read(self, chat, user, message_id, destination):
+        self.last_read.append((user.name, message_id))
+
+    async def add_message(self, chat, message):
+        return 1, message
+
+    async def add_users(self, chat, users, permission, destination):
+        return users
+
+
+class FakeObserver:
+
+    def __init__(self, name: str):
+        self.user = User(name)
+        self.disconnected = False
+        self.updates = []
+
+    def get_name(self):
+        return self.user.name
+
+    async def connect(self, source):
+        pass
+
+    async def send_signed(self, source, signed_data, content_type):
+        self.updates.append(content_type)
+
+
+async def make_chat(registry, name: str) -> session.ChatAssistant:
+    chat = session.ChatAssistant(FakeStorage(), Chat(name, User('alice'), None),
+                                 just_created=True)
+    await chat.start()
+    await registry.add(chat)
+    return chat
+
+
+def test_held_chat_is_never_ended(monkeypatch):
+    registry = session.ChatRegistry(idle_timeout=60, max_chats=1)
+    monkeypatch.setattr(session, 'CHAT_ASSISTANTS', registry)
+
+    async def main():
+        chat = await make_chat(registry, 'room')
+        observer = FakeObserver('alice')
+        await chat.attach_user_observer(observer)
+        # the queue of observer has overflowed, but his UserAssistant
+        # is still in the chat
+        observer.disconnected = True
+        other = await make_chat(registry, 'other')
+        registry._idle_timeout = 0
+        await registry.expire()
+        assert not chat.get_db_client().ended
+        assert other.get_db_client().ended
+        assert registry.get('room') is chat
+
+        await chat.detach_user_assistant(observer.user)
+        assert chat.get_db_client().last_read == [('alice', 0)]
+        await registry.expire()
+        assert chat.get_db_client().ended
+        assert len(registry) == 0
+
+        # the late calls do nothing
+        await chat.end()
+        await chat.detach_user_assistant(observer.user)
+        await chat.new_message(Message('alice', None, 0, 0, 'late'))
+        assert chat.get_db_client().last_read == [('alice', 0)]
+
+    curio.run(main)
+
+
+def test_just_added_chat_isnt_evicted(monkeypatch):
+    registry = session.ChatRegistry(idle_timeout=60, max_chats=1)
+    monkeypatch.setattr(session, 'CHAT_ASSISTANTS', registry)
+
+    async def main():
+        first = await make_chat(registry, 'first')
+        await first.attach_user_observer(FakeObserver('alice'))
+        second = await make_chat(registry, 'second')
+        assert not second.get_db_client().ended
+        assert len(registry) == 2
+
+    curio.run(main)
+
+
+
+def test_snapshots_are_invalidated_by_content_type(monkeypatch):
+    registry = session.ChatRegistry(idle_timeout=60)
+    monkeypatch.setattr(session, 'CHAT_ASSISTANTS', registry)
+
+    async def main():
+        chat = await make_chat(registry, 'room')
+        members = await chat.get_snapshot(session.CHAT_MEMBERS)
+        messages = await chat.get_snapshot(session.CHAT_MESSAGES)
+
+        await chat.new_message(Message('alice', None, 0, 0, 'hello'))
+        assert await chat.get_snapshot(session.CHAT_MEMBERS) is members
+        new_messages = await chat.get_snapshot(session.CHAT_MESSAGES)
+        assert new_messages is not messages
+
+        await chat.add_users([User('bob')])
+        assert await chat.get_snapshot(session.CHAT_MESSAGES) is new_messages
+        assert await chat.get_snapshot(session.CHAT_MEMBERS) is not members
+
+    curio.run(main)
+
+
+def test_created_chat_knows_its_members(monkeypatch, run_storage):
+    registry = session.ChatRegistry(idle_timeout=60)
+    monkeypatch.setattr(session, 'CHAT_ASSISTANTS', registry)
+    monkeypatch.setattr(session, 'SERVER_DATABASE', run_storage.path)
+
+    async def main(client):
+        for name in ('alice', 'bob', 'carol'):
+            await client.new_user(name, b'hash')
+        observer = FakeObserver('alice')
+        chat = await session.create_chat('room', User('alice'), [User('bob'), User('ghost')],
+                                         observer)
+        assert await chat.get_members() == {'alice', 'bob'}
+        assert await chat.get_members() == await client.get_members(Chat('room', None, None))
+
+        # only carol is new
+        await chat.add_users([User('bob'), User('carol')])
+        assert observer.updates == [session.NEW_USER]
+        assert await chat.get_members() == {'alice', 'bob', 'carol'}
+        await chat.detach_user_assistant(observer.user)
+
+    run_storage(main)
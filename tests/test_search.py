@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import sqlite3
+
+from src.constants import Channel, Chat, Message, Publication, User
+from src.constants.database_constants import TEXT
+from src.database._sqlite_client import PREPARE_DATABASE_QUERY, SCHEMA_MIGRATIONS, migrate
+
+ROOM, HALL = Chat('room', None, None), Chat('hall', None, None)
+
+
+def contents(messages) -> set:
+    return {message.content for message in messages}
+
+
+def test_messages_are_found_by_words(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.new_user('bob', b'hash')
+        await client.create_chat(User('alice'), 'room', [User('bob')])
+        await client.create_chat(User('alice'), 'hall', [])
+        for author, content in (('alice', 'hello world'), ('bob', 'Hello there'),
+                                ('alice', 'helicopter'), ('bob', 'goodbye world')):
+            await client.add_message(ROOM, Message(author, None, 0, TEXT, content))
+        await client.add_message(HALL, Message('alice', None, 0, TEXT, 'hello hall'))
+
+        found, cursor = await client.find_messages(ROOM, 'hello')
+        assert contents(found) == {'hello world', 'Hello there'} and cursor is None
+        found, _ = await client.find_messages(ROOM, 'hel*')
+        assert contents(found) == {'hello world', 'Hello there', 'helicopter'}
+        found, _ = await client.find_messages(ROOM, 'hello world')
+        assert contents(found) == {'hello world'}
+        found, _ = await client.find_messages(ROOM, 'hello', author_name='bob')
+        assert contents(found) == {'Hello there'}
+
+        # only the messages of the chat
+        found, _ = await client.find_messages(HALL, 'hel*')
+        assert contents(found) == {'hello hall'}
+
+        # the syntax of FTS5 is just words
+        found, _ = await client.find_messages(ROOM, 'hello OR NOT "world')
+        assert found == []
+
+        page, cursor = await client.find_messages(ROOM, 'hel*', limit=2)
+        rest, last = await client.find_messages(ROOM, 'hel*', limit=2, cursor=cursor)
+        assert len(page) == 2 and len(rest) == 1 and last is None
+        assert contents(page + rest) == {'hello world', 'Hello there', 'helicopter'}
+
+    run_storage(main)
+
+
+def test_index_follows_the_changes_of_messages(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.create_chat(User('alice'), 'room', [])
+        await client.create_channel(User('alice'), 'news')
+        for content in ('first news', 'second news'):
+            await client.add_message(ROOM, Message('alice', None, 0, TEXT, content))
+            await client.add_publication(Channel('news', None, None),
+                                         Publication(None, TEXT, content))
+
+    run_storage(main)
+
+    conn = sqlite3.connect(run_storage.path)
+    with conn:
+        for table in ('ChatMessages', 'ChannelMessages'):
+            conn.execute(f"UPDATE {table} SET Content='edited news' WHERE Content='first news'")
+            conn.execute(f"DELETE FROM {table} WHERE Content='second news'")
+    for table in ('ChatMessagesSearch', 'ChannelMessagesSearch'):
+        found = conn.execute(f"SELECT rowid FROM {table} WHERE {table} MATCH 'news'").fetchall()
+        edited = conn.execute(f"SELECT rowid FROM {table} WHERE {table} MATCH 'edited'").fetchall()
+        first = conn.execute(f"SELECT rowid FROM {table} WHERE {table} MATCH 'first'").fetchall()
+        assert found == edited and len(found) == 1 and first == [], table
+        # raises if the index doesn't match the messages
+        conn.execute(f"INSERT INTO {table} ({table}) VALUES ('integrity-check')")
+    conn.close()
+
+
+def test_publications_are_found(run_storage):
+    news = Channel('news', None, None)
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.create_channel(User('alice'), 'news')
+        await client.add_publication(news, Publication(None, TEXT, 'breaking news'))
+        found, _ = await client.find_publication('break*')
+        assert [el.content for el in found] == ['breaking news']
+        assert type(found[0].content_type) is int
+
+    run_storage(main)
+
+
+def test_migration_indexes_the_existing_publications(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'old.db'))
+    conn.executescript(PREPARE_DATABASE_QUERY)
+    conn.execute("INSERT INTO Users (Name) VALUES ('alice')")
+    conn.execute("INSERT INTO Channels (Name, CreatorID) VALUES ('news', 1)")
+    conn.execute("INSERT INTO ChannelMessages (CID, Type, Content) VALUES (1, 0, 'old news')")
+    conn.commit()
+
+    # the version with the triggers that didn't index the new publications
+    conn.execute('PRAGMA user_version=0')
+    for version, script in enumerate(SCHEMA_MIGRATIONS[:3], 1):
+        conn.executescript(f'BEGIN; {script} PRAGMA user_version={version}; COMMIT;')
+    conn.execute("INSERT INTO ChannelMessages (CID, Type, Content) VALUES (1, 0, 'new news')")
+    conn.commit()
+
+    assert migrate(conn) == len(SCHEMA_MIGRATIONS)
+    found = conn.execute("SELECT rowid FROM ChannelMessagesSearch "
+                         "WHERE ChannelMessagesSearch MATCH 'news'").fetchall()
+    assert len(found) == 2
+    conn.close()
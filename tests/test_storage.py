@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import sqlite3
+
+import curio
+import pytest
+
+from src.constants import ADMIN, CHANNEL, CHAT, CREATOR, MEMBER, MODERATOR, Channel, Chat, \
+    Message, Publication, User
+from src.constants.database_constants import TEXT
+from src.database._sqlite_client import BadStorageParamException
+
+
+def test_created_chat_has_its_creator(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.new_user('bob', b'hash')
+        chat_id, added = await client.create_chat(User('alice'), 'room', [])
+        assert chat_id
+        assert added == [User('alice')]
+        assert await client.get_members(Chat('room', None, None)) == {'alice'}
+
+        _, added = await client.create_chat(User('bob'), 'hall',
+                                            [User('alice'), User('ghost'), User('bob')])
+        assert [user.name for user in added] == ['bob', 'alice']
+        with pytest.raises(BadStorageParamException):
+            await client.create_chat(User('bob'), 'hall', [])
+
+    run_storage(main)
+
+
+def test_add_users_skips_unknown_and_keeps_permissions(run_storage):
+    room, news = Chat('room', None, None), Channel('news', None, None)
+
+    async def main(client):
+        for name in ('alice', 'bob', 'carol'):
+            await client.new_user(name, b'hash')
+        await client.create_chat(User('alice'), 'room', [])
+        await client.create_channel(User('alice'), 'news')
+        await client.add_user(room, User('bob'), permission=ADMIN)
+
+        added = await client.add_users(room, [User('bob'), User('ghost'), User('carol'),
+                                              User('carol'), User('alice')])
+        assert added == [User('bob'), User('carol'), User('alice')]
+        assert await client.get_members(room) == {'alice', 'bob', 'carol'}
+        assert await client.get_permission(room, User('alice')) == CREATOR
+        assert await client.get_permission(room, User('bob')) == ADMIN
+        assert await client.get_permission(room, User('carol')) == MEMBER
+        assert await client.get_permission(room, User('ghost')) is None
+
+        added = await client.add_users(news, [User('bob'), User('ghost')],
+                                       permission=MODERATOR, destination=CHANNEL)
+        assert added == [User('bob')]
+        assert await client.get_permission(news, User('bob'), CHANNEL) == MODERATOR
+        assert await client.get_permission(news, User('alice'), CHANNEL) == CREATOR
+
+        assert await client.add_users(room, [User('ghost')]) == []
+        with pytest.raises(BadStorageParamException):
+            await client.add_users(Chat('nowhere', None, None), [User('bob')])
+
+    run_storage(main)
+
+
+def test_statements_are_committed_together(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        creator_id = await client._get_user_id('alice')
+        insert = 'INSERT INTO Chats (Name, CreatorID) VALUES (?, ?)'
+        with pytest.raises(sqlite3.IntegrityError):
+            await client._do_write_statements([(insert, ('room', creator_id)),
+                                               (insert, ('room', creator_id))])
+        assert not await client.get_chat_info('room')
+
+        chat_id = await client._do_write_statements([(insert, ('room', creator_id)),
+                                                     (insert, ('hall', creator_id))])
+        assert chat_id == await client._get_c_id('room', CHAT)
+        assert await client.get_chat_info('hall')
+
+    run_storage(main)
+
+
+def test_concurrent_channels_with_the_same_name(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        tasks = [await curio.spawn(client.create_channel, User('alice'), 'news')
+                 for _ in range(2)]
+        outcomes = []
+        for task in tasks:
+            try:
+                outcomes.append(await task.join())
+            except curio.TaskError as e:
+                outcomes.append(e.__cause__)
+        assert sum(isinstance(el, BadStorageParamException) for el in outcomes) == 1
+        assert await client.get_channel_info('news')
+
+    run_storage(main)
+
+
+def test_found_publications_have_integer_type(run_storage):
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.create_channel(User('alice'), 'news')
+        channel = Channel('news', None, None)
+        await client.add_publication(channel, Publication(None, TEXT, 'breaking news'))
+        history, _ = await client.get_publications_history(channel)
+        found, _ = await client.find_publication('break.ng', use_regex=True)
+        assert [el.content_type for _, el in history] == [TEXT]
+        assert found == [el for _, el in history]
+        assert type(found[0].content_type) is int
+
+    run_storage(main)
+
+
+def test_history_is_read_page_by_page(run_storage):
+    chat = Chat('room', None, None)
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.create_chat(User('alice'), 'room', [])
+        ids = []
+        for i in range(7):
+            message_id, _ = await client.add_message(chat, Message('alice', None, 0, TEXT, f'm{i}'))
+            ids.append(message_id)
+
+        pages, cursor = [], None
+        while True:
+            page, cursor = await client.get_history(chat, limit=3, cursor=cursor, with_ids=True)
+            pages.append([message.content for _, message in page])
+            if cursor is None:
+                break
+            # cursor is the oldest message of the page
+            assert cursor == client.history_cursor(page[0][0])
+        assert pages == [['m4', 'm5', 'm6'], ['m1', 'm2', 'm3'], ['m0']]
+
+        # the page that ends exactly on the first message has no next one
+        page, cursor = await client.get_history(chat, limit=2, cursor=client.history_cursor(ids[2]))
+        assert [message.content for message in page] == ['m0', 'm1'] and cursor is None
+
+        # messages that are written meanwhile don't shift the pages
+        page, _ = await client.get_history(chat, limit=3, cursor=client.history_cursor(ids[4]))
+        await client.add_message(chat, Message('alice', None, 0, TEXT, 'new'))
+        again, _ = await client.get_history(chat, limit=3, cursor=client.history_cursor(ids[4]))
+        assert page == again
+
+        # cursor older than everything gives an empty page
+        page, cursor = await client.get_history(chat, cursor=client.history_cursor(0))
+        assert page == [] and cursor is None
+
+    run_storage(main)
+
+
+@pytest.mark.parametrize('cursor', ['zz', '', '-1', format(2 ** 63, 'x'), 12])
+def test_bad_history_cursor(run_storage, cursor):
+    chat = Chat('room', None, None)
+
+    async def main(client):
+        await client.new_user('alice', b'hash')
+        await client.create_chat(User('alice'), 'room', [])
+        with pytest.raises(BadStorageParamException):
+            await client.get_history(chat, cursor=cursor)
+        with pytest.raises(BadStorageParamException):
+            await client.get_history(chat, limit=0)
+        with pytest.raises(BadStorageParamException):
+            await client.get_history(Chat('ghost', None, None))
+
+    run_storage(main)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+
+# created: 18.10.2026
+# by David Zashkolny
+# 3 course, comp math
+# Taras Shevchenko National University of Kyiv
+# email: davendiy@gmail.com
+
+import sqlite3
+
+import curio
+import pytest
+
+from src.database._sqlite_client import AsyncWorker, NotWorkingException, QueryResult
+
+INSERT = 'INSERT INTO Items (Name) VALUES (?)'
+
+
+@pytest.fixture
+def worker_path(tmp_path):
+    path = str(tmp_path / 'worker.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE Items (Id INTEGER PRIMARY KEY, Name TEXT UNIQUE NOT NULL)')
+    conn.commit()
+    conn.close()
+    return path
+
+
+def names(path) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return [el[0] for el in conn.execute('SELECT Name FROM Items ORDER BY Id')]
+    finally:
+        conn.close()
+
+
+def run_worker(path, main, **kwargs):
+    """ Run main(worker) while the worker works, record the sizes of its
+    transactions.
+    """
+    worker = AsyncWorker(path, **kwargs)
+    worker.batches = []
+    execute_batch = worker._execute_batch
+
+    def recording(batch):
+        worker.batches.append(len(batch))
+        return execute_batch(batch)
+
+    worker._execute_batch = recording
+
+    async def running():
+        task = await curio.spawn(worker.start)
+        try:
+            return await main(worker)
+        finally:
+            await task.cancel()
+
+    return curio.run(running), worker
+
+
+def test_queries_are_committed_in_groups(worker_path):
+
+    async def main(worker):
+        tasks = [await curio.spawn(worker.execute, INSERT, (f'item{i}',)) for i in range(10)]
+        return [await task.join() for task in tasks]
+
+    row_ids, worker = run_worker(worker_path, main, batch_size=4, batch_wait=0.05)
+    # everybody gets the id of its own row after it's committed
+    assert row_ids == list(range(1, 11))
+    assert names(worker_path) == [f'item{i}' for i in range(10)]
+    assert worker.batches == [4, 4, 2]
+
+
+def test_failed_batch_is_replayed_one_by_one(worker_path):
+
+    async def main(worker):
+        queue = worker.get_queue()
+        results = [QueryResult() for _ in range(3)]
+        await queue.put((INSERT, ('a',), results[0]))
+        await queue.put((INSERT, ('a',), results[1]))     # duplicate
+        await queue.put((INSERT, ('b',)))                 # nobody waits for it
+        await worker.execute_many(INSERT, [('c',), ('d',)])
+        outcomes = []
+        for result in results[:2]:
+            try:
+                outcomes.append(await result.wait())
+            except sqlite3.IntegrityError as e:
+                outcomes.append(e)
+        return outcomes
+
+    outcomes, worker = run_worker(worker_path, main, batch_size=10, batch_wait=0.05)
+    assert worker.batches == [4]
+    assert outcomes[0] == 1 and isinstance(outcomes[1], sqlite3.IntegrityError)
+    # only the wrong query failed
+    assert names(worker_path) == ['a', 'b', 'c', 'd']
+
+
+def test_pending_results_fail_when_worker_is_cancelled(worker_path):
+    worker = AsyncWorker(worker_path, batch_size=10, batch_wait=60)
+
+    async def main():
+        task = await curio.spawn(worker.start)
+        waiters = [await curio.spawn(worker.execute, INSERT, (f'item{i}',)) for i in range(2)]
+        await curio.sleep(0.05)      # the worker waits for more queries
+        await task.cancel()
+        errors = []
+        for waiter in waiters:
+            with pytest.raises(curio.TaskError) as info:
+                await curio.timeout_after(1, waiter.join)
+            errors.append(info.value.__cause__)
+        return errors
+
+    errors = curio.run(main)
+    assert all(isinstance(error, NotWorkingException) for error in errors)
+    assert not worker.is_work
+    assert names(worker_path) == []